@@ -0,0 +1,90 @@
+"""
+Benchmark of the COCA lexicon.txt / coca-sources.txt parsers.
+
+Compares the original line-by-line parse (one dict per line, plus a print per lexicon row) against the
+vectorized read_lexicon() / read_sources() on synthetic files with the same shape as the COCA distribution.
+
+Usage: python benchmarks/coca_parse.py [rows]
+"""
+
+import pandas as pd
+
+from contextlib import redirect_stdout
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from coca import read_lexicon, read_sources
+
+
+POS = ["nn1", "nn2", "vvi", "vv0", "vvd", "vvg", "jj", "rr", "at", "ii", "y"]
+GENRES = ["ACAD", "FIC", "MAG", "NEWS", "SPOK", "BLOG", "WEB", "TVM"]
+
+
+def write_synthetic_lexicon(filename: str, rows: int):
+    with open(filename, "w", encoding="ISO-8859-1") as fout:
+        fout.write("wID\tword\tlemma\tPoS\n")
+        fout.write("-----\t-----\t-----\t-----\n")
+        for i in range(1, rows + 1):
+            lemma = "lemma%d" % (i // 3)
+            fout.write(f"{i}\t{lemma}s\t{lemma}\t{random.choice(POS)}\n")
+
+
+def write_synthetic_sources(filename: str, rows: int):
+    with open(filename, "w", encoding="ISO-8859-1") as fout:
+        for i in range(1, rows + 1):
+            fout.write(f"{i}\t{random.randint(1990, 2019)}\t{random.choice(GENRES)}\t{random.randint(100, 150)}\tSource {i % 500}\tTitle of text {i}\n")
+
+
+# The original parse, from COCA._reader()
+def legacy_parse(filename: str, dstruct: dict, echo: bool) -> pd.DataFrame:
+    with open(filename, "rt", encoding="ISO-8859-1") as fin:
+        for line in fin.readlines():
+            values = str(line.strip()).split("\t")
+            entry = dict(zip(dstruct.keys(), values))
+            if echo:
+                print(values)
+            for k in dstruct.keys():
+                dstruct[k].append(entry[k])
+        return pd.DataFrame(dstruct)
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main(rows: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        lexicon = f"{tmp}/lexicon.txt"
+        sources = f"{tmp}/coca-sources.txt"
+        write_synthetic_lexicon(lexicon, rows)
+        write_synthetic_sources(sources, rows)
+
+        with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+            legacy_lexicon = timed(
+                lambda: legacy_parse(lexicon, {"wordID": [], "word": [], "lemma": [], "PoS": []}, echo=True)
+            )
+            legacy_sources = timed(
+                lambda: legacy_parse(
+                    sources,
+                    {"textID": [], "year": [], "genre": [], "subGenre": [], "source": [], "title": []},
+                    echo=False,
+                )
+            )
+        vectorized_lexicon = timed(lambda: read_lexicon(lexicon))
+        vectorized_sources = timed(lambda: read_sources(sources))
+
+    print(f"{rows:,} rows")
+    print(f"lexicon.txt       legacy {legacy_lexicon:8.3f}s   vectorized {vectorized_lexicon:8.3f}s   {legacy_lexicon / vectorized_lexicon:6.1f}x")
+    print(f"coca-sources.txt  legacy {legacy_sources:8.3f}s   vectorized {vectorized_sources:8.3f}s   {legacy_sources / vectorized_sources:6.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,103 @@
+"""
+Benchmark of the lexicon import into OntoMem.
+
+Compares the original per-sense import loop (a print per sense, a Space("LEX") membership test per sense and one
+slot assignment per field) against the batched import_senses() on a synthetic lexicon with the shape of the
+lexicon collection. Both runs write the same number of new LEX-WORD frames, under different words.
+
+Requires OntoMem; the lex / ont database packages are only imported by the database loaders of knowledge/utils.py,
+which the benchmark does not use. No results are recorded yet: OntoMem 0.10.0 could not be installed where the
+benchmark was last tried (the PyPI releases named ontomem stop at 0.6.1), so no speedup is claimed for
+import_senses().
+
+Usage: python benchmarks/lexicon_import.py [senses]
+"""
+
+from contextlib import redirect_stdout
+
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from knowledge.utils import import_senses, shape_sense_record
+from ontomem.frame import Frame, Space
+
+
+def synthetic_senses(prefix: str, count: int) -> list:
+    senses = []
+    for i in range(count):
+        word = "%s%d" % (prefix, i // 4)
+        senses.append(
+            {
+                "SENSE": "%s-V%d" % (word, i % 4 + 1),
+                "WORD": word,
+                "CAT": "V",
+                "SYN-STRUC": {"SUBJECT": {"ROOT": "$VAR1", "CAT": "NP"}, "ROOT": "$VAR0", "CAT": "V"},
+                "SEM-STRUC": {"EVENT": {"AGENT": {"VALUE": "^$VAR1"}}},
+                "SYNONYMS": "NIL",
+                "HYPONYMS": "NIL",
+                "DEF": "definition of %s" % word,
+                "EX": "example of %s" % word,
+                "MEANING-PROCEDURES": "NIL",
+            }
+        )
+    return senses
+
+
+# The original import loop, from load_local_lexicon()
+def legacy_import(senses: list):
+    lexword = Frame("LEX-WORD")
+    for s in senses:
+        print(s["SENSE"])
+
+    for s in senses:
+        sense_id = s["SENSE"]
+        word = s["WORD"]
+        cat = s["CAT"]
+        index = int(re.findall("([^0-9]*)([0-9]+)", sense_id)[0][1])
+
+        sense = Frame(f"{word}.{cat}.{index}")
+        if sense not in Space("LEX"):
+            sense.add_parent(lexword)
+            sense.add_to_space("LEX")
+            sense["WORD"] = word
+            sense["CAT"] = cat
+            sense["SENSE"] = sense_id
+            sense["SYN-STRUC"] = s["SYN-STRUC"]
+            sense["SEM-STRUC"] = s["SEM-STRUC"]
+            sense["SYNONYMS"] = s["SYNONYMS"] if "SYNONYMS" in s else None
+            sense["HYPONYMS"] = s["HYPONYMS"] if "HYPONYMS" in s else None
+            sense["DEF"] = s["DEF"] if "DEF" in s else None
+            sense["EX"] = s["EX"] if "EX" in s else None
+
+            meaning_procedures = []
+            if "MEANING-PROCEDURES" in s and s["MEANING-PROCEDURES"] != "NIL":
+                meaning_procedures = s["MEANING-PROCEDURES"]
+
+            sense["MEANING-PROCEDURES"] = meaning_procedures
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main(count: int):
+    legacy_senses = synthetic_senses("LEGACY", count)
+    bulk_senses = synthetic_senses("BULK", count)
+
+    with open(os.devnull, "w") as devnull, redirect_stdout(devnull):
+        legacy = timed(lambda: legacy_import(legacy_senses))
+    bulk = timed(lambda: import_senses([shape_sense_record(s) for s in bulk_senses], replace=False))
+
+    print(f"{count:,} senses")
+    print(f"legacy {legacy:8.3f}s ({count / legacy:10,.0f} senses/s)")
+    print(f"bulk   {bulk:8.3f}s ({count / bulk:10,.0f} senses/s)   {legacy / bulk:6.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -0,0 +1,198 @@
+"""
+Benchmark of the memory that forked workers share with the parent process.
+
+Loads knowledge in the parent, forks workers that each read a part of it and then run a full garbage collection (as
+a long-running worker eventually does), and reports every worker's memory from /proc/<pid>/smaps_rollup:
+  RSS            - resident pages, shared or not
+  USS            - pages private to the worker (Private_Clean + Private_Dirty)
+  Private_Dirty  - pages copied on write since the fork
+Each run is made three times: with the caches warmed but nothing frozen, after gc.freeze(), and with the knowledge
+read from a packed knowledge file (knowledge/packed.py) instead of Python objects, which is what
+OntoALAConfig.load_shared_knowledge does.
+
+By default the knowledge is a synthetic graph with the shape of OntoMem frames (a dict of slots per frame, lists of
+fillers, references to parent frames), which is also written as a packed file of concept records; with
+knowledge=<file>, the knowledge file is loaded with OntoALAConfig and the workers parse senses through the Lexicon.
+
+Usage: python benchmarks/shared_knowledge.py [frames] [knowledge=path] [workers=2] [touch=0.1]
+"""
+
+import gc
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+
+ROLLUP_FIELDS = ["Rss", "Pss", "Private_Clean", "Private_Dirty"]
+
+
+def memory_usage(pid: str = "self") -> dict:
+    """The smaps_rollup fields of a process, in kB"""
+    usage = {}
+    with open("/proc/%s/smaps_rollup" % pid, "r") as fin:
+        for line in fin:
+            field, _, value = line.partition(":")
+            if field in ROLLUP_FIELDS:
+                usage[field] = int(value.split()[0])
+    usage["USS"] = usage["Private_Clean"] + usage["Private_Dirty"]
+    return usage
+
+
+def synthetic_frames(count: int) -> dict:
+    frames = {}
+    for i in range(count):
+        name = "CONCEPT-%d" % i
+        frames[name] = {
+            "NAME": name,
+            "IS-A": [frames["CONCEPT-%d" % (i // 2)]] if i > 0 else [],
+            "DEFINITION": ["the definition of concept %d" % i],
+            "AGENT": [{"SEM": ["CONCEPT-%d" % (i // 3)], "DEFAULT": []}],
+            "THEME": [{"SEM": ["CONCEPT-%d" % (i // 5)], "DEFAULT": []}],
+        }
+    return frames
+
+
+def read_synthetic(frames: dict, names: list) -> int:
+    found = 0
+    for name in names:
+        frame = frames[name]
+        while len(frame["IS-A"]) > 0:
+            frame = frame["IS-A"][0]
+            found += len(frame["AGENT"][0]["SEM"])
+    return found
+
+
+def synthetic_records(frames: dict) -> dict:
+    # The synthetic frames as the concept records of a packed knowledge file, with parents by name
+    records = {}
+    for name, frame in frames.items():
+        record = dict(frame, **{"IS-A": [parent["NAME"] for parent in frame["IS-A"]]})
+        records["C:%s" % name] = record
+    return records
+
+
+def read_packed(packed, names: list) -> int:
+    found = 0
+    for name in names:
+        record = packed.record("C:%s" % name)
+        while len(record["IS-A"]) > 0:
+            record = packed.record("C:%s" % record["IS-A"][0])
+            found += len(record["AGENT"][0]["SEM"])
+    return found
+
+
+def read_knowledge(names: list) -> int:
+    from knowledge.lexicon import Lexicon
+
+    lexicon = Lexicon(shared=True)
+    for id in names:
+        try:
+            lexicon.sense(id)
+        except Exception:
+            pass
+    return len(names)
+
+
+def worker(read, name, count: int, touch: float, results):
+    # The sample is drawn in the worker, so that the parent holds no list of names besides the knowledge itself
+    read([name(i) for i in random.sample(range(count), max(1, int(count * touch)))])
+    gc.collect()
+    results.put(memory_usage())
+
+
+def measure(read, name, count: int, workers: int, touch: float) -> list:
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    processes = []
+    for _ in range(workers):
+        processes.append(context.Process(target=worker, args=(read, name, count, touch, results)))
+    for process in processes:
+        process.start()
+    usages = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return usages
+
+
+def report(label: str, usages: list):
+    mean = {field: sum(u[field] for u in usages) / len(usages) for field in ["Rss", "USS", "Private_Dirty"]}
+    print(
+        f"{label:8} RSS {mean['Rss'] / 1024:8.1f} MB   USS {mean['USS'] / 1024:8.1f} MB   "
+        f"Private_Dirty {mean['Private_Dirty'] / 1024:8.1f} MB"
+    )
+
+
+def synthetic_name(i: int) -> str:
+    return "CONCEPT-%d" % i
+
+
+def main(count: int, knowledge: str, workers: int, touch: float):
+    from knowledge.packed import PackedKnowledge
+
+    if knowledge is None:
+        frames = synthetic_frames(count)
+        name = synthetic_name
+        read = lambda sample: read_synthetic(frames, sample)
+        warm = lambda: None
+        print(f"{count:,} synthetic frames")
+    else:
+        from config import OntoALAConfig
+        from knowledge.lexicon import Lexicon
+        from knowledge.shared import warm_caches
+
+        OntoALAConfig(knowledge_file=knowledge).load_knowledge()
+        names = list(Lexicon.sense_index().keys())
+        count = len(names)
+        name = names.__getitem__
+        read = read_knowledge
+        warm = warm_caches
+        print(f"{knowledge}: {count:,} senses")
+
+    warm()
+    gc.collect()
+    print(f"parent   RSS {memory_usage()['Rss'] / 1024:8.1f} MB")
+    report("plain", measure(read, name, count, workers, touch))
+
+    gc.freeze()
+    report("frozen", measure(read, name, count, workers, touch))
+    gc.unfreeze()
+
+    if knowledge is None:
+        packed_file = os.path.join(tempfile.mkdtemp(), "synthetic.okp")
+        PackedKnowledge.write_records(packed_file, synthetic_records(frames))
+        del frames, read
+        packed = PackedKnowledge(packed_file)
+        read = lambda sample: read_packed(packed, sample)
+    else:
+        from config import OntoALAConfig
+
+        OntoALAConfig(knowledge_file=knowledge).load_shared_knowledge()
+
+    gc.collect()
+    gc.freeze()
+    print(f"parent   RSS {memory_usage()['Rss'] / 1024:8.1f} MB (packed)")
+    report("packed", measure(read, name, count, workers, touch))
+    gc.unfreeze()
+
+
+if __name__ == "__main__":
+    count = 500_000
+    knowledge = None
+    workers = 2
+    touch = 0.1
+
+    for arg in sys.argv[1:]:
+        if arg.startswith("knowledge="):
+            knowledge = arg.replace("knowledge=", "")
+        elif arg.startswith("workers="):
+            workers = int(arg.replace("workers=", ""))
+        elif arg.startswith("touch="):
+            touch = float(arg.replace("touch=", ""))
+        else:
+            count = int(arg)
+
+    main(count, knowledge, workers, touch)
@@ -5,12 +5,21 @@ You must use python 3.10 for this to work! COCA.reader() uses the new match/case
 import pandas as pd
 from pandas import DataFrame
 from enum import Enum
+from typing import Iterator, List, Tuple
+
+from coca_index import LemmaIndex
+from coca_patterns import INSTRUMENT_PATTERN, PatternMatches, PatternSpec, match_pattern
+from coca_store import COCAStore
 
 import time, sys
 
 import re
 import os
 import csv
+import hashlib
+import json
+import warnings
+import pickle
 
 maxInt = sys.maxsize
 
@@ -24,51 +33,19 @@ while True:
         maxInt = int(maxInt/10)
 
 class CMODE(Enum):
-    LINEAR = "LINEAR"
-    WLPOS = "WLPOS"
+    LINEAR = "LINEAR"  # the text/ files, one "##textID text" document per line (see COCA.documents)
+    WLPOS = "WLPOS"  # the wlp/ files, one word / lemma / PoS token per line (see COCA.documents)
     DB = "DB"
+    STORE = "STORE"  # a columnar store converted from the DB files (see COCA.build_store)
+    STREAM = "STREAM"  # the DB files, read lazily in fixed-size chunks (see COCA.chunks)
+
 
+# Version of the pickled snapshot layout written to pkl_dir; bump it to invalidate existing snapshots.
+SNAPSHOT_VERSION = 1
+SNAPSHOT_FRAMES = ["data", "lexicon", "sources", "subgenre"]
 
-# class COCAText:
-#     def __init__(
-#         self,
-#         data_dir: str = "/Users/ivan/Dropbox/rpi/leia/code/OntoALA/corpus/",
-#         mode: CMODE = CMODE.LINEAR,
-#     ):
-#         self.data_dir = data_dir
-#         self.mode = mode
-#         self.data = self.reader()
-
-#     def reader(self):
-#         def _process_line(line: str):
-#             line_no = re.match(r"##[\d]+", line).group(0)
-#             unprocessed_text = re.split(r"##[\d]+", line)[1]
-#             return [line_no, unprocessed_text]
-
-#         def _process_wlpos():
-#             pass
-
-#         match self.mode:
-#             case CMODE.LINEAR:
-#                 linear_df = pd.DataFrame()  # output dataframe
-#                 file_no = 0  # index for updating progress bar
-#                 for subdir, dirs, files in os.walk(f"{self.data_dir}/text/"):
-#                     dir_len = len(files)
-#                     for filename in [f for f in files if ".txt" in f]:
-#                         update_progress(file_no / dir_len, "Linear Mode", filename)
-#                         file_no += 1
-#                         with open(f"{subdir}/{filename}", "rt") as fin:
-#                             for line in fin:
-#                                 if line != "\n":
-#                                     newline = _process_line(line)
-#                                     linear_df.append(newline)
-#                 return linear_df
-
-#             case CMODE.WLPOS:
-#                 pass
-
-#             case CMODE.DB:
-#                 pass
+# Documents in the text/ and wlp/ layouts start with a "##textID" (or "@@textID") marker.
+DOCUMENT_ID = re.compile(r"(?:##|@@)(\d+)")
 
 
 class COCA:
@@ -77,76 +54,362 @@ class COCA:
         data_dir: str = "/Users/ivan/Dropbox/rpi/leia/code/OntoALA/corpus/",
         pkl: bool = False,
         pkl_dir: str = "/Users/ivan/Dropbox/rpi/leia/code/OntoALA/pkl/",
+        mode: CMODE = CMODE.DB,
+        store_dir: str = None,
+        chunksize: int = 1_000_000,
     ):
         self.data_dir = data_dir  # corpus location
         self.pkl_dir = pkl_dir  # pickle location
         self.pkl = pkl  # load from pickled data
-        self.mode = CMODE.DB  # the coca mode
+        self.mode = mode  # the coca mode
+        self.store_dir = store_dir or f"{data_dir}/store/"  # columnar store location
+        self.chunksize = chunksize  # rows per chunk (STREAM mode only)
         self.data = None  # the coca dataframe
         self.lexicon = None  # the lexicon dataframe
         self.sources = None  # the sources dataframe
         self.subgenre = None  # the subgenre codes dataframe
+        self.store = None  # the memory-mapped columnar store (STORE mode only)
+        self.index = None  # the (lemma, PoS) index over the store (STORE mode only, see lemma_index)
 
         self._reader()  # load the data from files or pickle
 
+    @classmethod
+    def build_store(
+        cls,
+        data_dir: str,
+        store_dir: str = None,
+        chunksize: int = 5_000_000,
+        mode: CMODE = CMODE.DB,
+        workers: int = 1,
+    ) -> COCAStore:
+        """One-time conversion of a corpus distribution (by default, db/csv and lexicon.txt) into a columnar store
+
+        In DB mode, workers > 1 parses the db_*.csv files in a pool of worker processes.
+        """
+        store_dir = store_dir or f"{data_dir}/store/"
+        match mode:
+            case CMODE.DB:
+                lexicon = read_lexicon(f"{data_dir}/lexicon.txt")
+                return COCAStore.build(
+                    store_dir,
+                    db_token_files(data_dir),
+                    lexicon,
+                    chunksize=chunksize,
+                    progress=progress_bar,
+                    workers=workers,
+                )
+            case CMODE.WLPOS:
+                return COCAStore.build_from_documents(store_dir, iter_wlp_documents(data_dir))
+            case CMODE.LINEAR:
+                # The text/ layout has no lemmas or tags; words are whitespace tokens, lemmas their lower case form
+                documents = (
+                    (text_id, words, [w.lower() for w in words], [""] * len(words))
+                    for text_id, words in (
+                        (text_id, text.split()) for text_id, text in iter_linear_documents(data_dir)
+                    )
+                )
+                return COCAStore.build_from_documents(store_dir, documents)
+            case _:
+                raise Exception("Cannot build a COCA store from mode %s." % mode)
+
+    def documents(self) -> Iterator[tuple]:
+        """Streams the documents of a LINEAR ((textID, text)) or WLPOS ((textID, words, lemmas, tags)) corpus"""
+        match self.mode:
+            case CMODE.LINEAR:
+                return iter_linear_documents(self.data_dir)
+            case CMODE.WLPOS:
+                return iter_wlp_documents(self.data_dir)
+            case _:
+                raise Exception("COCA mode %s has no document reader." % self.mode)
+
+    def lemma_index(self, build: bool = False) -> LemmaIndex:
+        """The (lemma, PoS) -> token positions index of the store, optionally building it if it is missing"""
+        if self.store is None:
+            raise Exception("The lemma index requires COCA to be opened in STORE mode.")
+        if self.index is None:
+            if build and not LemmaIndex.exists(self.store):
+                self.index = LemmaIndex.build(self.store)
+            else:
+                self.index = LemmaIndex(self.store)
+        return self.index
+
+    def match_pattern(self, verbs: List[str], pattern: PatternSpec = INSTRUMENT_PATTERN) -> PatternMatches:
+        """Spans where one of the verb lemmas is followed by the pattern (by default, "by/with/using NP")"""
+        if self.store is None:
+            raise Exception("Pattern matching requires COCA to be opened in STORE mode.")
+        index = self.index
+        if index is None and LemmaIndex.exists(self.store):
+            index = self.lemma_index()
+        return match_pattern(self.store, verbs, pattern, index=index)
+
+    def chunks(self, chunksize: int = None) -> Iterator[DataFrame]:
+        """Yields the token rows of every db_*.csv file in order, at most chunksize rows at a time"""
+        chunksize = chunksize or self.chunksize
+        token_files = db_token_files(self.data_dir)
+        total_bytes = sum(os.path.getsize(f) for f in token_files) or 1
+
+        read_bytes = 0
+        rows = 0
+        start = time.time()
+        for filename in token_files:
+            with open(filename, "rb") as fin:
+                for chunk in pd.read_csv(fin, chunksize=chunksize):
+                    rows += len(chunk)
+                    rate = rows / max(time.time() - start, 1e-6)
+                    progress_bar(
+                        min((read_bytes + fin.tell()) / total_bytes, 0.999),
+                        "Stream COCA DB",
+                        f"{os.path.basename(filename)} {rate:,.0f} rows/sec",
+                    )
+                    yield chunk
+            read_bytes += os.path.getsize(filename)
+
+        progress_bar(1, "Stream COCA DB", f"{rows:,} rows")
+
     def _reader(self):
+        match self.mode:
+            case CMODE.STORE:
+                if not COCAStore.exists(self.store_dir):
+                    raise Exception(
+                        "No COCA store at %s; run COCA.build_store first." % self.store_dir
+                    )
+                self.store = COCAStore(self.store_dir)
+            case CMODE.LINEAR | CMODE.WLPOS:
+                # Nothing is loaded up front; documents are streamed one at a time through documents()
+                pass
+            case CMODE.DB | CMODE.STREAM:
+                # Only the lexicon, sources and subgenres are loaded in STREAM mode; the tokens are read through chunks()
+                load_tokens = self.mode == CMODE.DB
+                if self.pkl and self._load_snapshot(load_tokens):
+                    return
+                self._db_reader(load_tokens=load_tokens)
+                if self.pkl:
+                    self._save_snapshot()
+            case _:
+                raise Exception("COCA mode %s is not supported." % self.mode)
+
+    def fingerprint(self) -> str:
+        """A fingerprint of the raw corpus files (names, sizes and modification times) and the snapshot format"""
+        files = [f"{self.data_dir}/lexicon.txt", f"{self.data_dir}/coca-sources.txt"]
+        csv_dir = f"{self.data_dir}/db/csv/"
+        files += [f"{csv_dir}/{f}" for f in sorted(os.listdir(csv_dir))]
 
-        # if self.pkl: 
-        #     for subdir, dirs, files in os.walk(f"{self.pkl_dir}"):
-        #         # if len(dirs) == 0:
-        #         #     print("There are no pickle files. Resorting to raw data loading...")
-        #         #     continue
-
-        #         # else:
-        #         print(f"SubDir: {subdir}")
-        #         print(f"Dirs: {dirs}")
-        #         print(f"Files: {files}")
-
-        def _manual_parse(filename: str, dstruct: dict):
-            with open(filename, 'rt', encoding="ISO-8859-1") as fin:
-                source_dict = dstruct
-                    for line in fin.readlines():
-                        values = str(line.strip()).split('\t')
-                        entry = dict(zip(source_dict.keys(), values))
-                        for k in source_dict.keys():
-                            source_dict[k].append(entry[k])
-                    return pd.DataFrame(source_dict)
+        digest = hashlib.sha1(str(SNAPSHOT_VERSION).encode("utf-8"))
+        for filename in files:
+            if not os.path.isfile(filename):
+                continue
+            stat = os.stat(filename)
+            digest.update(f"{os.path.relpath(filename, self.data_dir)}:{stat.st_size}:{stat.st_mtime_ns}\n".encode("utf-8"))
+        return digest.hexdigest()
 
+    def _load_snapshot(self, load_tokens: bool) -> bool:
+        manifest_file = f"{self.pkl_dir}/coca.json"
+        if not os.path.isfile(manifest_file):
+            return False
+
+        with open(manifest_file, "r") as fin:
+            manifest = json.load(fin)
+
+        required = set(SNAPSHOT_FRAMES) if load_tokens else set(SNAPSHOT_FRAMES) - {"data"}
+        if manifest.get("version") != SNAPSHOT_VERSION or manifest.get("fingerprint") != self.fingerprint():
+            return False
+        if not required.issubset(manifest.get("frames", [])):
+            return False
+
+        for name in required:
+            setattr(self, name, pd.read_pickle(f"{self.pkl_dir}/{name}.pkl"))
+        return True
+
+    def _save_snapshot(self):
+        os.makedirs(self.pkl_dir, exist_ok=True)
+
+        fingerprint = self.fingerprint()
+        frames = [name for name in SNAPSHOT_FRAMES if getattr(self, name) is not None]
+        for name in frames:
+            # Written to a temporary file first, so an interrupted save never leaves a truncated snapshot
+            getattr(self, name).to_pickle(f"{self.pkl_dir}/{name}.pkl.tmp", protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(f"{self.pkl_dir}/{name}.pkl.tmp", f"{self.pkl_dir}/{name}.pkl")
+
+        # Frames saved by an earlier run over the same files (e.g. the tokens of a DB mode run) remain valid
+        manifest_file = f"{self.pkl_dir}/coca.json"
+        if os.path.isfile(manifest_file):
+            with open(manifest_file, "r") as fin:
+                previous = json.load(fin)
+            if previous.get("version") == SNAPSHOT_VERSION and previous.get("fingerprint") == fingerprint:
+                frames = [name for name in SNAPSHOT_FRAMES if name in frames or name in previous.get("frames", [])]
+
+        manifest = {"version": SNAPSHOT_VERSION, "fingerprint": fingerprint, "frames": frames}
+        with open(f"{self.pkl_dir}/coca.json.tmp", "w") as fout:
+            json.dump(manifest, fout)
+        os.replace(f"{self.pkl_dir}/coca.json.tmp", f"{self.pkl_dir}/coca.json")
+
+    def _db_reader(self, load_tokens: bool = True):
         datafiles = []
         file_no = 0
         for subdir, dirs, files in os.walk(f"{self.data_dir}/db/csv/"):
-            dir_len = len(files)
             flist = [f for f in files if ".csv" in f]
+            dir_len = len(flist)
             for filename in flist:
                 progress_bar(file_no / dir_len, "Build COCA DB", filename)
                 if filename.startswith("db_"):
-                    with open(f"{subdir}/{filename}", "rt") as fin:
-                        datafiles.append(pd.read_csv(fin))
+                    if load_tokens:
+                        with open(f"{subdir}/{filename}", "rt") as fin:
+                            datafiles.append(pd.read_csv(fin))
                 elif filename == "coca-sources.csv":
-                    f = f"{self.data_dir}/coca-sources.txt"
-                    s_dict = {"textID": [], "year": [], "genre": [], "subGenre": [], "source": [], "title": []}
-                    self.sources = _manual_parse(f, s_dict)
+                    self.sources = read_sources(f"{self.data_dir}/coca-sources.txt")
                 elif filename == "subgenreCodes.csv":
                     with open(f"{subdir}/subgenreCodes.csv", "rt") as fin:
                         self.subgenre = pd.read_csv(fin)
                 elif filename == "lexicon.csv":
-                    with open(f"{self.data_dir}/lexicon.txt", "rt", encoding="ISO-8859-1") as fin:
-                        # self.lexicon = pd.read_csv(fin)
-                        lex_dict = {"wordID": [], "word": [], "lemma": [], "PoS": []}
-                        for line in fin.readlines():
-                            values = str(line.strip()).split('\t')
-                            entry = dict(zip(lex_dict.keys(), values))
-                            print(values)
-                            for k in lex_dict.keys():
-                                lex_dict[k].append(entry[k])
-                        self.lexicon = pd.DataFrame(lex_dict)
+                    self.lexicon = read_lexicon(f"{self.data_dir}/lexicon.txt")
                 file_no += 1
-        self.data = pd.concat(datafiles)
+        if load_tokens:
+            self.data = pd.concat(datafiles)
 
     def from_files(data_dir: str = ""):
         pass
 
 
+def db_token_files(data_dir: str) -> List[str]:
+    """The db_*.csv token files of a corpus, in a stable order"""
+    return sorted(
+        f"{data_dir}/db/csv/{f}"
+        for f in os.listdir(f"{data_dir}/db/csv/")
+        if f.startswith("db_") and f.endswith(".csv")
+    )
+
+
+def corpus_files(directory: str, suffix: str = ".txt") -> List[str]:
+    """The files of a corpus directory (and its subdirectories) with the given suffix, in a stable order"""
+    found = []
+    for subdir, dirs, files in os.walk(directory):
+        found += [f"{subdir}/{f}" for f in files if f.endswith(suffix)]
+    return sorted(found)
+
+
+def iter_linear_documents(data_dir: str) -> Iterator[Tuple[int, str]]:
+    """Yields the (textID, text) documents of the text/ files, one at a time"""
+    files = corpus_files(f"{data_dir}/text/")
+    for file_no, filename in enumerate(files):
+        progress_bar(file_no / len(files), "Linear Mode", os.path.basename(filename))
+        with open(filename, "rt", encoding="ISO-8859-1") as fin:
+            for line in fin:
+                marker = DOCUMENT_ID.match(line)
+                if marker is None:
+                    continue
+                yield int(marker.group(1)), line[marker.end():].strip()
+    progress_bar(1, "Linear Mode")
+
+
+def iter_wlp_documents(data_dir: str) -> Iterator[Tuple[int, List[str], List[str], List[str]]]:
+    """Yields the (textID, words, lemmas, PoS tags) documents of the wlp/ files, one at a time
+
+    Lines are either "textID, ID, word, lemma, PoS" (documents change with the textID) or "word, lemma, PoS"
+    (documents start with a "##textID" word); only one document is held in memory at a time.
+    """
+    text_id, words, lemmas, tags = None, [], [], []
+
+    files = corpus_files(f"{data_dir}/wlp/")
+    for file_no, filename in enumerate(files):
+        progress_bar(file_no / len(files), "WLPOS Mode", os.path.basename(filename))
+        with open(filename, "rt", encoding="ISO-8859-1") as fin:
+            for line in fin:
+                fields = line.rstrip("\r\n").split("\t")
+                if len(fields) >= 5:
+                    if not fields[0].isdigit():
+                        continue
+                    line_id = int(fields[0])
+                    word, lemma, tag = fields[2:5]
+                elif len(fields) == 3:
+                    word, lemma, tag = fields
+                    marker = DOCUMENT_ID.fullmatch(word)
+                    line_id = int(marker.group(1)) if marker is not None else text_id
+                    if marker is not None:
+                        word = None
+                else:
+                    continue
+
+                if line_id != text_id:
+                    if text_id is not None and len(words) > 0:
+                        yield text_id, words, lemmas, tags
+                    text_id, words, lemmas, tags = line_id, [], [], []
+
+                if word is not None and text_id is not None:
+                    words.append(word)
+                    lemmas.append(lemma)
+                    tags.append(tag)
+
+    if text_id is not None and len(words) > 0:
+        yield text_id, words, lemmas, tags
+    progress_bar(1, "WLPOS Mode")
+
+
+def read_tsv(filename: str, columns: List[str], dtypes: dict) -> DataFrame:
+    """Reads a tab separated COCA table straight into typed columns, skipping any leading header lines"""
+    # Lines with too many fields are dropped; the parser reports each of them in a ParserWarning. Lines with too few
+    # fields are read with empty trailing columns, so rows whose last column is empty are dropped as well. The number
+    # of dropped lines is printed and kept in the bad_lines attribute of the result.
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", pd.errors.ParserWarning)
+        data = pd.read_csv(
+            filename,
+            sep="\t",
+            header=None,
+            names=columns,
+            dtype=dtypes,
+            skiprows=_header_lines(filename),
+            quoting=csv.QUOTE_NONE,
+            keep_default_na=False,
+            encoding="ISO-8859-1",
+            on_bad_lines="warn",
+            engine="c",
+        )
+
+    bad_lines = 0
+    for warning in caught:
+        if issubclass(warning.category, pd.errors.ParserWarning):
+            bad_lines += str(warning.message).count("Skipping line")
+        else:
+            warnings.warn_explicit(warning.message, warning.category, warning.filename, warning.lineno)
+
+    short = (data[columns[-1]] == "").to_numpy()
+    if short.any():
+        data = data[~short].reset_index(drop=True)
+        bad_lines += int(short.sum())
+
+    data.attrs["bad_lines"] = bad_lines
+    if bad_lines > 0:
+        print("Skipped %d malformed lines in %s" % (bad_lines, filename))
+    return data
+
+
+def _header_lines(filename: str) -> int:
+    # Header and separator lines (e.g. "wID" and "-----") come before the first row with an integer id
+    with open(filename, "rt", encoding="ISO-8859-1") as fin:
+        for line_no, line in enumerate(fin):
+            if line.split("\t", 1)[0].strip().isdigit():
+                return line_no
+            if line_no > 100:
+                break
+    return 0
+
+
+def read_lexicon(filename: str) -> DataFrame:
+    return read_tsv(
+        filename,
+        ["wordID", "word", "lemma", "PoS"],
+        {"wordID": "int64", "word": str, "lemma": str, "PoS": "category"},
+    )
+
+
+def read_sources(filename: str) -> DataFrame:
+    return read_tsv(
+        filename,
+        ["textID", "year", "genre", "subGenre", "source", "title"],
+        {"textID": "int64", "year": "int32", "genre": "category", "subGenre": "category", "source": "category", "title": str},
+    )
+
+
 # progress_bar() : Displays or updates a console progress bar
 ## Accepts a float between 0 and 1. Any int will be converted to a float.
 ## A value under 0 represents a 'halt'.
@@ -0,0 +1,161 @@
+"""
+Inverted (lemma, PoS) index over a COCAStore.
+
+For every (lemma, PoS) pair in the COCA lexicon, the index stores the sorted corpus positions of its tokens, so all
+occurrences of e.g. "stone" as a verb are a single contiguous read instead of a scan of the whole corpus.
+The index files are written into the store directory, next to the columns they index.
+"""
+
+import numpy as np
+from typing import Dict, Iterable, Tuple, Union
+
+from coca_store import COCAStore, LEMMA_DTYPE, POS_DTYPE
+
+import json
+import os
+
+
+INDEX_VERSION = 2
+
+PAIR_DTYPE = np.int32  # (lemma, PoS) pair number per wordID
+POSITION_DTYPE = np.int64  # corpus positions
+
+INDEXED_FILES = ["meta.json", "word_ids.bin", "lex_lemma.bin", "lex_pos.bin"]
+
+
+# The on-disk layout of the index (inside the store directory) is:
+#   index.json              - index version, number of indexed tokens, fingerprint of the indexed store files
+#   index_pair_lemma.bin    - lemma number of every pair (int32, sorted)
+#   index_pair_pos.bin      - PoS number of every pair (int16)
+#   index_offsets.bin       - positions of pair i are index_positions[offsets[i]:offsets[i + 1]] (int64)
+#   index_positions.bin     - corpus positions, grouped by pair and sorted within each pair (int64)
+class LemmaIndex(object):
+    @classmethod
+    def build(cls, store: COCAStore, chunksize: int = 10_000_000) -> "LemmaIndex":
+        # Every wordID in the lexicon belongs to exactly one (lemma, PoS) pair; pairs are numbered in
+        # (lemma, PoS) order so that all pairs of a lemma are adjacent.
+        known = (store.lex_lemma >= 0) & (store.lex_pos >= 0)
+        n_pos = max(len(store.pos_tags), 1)
+        keys = store.lex_lemma.astype(np.int64) * n_pos + store.lex_pos
+        pair_keys, word_pair = np.unique(keys[known], return_inverse=True)
+
+        pair_of_word = np.full(len(store.lex_lemma), -1, dtype=PAIR_DTYPE)
+        pair_of_word[known] = word_pair
+        n_pairs = len(pair_keys)
+
+        # First pass: count the tokens of every pair
+        counts = np.zeros(n_pairs, dtype=np.int64)
+        for start in range(0, len(store), chunksize):
+            pairs = pair_of_word[store.word_ids[start:start + chunksize]]
+            counts += np.bincount(pairs[pairs >= 0], minlength=n_pairs)
+
+        offsets = np.zeros(n_pairs + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+
+        # Second pass: scatter the positions of every chunk into their pair's slice; chunks are visited in
+        # order and the sort is stable, so positions stay sorted within each pair.
+        total = int(offsets[-1])
+        path = f"{store.store_dir}/index_positions.bin"
+        if total > 0:
+            positions = np.memmap(path, dtype=POSITION_DTYPE, mode="w+", shape=(total,))
+            cursor = offsets[:-1].copy()
+            for start in range(0, len(store), chunksize):
+                pairs = pair_of_word[store.word_ids[start:start + chunksize]]
+                valid = np.flatnonzero(pairs >= 0)
+                pairs = pairs[valid]
+
+                order = np.argsort(pairs, kind="stable")
+                pairs = pairs[order]
+                chunk_positions = valid[order] + start
+
+                unique, first, group_counts = np.unique(pairs, return_index=True, return_counts=True)
+                rank = np.arange(len(pairs)) - np.repeat(first, group_counts)
+                positions[cursor[pairs] + rank] = chunk_positions
+                cursor[unique] += group_counts
+            positions.flush()
+            del positions
+        else:
+            open(path, "wb").close()
+
+        (pair_keys // n_pos).astype(LEMMA_DTYPE).tofile(f"{store.store_dir}/index_pair_lemma.bin")
+        (pair_keys % n_pos).astype(POS_DTYPE).tofile(f"{store.store_dir}/index_pair_pos.bin")
+        offsets.tofile(f"{store.store_dir}/index_offsets.bin")
+        with open(f"{store.store_dir}/index.json", "w") as fout:
+            json.dump(
+                {"version": INDEX_VERSION, "tokens": len(store), "store": LemmaIndex.store_fingerprint(store)}, fout
+            )
+
+        return LemmaIndex(store)
+
+    @staticmethod
+    def store_fingerprint(store: COCAStore) -> Dict[str, list]:
+        # The size and modification time of every store file the index is built from; a rebuilt store (e.g. with a
+        # different lexicon but the same number of tokens) changes at least one of them
+        fingerprint = {}
+        for name in INDEXED_FILES:
+            stat = os.stat(f"{store.store_dir}/{name}")
+            fingerprint[name] = [stat.st_size, stat.st_mtime_ns]
+        return fingerprint
+
+    @staticmethod
+    def exists(store: COCAStore) -> bool:
+        filename = f"{store.store_dir}/index.json"
+        if not os.path.isfile(filename):
+            return False
+        with open(filename, "r") as fin:
+            meta = json.load(fin)
+        return (
+            meta["version"] == INDEX_VERSION
+            and meta["tokens"] == len(store)
+            and meta["store"] == LemmaIndex.store_fingerprint(store)
+        )
+
+    def __init__(self, store: COCAStore):
+        if not LemmaIndex.exists(store):
+            raise Exception("No up to date lemma index in %s; run LemmaIndex.build first." % store.store_dir)
+
+        self.store = store
+        self.pair_lemma = self._column("index_pair_lemma", LEMMA_DTYPE)
+        self.pair_pos = self._column("index_pair_pos", POS_DTYPE)
+        self.offsets = self._column("index_offsets", np.int64)
+        self.positions = self._column("index_positions", POSITION_DTYPE)
+
+    def _column(self, name: str, dtype) -> np.ndarray:
+        filename = f"{self.store.store_dir}/{name}.bin"
+        if os.path.getsize(filename) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(filename, dtype=dtype, mode="r")
+
+    def occurrences(self, lemma: Union[str, int], pos: str = None) -> np.ndarray:
+        """The sorted corpus positions of a lemma, optionally restricted to PoS tags starting with pos"""
+        lemma_id = self.store.lemma_id(lemma) if isinstance(lemma, str) else lemma
+        if lemma_id < 0:
+            return np.zeros(0, dtype=POSITION_DTYPE)
+
+        lo = np.searchsorted(self.pair_lemma, lemma_id, side="left")
+        hi = np.searchsorted(self.pair_lemma, lemma_id, side="right")
+        pairs = np.arange(lo, hi)
+        if pos is not None:
+            pairs = pairs[np.isin(self.pair_pos[lo:hi], self.store.pos_ids(pos))]
+
+        slices = [self.positions[self.offsets[p]:self.offsets[p + 1]] for p in pairs]
+        if len(slices) == 0:
+            return np.zeros(0, dtype=POSITION_DTYPE)
+        if len(slices) == 1:
+            return np.asarray(slices[0])
+        return np.sort(np.concatenate(slices))
+
+    def text_ids(self, positions: np.ndarray) -> np.ndarray:
+        return np.asarray(self.store.text_ids[positions])
+
+    def lookup(
+        self, queries: Iterable[Tuple[str, Union[str, None]]]
+    ) -> Dict[Tuple[str, Union[str, None]], Tuple[np.ndarray, np.ndarray]]:
+        """Batched lookup: maps each (lemma, pos) query to its (positions, textIDs)"""
+        results = {}
+        for query in queries:
+            if query in results:
+                continue
+            positions = self.occurrences(*query)
+            results[query] = (positions, self.text_ids(positions))
+        return results
@@ -0,0 +1,181 @@
+"""
+Windowed pattern matching over the integer token arrays of a COCAStore.
+
+The matcher looks for "VERB ... PREP ... NOUN" spans, e.g. the "kill with stones" instrument pattern
+("[verb] (usually/typically) by/with/using _NP_"). Every step is a vectorized operation over arrays of candidate
+positions, so no Python objects are created per token or per hit; sentences are only reconstructed on request.
+"""
+
+import numpy as np
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Tuple, Union
+
+from coca_index import LemmaIndex
+from coca_store import COCAStore
+
+
+@dataclass
+class PatternSpec:
+    prepositions: Tuple[str, ...] = ("by", "with", "using")  # word forms that introduce the NP (case-insensitive)
+    verb_pos: str = "v"  # PoS tag prefix of the verb occurrences
+    max_gap: int = 4  # maximum distance from the verb to the preposition
+    np_window: int = 3  # maximum distance from the preposition to the head of the NP
+    np_pos: Tuple[str, ...] = ("nn", "np")  # PoS tag prefixes of an NP head
+    stop_pos: Tuple[str, ...] = ("y",)  # PoS tag prefixes that end a window (punctuation)
+
+
+INSTRUMENT_PATTERN = PatternSpec()
+
+SENTENCE_END = {".", "!", "?"}
+
+
+# The matches are kept as parallel arrays, one entry per span.
+class PatternMatches(object):
+    def __init__(
+        self,
+        store: COCAStore,
+        verb_positions: np.ndarray,
+        prep_positions: np.ndarray,
+        np_positions: np.ndarray,
+    ):
+        self.store = store
+        self.verb_positions = verb_positions
+        self.prep_positions = prep_positions
+        self.np_positions = np_positions
+        self.text_ids = np.asarray(store.text_ids[verb_positions])
+
+    def __len__(self) -> int:
+        return len(self.verb_positions)
+
+    def span(self, i: int) -> Tuple[int, int, int]:
+        """The (textID, start, end) of a match; start and end are corpus positions, end is exclusive"""
+        return int(self.text_ids[i]), int(self.verb_positions[i]), int(self.np_positions[i]) + 1
+
+    def spans(self) -> Iterator[Tuple[int, int, int]]:
+        for i in range(len(self)):
+            yield self.span(i)
+
+    def text(self, i: int) -> str:
+        """The words of a match, from the verb to the head of the NP"""
+        return self._join(self.verb_positions[i], self.np_positions[i] + 1)
+
+    def sentence(self, i: int, max_context: int = 60) -> str:
+        """The sentence containing a match, bounded by sentence punctuation, the text and max_context tokens"""
+        text_id = self.text_ids[i]
+        start = int(self.verb_positions[i])
+        end = int(self.np_positions[i]) + 1
+
+        limit = max(start - max_context, 0)
+        while start > limit and self.store.text_ids[start - 1] == text_id and not self._ends_sentence(start - 1):
+            start -= 1
+
+        limit = min(end + max_context, len(self.store))
+        while end < limit and self.store.text_ids[end] == text_id:
+            end += 1
+            if self._ends_sentence(end - 1):
+                break
+
+        return self._join(start, end)
+
+    def _ends_sentence(self, position: int) -> bool:
+        return self.store.word(self.store.word_ids[position]) in SENTENCE_END
+
+    def _join(self, start: int, end: int) -> str:
+        return " ".join(self.store.word(w) for w in self.store.word_ids[start:end])
+
+
+def match_pattern(
+    store: COCAStore,
+    verbs: Iterable[Union[str, int]],
+    pattern: PatternSpec = INSTRUMENT_PATTERN,
+    index: LemmaIndex = None,
+    chunksize: int = 10_000_000,
+) -> PatternMatches:
+    """Finds every occurrence of one of the verb lemmas followed by the pattern's preposition and NP"""
+    verb_lemmas = np.asarray(
+        [store.lemma_id(v) if isinstance(v, str) else v for v in verbs], dtype=np.int64
+    )
+    verb_lemmas = verb_lemmas[verb_lemmas >= 0]
+
+    candidates = _verb_positions(store, verb_lemmas, pattern, index, chunksize)
+
+    prep_word_ids = store.word_ids_for(pattern.prepositions, ignore_case=True)
+    np_pos_ids = store.pos_ids(pattern.np_pos)
+    stop_pos_ids = store.pos_ids(pattern.stop_pos)
+
+    # Each step narrows the candidate arrays; candidates are processed in chunks to bound the temporary arrays.
+    verb_out, prep_out, np_out = [], [], []
+    for start in range(0, len(candidates), chunksize):
+        verbs_chunk = candidates[start:start + chunksize]
+
+        keep, prep_positions = _first_within(
+            store, verbs_chunk, pattern.max_gap, stop_pos_ids, lambda words, pos: np.isin(words, prep_word_ids)
+        )
+        verbs_chunk = verbs_chunk[keep]
+
+        keep, np_positions = _first_within(
+            store, prep_positions, pattern.np_window, stop_pos_ids, lambda words, pos: np.isin(pos, np_pos_ids)
+        )
+
+        verb_out.append(verbs_chunk[keep])
+        prep_out.append(prep_positions[keep])
+        np_out.append(np_positions)
+
+    if len(verb_out) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return PatternMatches(store, empty, empty, empty)
+
+    return PatternMatches(store, np.concatenate(verb_out), np.concatenate(prep_out), np.concatenate(np_out))
+
+
+def _verb_positions(
+    store: COCAStore, verb_lemmas: np.ndarray, pattern: PatternSpec, index: LemmaIndex, chunksize: int
+) -> np.ndarray:
+    if index is not None:
+        positions = [index.occurrences(int(l), pattern.verb_pos) for l in verb_lemmas]
+        if len(positions) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.sort(np.concatenate(positions))
+
+    # Without an index, the token columns are scanned once, a chunk at a time
+    verb_pos_ids = store.pos_ids(pattern.verb_pos)
+    positions = []
+    for start in range(0, len(store), chunksize):
+        hits = np.isin(store.token_lemmas(start, start + chunksize), verb_lemmas) & np.isin(
+            store.token_pos(start, start + chunksize), verb_pos_ids
+        )
+        positions.append(np.flatnonzero(hits) + start)
+    if len(positions) == 0:
+        return np.zeros(0, dtype=np.int64)
+    return np.concatenate(positions).astype(np.int64)
+
+
+def _first_within(
+    store: COCAStore, origins: np.ndarray, window: int, stop_pos_ids: np.ndarray, test
+) -> Tuple[np.ndarray, np.ndarray]:
+    # For every origin, the first position within window tokens (in the same text, and before any stop token)
+    # whose (wordIDs, PoS numbers) satisfy test. Returns the mask of origins that found one and the positions found.
+    found = np.full(len(origins), -1, dtype=np.int64)
+    open_ = np.ones(len(origins), dtype=bool)
+    text_ids = np.asarray(store.text_ids[origins]) if len(origins) > 0 else np.zeros(0, dtype=np.int32)
+
+    for distance in range(1, window + 1):
+        targets = origins + distance
+        open_ &= targets < len(store)
+        active = np.flatnonzero(open_)
+        if len(active) == 0:
+            break
+
+        positions = targets[active]
+        words = np.asarray(store.word_ids[positions])
+        pos = store.lex_pos[words]
+
+        same_text = np.asarray(store.text_ids[positions]) == text_ids[active]
+        hits = same_text & test(words, pos)
+        found[active[hits]] = positions[hits]
+
+        # Origins stop looking once they have a hit, leave their text or hit a stop token
+        open_[active[hits | ~same_text | np.isin(pos, stop_pos_ids)]] = False
+
+    keep = found >= 0
+    return keep, found[keep]
@@ -0,0 +1,312 @@
+"""
+Compact, memory-mapped columnar storage for the COCA corpus.
+
+A store is a directory written once from the raw COCA distribution (see COCA.build_store) and opened with
+numpy.memmap afterwards, so opening is nearly free and only the pages that are actually read are loaded.
+"""
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Callable, Iterable, List, Sequence, Tuple, Union
+
+import json
+import os
+import shutil
+
+
+STORE_VERSION = 1
+
+TOKEN_DTYPE = np.int32  # textID and wordID columns
+LEMMA_DTYPE = np.int32  # lemma number per wordID
+POS_DTYPE = np.int16  # PoS number per wordID
+OFFSET_DTYPE = np.int64  # string table offsets
+
+
+# A read-only table of strings: a utf-8 blob plus an offsets array, both memory-mapped.
+# String i is blob[offsets[i]:offsets[i + 1]].
+class StringTable(object):
+    @classmethod
+    def write(cls, strings: Iterable[str], path: str) -> int:
+        offsets = [0]
+        with open(f"{path}.bin", "wb") as fout:
+            for s in strings:
+                data = s.encode("utf-8")
+                fout.write(data)
+                offsets.append(offsets[-1] + len(data))
+
+        np.asarray(offsets, dtype=OFFSET_DTYPE).tofile(f"{path}.off")
+        return len(offsets) - 1
+
+    def __init__(self, path: str):
+        self.offsets = np.memmap(f"{path}.off", dtype=OFFSET_DTYPE, mode="r")
+        size = int(self.offsets[-1])
+        self.blob = np.memmap(f"{path}.bin", dtype=np.uint8, mode="r", shape=(size,)) if size > 0 else np.zeros(0, np.uint8)
+        self._index = None
+
+    def __getitem__(self, i: int) -> str:
+        return self.blob[self.offsets[i]:self.offsets[i + 1]].tobytes().decode("utf-8")
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def index(self, s: str) -> int:
+        # The reverse mapping is only built if it is needed.
+        if self._index is None:
+            self._index = {self[i]: i for i in range(len(self))}
+        return self._index.get(s, -1)
+
+    def find(self, s: str, ignore_case: bool = False) -> np.ndarray:
+        """The numbers of every string equal to s (ASCII case-insensitively if ignore_case), without decoding the table"""
+        target = np.frombuffer(s.encode("utf-8"), dtype=np.uint8)
+        lengths = np.diff(self.offsets)
+        candidates = np.flatnonzero(lengths == len(target))
+        if len(candidates) == 0 or len(target) == 0:
+            return candidates
+
+        data = self.blob[self.offsets[candidates][:, None] + np.arange(len(target))]
+        if ignore_case:
+            data = _ascii_lower(data)
+            target = _ascii_lower(target)
+        return candidates[(data == target).all(axis=1)]
+
+
+def _write_token_file(filename: str, out_dir: str, chunksize: int, truncate: bool = False) -> Tuple[int, int]:
+    # Appends the textID / wordID columns of one db_*.csv file to out_dir (or replaces the files in out_dir with them
+    # if truncate is set); returns the row count and largest wordID.
+    os.makedirs(out_dir, exist_ok=True)
+    rows = 0
+    max_word_id = -1
+    mode = "wb" if truncate else "ab"
+    with open(f"{out_dir}/text_ids.bin", mode) as ftext, open(f"{out_dir}/word_ids.bin", mode) as fword:
+        for chunk in pd.read_csv(filename, usecols=["textID", "wordID"], chunksize=chunksize):
+            word_ids = chunk["wordID"].to_numpy(dtype=TOKEN_DTYPE)
+            chunk["textID"].to_numpy(dtype=TOKEN_DTYPE).tofile(ftext)
+            word_ids.tofile(fword)
+            rows += len(word_ids)
+            if len(word_ids) > 0:
+                max_word_id = max(max_word_id, int(word_ids.max()))
+    return rows, max_word_id
+
+
+def _ascii_lower(data: np.ndarray) -> np.ndarray:
+    return np.where((data >= 65) & (data <= 90), data + 32, data).astype(np.uint8)
+
+
+# The on-disk layout of a store directory is:
+#   meta.json           - format version, token count, PoS tags
+#   text_ids.bin        - textID of every token (int32)
+#   word_ids.bin        - wordID of every token (int32)
+#   lex_lemma.bin       - lemma number of every wordID (int32, -1 if the wordID is not in the lexicon)
+#   lex_pos.bin         - PoS number of every wordID (int16, -1 if the wordID is not in the lexicon)
+#   words.bin/.off      - word form of every wordID
+#   lemmas.bin/.off     - lemma string of every lemma number
+class COCAStore(object):
+    @classmethod
+    def build(
+        cls,
+        store_dir: str,
+        token_files: List[str],
+        lexicon: DataFrame,
+        chunksize: int = 5_000_000,
+        progress: Callable[[float, str, str], None] = None,
+        workers: int = 1,
+    ) -> "COCAStore":
+        os.makedirs(store_dir, exist_ok=True)
+
+        if workers > 1 and len(token_files) > 1:
+            tokens, max_word_id = COCAStore._write_tokens_parallel(store_dir, token_files, chunksize, progress, workers)
+        else:
+            tokens, max_word_id = 0, -1
+            for path in [f"{store_dir}/text_ids.bin", f"{store_dir}/word_ids.bin"]:
+                open(path, "wb").close()
+            for file_no, filename in enumerate(token_files):
+                if progress is not None:
+                    progress(file_no / len(token_files), "Build COCA Store", os.path.basename(filename))
+                rows, max_id = _write_token_file(filename, store_dir, chunksize)
+                tokens += rows
+                max_word_id = max(max_word_id, max_id)
+        if progress is not None:
+            progress(1, "Build COCA Store")
+
+        pos_tags = COCAStore.write_lexicon(store_dir, lexicon, max_word_id + 1)
+        COCAStore.write_meta(store_dir, tokens, pos_tags)
+        return COCAStore(store_dir)
+
+    @staticmethod
+    def _write_tokens_parallel(
+        store_dir: str,
+        token_files: List[str],
+        chunksize: int,
+        progress: Callable[[float, str, str], None],
+        workers: int,
+    ) -> Tuple[int, int]:
+        # Every token file is converted into its own shard by a worker process; the shards are then concatenated
+        # in token_files order, so the result is identical to a sequential build regardless of completion order.
+        # Shards left behind by an interrupted build are removed first, so they are never concatenated again.
+        shutil.rmtree(f"{store_dir}/shards/", ignore_errors=True)
+        shard_dirs = [f"{store_dir}/shards/{i:05d}" for i in range(len(token_files))]
+        results = {}
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(_write_token_file, filename, shard_dir, chunksize, True): i
+                for i, (filename, shard_dir) in enumerate(zip(token_files, shard_dirs))
+            }
+            for done, future in enumerate(as_completed(futures)):
+                i = futures[future]
+                results[i] = future.result()
+                if progress is not None:
+                    progress((done + 1) / len(token_files), "Build COCA Store", os.path.basename(token_files[i]))
+
+        for name in ["text_ids", "word_ids"]:
+            with open(f"{store_dir}/{name}.bin", "wb") as fout:
+                for shard_dir in shard_dirs:
+                    with open(f"{shard_dir}/{name}.bin", "rb") as fin:
+                        shutil.copyfileobj(fin, fout, 16 * 1024 * 1024)
+        shutil.rmtree(f"{store_dir}/shards/")
+
+        tokens = sum(rows for rows, _ in results.values())
+        max_word_id = max(max_id for _, max_id in results.values())
+        return tokens, max_word_id
+
+    @classmethod
+    def build_from_documents(
+        cls,
+        store_dir: str,
+        documents: Iterable[Tuple[int, Sequence[str], Sequence[str], Sequence[str]]],
+        buffer_tokens: int = 5_000_000,
+    ) -> "COCAStore":
+        """Builds a store from a stream of (textID, words, lemmas, PoS tags) documents (e.g. the text/ or wlp/ layouts)"""
+        os.makedirs(store_dir, exist_ok=True)
+
+        # wordIDs are assigned to each distinct (word, lemma, PoS) triple in order of first appearance
+        vocabulary = {}
+        text_buffer, word_buffer = [], []
+        tokens = 0
+        with open(f"{store_dir}/text_ids.bin", "wb") as ftext, open(f"{store_dir}/word_ids.bin", "wb") as fword:
+
+            def flush():
+                np.asarray(text_buffer, dtype=TOKEN_DTYPE).tofile(ftext)
+                np.asarray(word_buffer, dtype=TOKEN_DTYPE).tofile(fword)
+                text_buffer.clear()
+                word_buffer.clear()
+
+            for text_id, words, lemmas, tags in documents:
+                for triple in zip(words, lemmas, tags):
+                    word_id = vocabulary.get(triple)
+                    if word_id is None:
+                        word_id = len(vocabulary) + 1
+                        vocabulary[triple] = word_id
+                    word_buffer.append(word_id)
+                text_buffer.extend([text_id] * len(words))
+                tokens += len(words)
+                if len(word_buffer) >= buffer_tokens:
+                    flush()
+            flush()
+
+        lexicon = pd.DataFrame(
+            [(word_id, word, lemma, tag) for (word, lemma, tag), word_id in vocabulary.items()],
+            columns=["wordID", "word", "lemma", "PoS"],
+        )
+        pos_tags = COCAStore.write_lexicon(store_dir, lexicon, len(vocabulary) + 1)
+        COCAStore.write_meta(store_dir, tokens, pos_tags)
+        return COCAStore(store_dir)
+
+    @staticmethod
+    def write_lexicon(store_dir: str, lexicon: DataFrame, size: int = 0) -> List[str]:
+        # The per-wordID arrays cover both the lexicon and every wordID used in the tokens, so they can be
+        # indexed directly with the token column. Rows without a numeric wordID (headers) are skipped.
+        word_ids = pd.to_numeric(lexicon["wordID"], errors="coerce")
+        lexicon = lexicon[word_ids.notna()]
+        word_ids = word_ids[word_ids.notna()].to_numpy(dtype=np.int64)
+        if len(word_ids) > 0:
+            size = max(size, int(word_ids.max()) + 1)
+
+        lemma_codes, lemmas = pd.factorize(lexicon["lemma"].astype(str))
+        pos_codes, pos_tags = pd.factorize(lexicon["PoS"].astype(str), sort=True)
+
+        lex_lemma = np.full(size, -1, dtype=LEMMA_DTYPE)
+        lex_lemma[word_ids] = lemma_codes
+        lex_lemma.tofile(f"{store_dir}/lex_lemma.bin")
+
+        lex_pos = np.full(size, -1, dtype=POS_DTYPE)
+        lex_pos[word_ids] = pos_codes
+        lex_pos.tofile(f"{store_dir}/lex_pos.bin")
+
+        words = np.full(size, "", dtype=object)
+        words[word_ids] = lexicon["word"].astype(str).to_numpy()
+        StringTable.write(words, f"{store_dir}/words")
+        StringTable.write(lemmas, f"{store_dir}/lemmas")
+
+        return list(pos_tags)
+
+    @staticmethod
+    def write_meta(store_dir: str, tokens: int, pos_tags: List[str]):
+        meta = {
+            "version": STORE_VERSION,
+            "tokens": tokens,
+            "pos": pos_tags,
+        }
+        with open(f"{store_dir}/meta.json", "w") as fout:
+            json.dump(meta, fout)
+
+    @staticmethod
+    def exists(store_dir: str) -> bool:
+        return os.path.isfile(f"{store_dir}/meta.json")
+
+    def __init__(self, store_dir: str):
+        self.store_dir = store_dir
+
+        with open(f"{store_dir}/meta.json", "r") as fin:
+            self.meta = json.load(fin)
+        if self.meta["version"] != STORE_VERSION:
+            raise Exception(
+                "COCA store %s has version %s, expected %s." % (store_dir, self.meta["version"], STORE_VERSION)
+            )
+
+        self.text_ids = self._column("text_ids", TOKEN_DTYPE, self.meta["tokens"])
+        self.word_ids = self._column("word_ids", TOKEN_DTYPE, self.meta["tokens"])
+        self.lex_lemma = self._column("lex_lemma", LEMMA_DTYPE)
+        self.lex_pos = self._column("lex_pos", POS_DTYPE)
+        self.words = StringTable(f"{store_dir}/words")
+        self.lemmas = StringTable(f"{store_dir}/lemmas")
+        self.pos_tags: List[str] = self.meta["pos"]
+
+    def _column(self, name: str, dtype, length: int = None) -> np.ndarray:
+        # numpy cannot memory-map empty files
+        if length == 0 or os.path.getsize(f"{self.store_dir}/{name}.bin") == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(f"{self.store_dir}/{name}.bin", dtype=dtype, mode="r")
+
+    def __len__(self) -> int:
+        return self.meta["tokens"]
+
+    def word(self, word_id: int) -> str:
+        return self.words[word_id]
+
+    def lemma(self, lemma_id: int) -> str:
+        return self.lemmas[lemma_id]
+
+    def pos(self, pos_id: int) -> str:
+        return self.pos_tags[pos_id]
+
+    def lemma_id(self, lemma: str) -> int:
+        return self.lemmas.index(lemma)
+
+    def word_ids_for(self, words: Iterable[str], ignore_case: bool = False) -> np.ndarray:
+        ids = [self.words.find(w, ignore_case) for w in words]
+        if len(ids) == 0:
+            return np.zeros(0, dtype=np.int64)
+        return np.unique(np.concatenate(ids))
+
+    def pos_ids(self, pos: Union[str, Iterable[str]]) -> np.ndarray:
+        # Numbers of the PoS tags that start with the given prefix(es); e.g., "v" matches every verb tag.
+        prefixes = (pos,) if isinstance(pos, str) else tuple(pos)
+        return np.asarray([i for i, tag in enumerate(self.pos_tags) if tag.startswith(prefixes)], dtype=POS_DTYPE)
+
+    def token_lemmas(self, start: int = 0, stop: int = None) -> np.ndarray:
+        return self.lex_lemma[self.word_ids[start:stop]]
+
+    def token_pos(self, start: int = 0, stop: int = None) -> np.ndarray:
+        return self.lex_pos[self.word_ids[start:stop]]
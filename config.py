@@ -1,6 +1,9 @@
 from knowledge.lexicon import Lexicon
 from knowledge.ontology import Ontology
+from knowledge.packed import PackedKnowledge
+from knowledge.shared import prepare_for_fork
 from ontomem.memory import MemoryManager
+from typing import Iterable
 
 import os
 import yaml
@@ -14,12 +17,18 @@ class OntoALAConfig:
             config_dict = yaml.load(config_file, Loader=yaml.FullLoader)
             return OntoALAConfig(
                 knowledge_file=config_dict["knowledge-file"],
+                sense_cache_size=config_dict.get("sense-cache-size"),
             )
 
-    def __init__(self, knowledge_file: str = None):
+    def __init__(self, knowledge_file: str = None, sense_cache_size: int = None):
         self.knowledge_file = self.parameter_environment_or_default(
             knowledge_file, "KNOWLEDGE-FILE", "knowledge/build/knowledge.om"
         )
+        self.sense_cache_size = int(
+            self.parameter_environment_or_default(
+                sense_cache_size, "SENSE-CACHE-SIZE", Lexicon.SHARED_CACHE_SIZE
+            )
+        )
 
     @staticmethod
     def parameter_environment_or_default(parameter, env_var: str, default):
@@ -31,8 +40,30 @@ class OntoALAConfig:
         return default
 
     def load_knowledge(self):
-        """Load knowledge into memory from a knowledge file"""
-        MemoryManager.load_memory(self.knowledge_file)
+        """Load knowledge into memory from a knowledge file; packed (.okp) files are opened lazily instead"""
+        if PackedKnowledge.is_packed(self.knowledge_file):
+            PackedKnowledge.load(self.knowledge_file)
+        else:
+            PackedKnowledge.unload()
+            MemoryManager.load_memory(self.knowledge_file)
+        Lexicon.invalidate_sense_index()
+        Lexicon.clear_shared_cache()
+        Lexicon.shared_cache().resize(self.sense_cache_size)
+        Lexicon.diathesis_index()
+        Ontology.invalidate_caches()
+
+    def load_shared_knowledge(self, senses: Iterable[str] = ()):
+        """Load knowledge once in a parent process, ready to be shared with forked workers"""
+        # Workers share the packed file through the page cache; the knowledge file is packed first if needed
+        if not PackedKnowledge.is_packed(self.knowledge_file):
+            self.knowledge_file = PackedKnowledge.pack(self.knowledge_file)
+        self.load_knowledge()
+        prepare_for_fork(senses)
+
+    @staticmethod
+    def initialize_worker(knowledge_file: str = None):
+        """Load knowledge once in a pipeline worker process (see pipeline.Scheduler)"""
+        OntoALAConfig(knowledge_file=knowledge_file).load_knowledge()
 
     @staticmethod
     def ontology() -> Ontology:
@@ -40,11 +71,12 @@ class OntoALAConfig:
         return Ontology()
 
     @staticmethod
-    def lexicon() -> Lexicon:
-        """Generates a new Lexicon object from the available knowledge"""
-        return Lexicon()
+    def lexicon(shared: bool = False) -> Lexicon:
+        """Generates a new Lexicon object from the available knowledge, optionally backed by the shared sense cache"""
+        return Lexicon(shared=shared)
 
     def to_dict(self) -> dict:
         return {
             "knowledge-file": self.knowledge_file,
+            "sense-cache-size": self.sense_cache_size,
         }
@@ -1,4 +1,4 @@
-from utils import load_knowledge_from_db
+from utils import load_knowledge_from_db, load_knowledge_incrementally
 
 import sys
 
@@ -9,6 +9,7 @@ if __name__ == "__main__":
     ont = None
     lex = None
     out = "build/knowledge.om"
+    incremental = False
 
     for arg in arguments:
         if arg.startswith("lex="):
@@ -17,17 +18,24 @@ if __name__ == "__main__":
             ont = arg.replace("ont=", "")
         if arg.startswith("out="):
             out = arg.replace("out=", "")
+        if arg == "incremental":
+            incremental = True
 
     if ont is None or lex is None:
-        print("Correct usage: builder.py lex=lexicon-version-here ont=ontology-version-here out=build/knowledge.om")
+        print("Correct usage: builder.py lex=lexicon-version-here ont=ontology-version-here out=build/knowledge.om [incremental]")
         print("out parameter is optional, defaults to build/knowledge.om")
+        print("incremental only re-imports what changed since the previous build of out (see its .manifest.json)")
         exit()
 
     print("Loading ontology from %s" % ont)
     print("Loading lexicon from %s" % lex)
     print("")
 
-    load_knowledge_from_db(ont, lex, save_to=out)
+    if incremental:
+        result = load_knowledge_incrementally(ont, lex, out)
+        print(result)
+    else:
+        load_knowledge_from_db(ont, lex, save_to=out)
 
     print("")
     print("Output to %s" % out)
\ No newline at end of file
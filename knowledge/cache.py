@@ -0,0 +1,68 @@
+from collections import OrderedDict
+from typing import Any, Dict, Hashable
+
+
+# A small bounded least-recently-used cache with hit / miss / eviction counters.
+# It is used to share expensive-to-build knowledge objects (parsed senses, ontology distances, etc.) across
+# wrapper instances within a single process.
+class LRUCache(object):
+
+    _MISSING = object()
+
+    def __init__(self, maxsize: int = 10000):
+        if maxsize < 0:
+            raise Exception("Cache size must be non-negative, got %d." % maxsize)
+
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self.data.get(key, LRUCache._MISSING)
+        if value is LRUCache._MISSING:
+            self.misses += 1
+            return default
+
+        self.data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        if self.maxsize == 0:
+            return
+
+        self.data[key] = value
+        self.data.move_to_end(key)
+        self._evict()
+
+    def resize(self, maxsize: int):
+        if maxsize < 0:
+            raise Exception("Cache size must be non-negative, got %d." % maxsize)
+
+        self.maxsize = maxsize
+        self._evict()
+
+    def clear(self):
+        self.data.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "size": len(self.data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def _evict(self):
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+            self.evictions += 1
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self.data
+
+    def __len__(self) -> int:
+        return len(self.data)
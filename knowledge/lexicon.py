@@ -1,8 +1,12 @@
 from collections import OrderedDict
 from dataclasses import dataclass
+from enum import Enum
+from knowledge.cache import LRUCache
+from knowledge.packed import PackedKnowledge, SENSE_SLOTS
+from ontomem.exceptions import SingletonError
 from ontomem.frame import Frame
 from ontomem.memory import MemoryManager
-from typing import List, Union
+from typing import Dict, Iterable, List, Tuple, Union
 
 from lex.api import LexiconAPI
 
@@ -10,16 +14,60 @@ from pprint import pprint
 import re
 
 
+SENSE_ID_PATTERN = re.compile("-[A-Z]+[0-9]+$")
+SENSE_POS_PATTERN = re.compile(r"(\w+?)(\d+)")
+
+
+class Diathesis(Enum):
+    INTRANSITIVE = "INTRANSITIVE"  # SUBJECT only
+    TRANSITIVE = "TRANSITIVE"  # SUBJECT and DIRECTOBJECT
+    DITRANSITIVE = "DITRANSITIVE"  # SUBJECT, DIRECTOBJECT and INDIRECTOBJECT (or SUBJECT and INDIRECTOBJECT)
+    PHRASAL = "PHRASAL"  # any of the above plus a particle / preposition
+    OTHER = "OTHER"  # no subject, or other constituents (clauses, adjuncts, ...)
+
+
+BASIC_DIATHESES = (Diathesis.INTRANSITIVE, Diathesis.TRANSITIVE, Diathesis.DITRANSITIVE)
+
+
+def _sense_pos(id: str) -> str:
+    # The POS of a sense id is the alphabetic prefix of its last dash-separated part (e.g., HIT-V1 -> V).
+    return SENSE_POS_PATTERN.findall(id.split("-")[-1])[0][0]
+
+
 # The lexicon is a heavy wrapper around the OntoMem memory.
 # It takes lexicon frames and converts them (as needed) into Word and Sense object instances which are cached
 # in the lexicon instance.
 # As the analysis task writes temporary (per-sentence) lexicon senses from the syntax, those senses are parsed
 # from the lisp input and stored in the lexicon instance - not in the OntoMem memory; consequently, they are
 # "forgotten" when the next sentence runs (the lexicon instance is remade).
+# Optionally, senses parsed from memory can also be kept in a process-wide bounded cache shared by all lexicon
+# instances created with shared=True; temporary senses are only ever written to the per-instance cache, which
+# acts as an overlay on top of the shared cache.
 class Lexicon(object):
 
     _null_sense = None
 
+    SHARED_CACHE_SIZE = 10000
+
+    _shared_cache = None
+    _shared_cache_memory = None
+
+    # The sense index maps each sense id (e.g., HIT-V1) to the names of the LEX-WORD frames that define it.
+    # It is built once per loaded memory and shared by every lexicon instance; it is rebuilt automatically
+    # if MemoryManager.memory is replaced, and can be invalidated explicitly when senses are added to memory.
+    _sense_index = None
+    _sense_index_memory = None
+
+    # The structure index maps the canonical (CAT, SYN-STRUC, SEM-STRUC) key of every LEX-WORD frame to the ids
+    # of the senses that share it; it follows the same lifecycle as the sense index.
+    _structure_index = None
+    _structure_index_memory = None
+
+    # The diathesis index maps each Diathesis class to the sorted ids of the verb senses whose syn-struc has
+    # that shape; it follows the same lifecycle as the sense index.
+    _diathesis_index = None
+    _diathesis_index_memory = None
+
     @classmethod
     def null_sense(cls) -> "Sense":
         if Lexicon._null_sense is None:
@@ -28,44 +76,176 @@ class Lexicon(object):
             )
         return Lexicon._null_sense
 
-    def __init__(self):
+    @classmethod
+    def sense_index(cls) -> Dict[str, List[str]]:
+        if Lexicon._sense_index is None or Lexicon._sense_index_memory is not MemoryManager.memory:
+            index = {}
+            for frame in Frame("LEX-WORD").descendants():
+                try:
+                    id = frame["SENSE"].singleton()
+                except SingletonError:
+                    continue
+                if not isinstance(id, str) or not SENSE_ID_PATTERN.search(id):
+                    continue
+                if _sense_pos(id) not in frame.concept.split(".", 1)[-1]:
+                    continue
+                index.setdefault(id, []).append(frame.concept)
+
+            Lexicon._sense_index = index
+            Lexicon._sense_index_memory = MemoryManager.memory
+
+        return Lexicon._sense_index
+
+    @classmethod
+    def structure_index(cls) -> Dict[tuple, List[str]]:
+        if PackedKnowledge.active is not None:
+            return PackedKnowledge.active.index("structures")
+
+        if Lexicon._structure_index is None or Lexicon._structure_index_memory is not MemoryManager.memory:
+            index = {}
+            for frame in Frame("LEX-WORD").descendants():
+                try:
+                    id = frame["SENSE"].singleton()
+                    key = Sense.structure_key_of(
+                        frame["CAT"].singleton(),
+                        SynStruc(frame["SYN-STRUC"].singleton()),
+                        SemStruc(frame["SEM-STRUC"].singleton()),
+                    )
+                except SingletonError:
+                    continue
+                index.setdefault(key, []).append(id)
+
+            Lexicon._structure_index = index
+            Lexicon._structure_index_memory = MemoryManager.memory
+
+        return Lexicon._structure_index
+
+    @classmethod
+    def diathesis_index(cls) -> Dict["Diathesis", List[str]]:
+        if PackedKnowledge.active is not None:
+            return PackedKnowledge.active.index("diatheses")
+
+        if Lexicon._diathesis_index is None or Lexicon._diathesis_index_memory is not MemoryManager.memory:
+            index = {d: [] for d in Diathesis}
+            for frame in Frame("LEX-WORD").descendants():
+                try:
+                    if frame["CAT"].singleton() != "V":
+                        continue
+                    id = frame["SENSE"].singleton()
+                    diathesis = SynStruc(frame["SYN-STRUC"].singleton()).diathesis()
+                except SingletonError:
+                    continue
+                index[diathesis].append(id)
+
+            for ids in index.values():
+                ids.sort()
+
+            Lexicon._diathesis_index = index
+            Lexicon._diathesis_index_memory = MemoryManager.memory
+
+        return Lexicon._diathesis_index
+
+    @classmethod
+    def invalidate_sense_index(cls):
+        Lexicon._sense_index = None
+        Lexicon._sense_index_memory = None
+        Lexicon._structure_index = None
+        Lexicon._structure_index_memory = None
+        Lexicon._diathesis_index = None
+        Lexicon._diathesis_index_memory = None
+
+    @classmethod
+    def shared_cache(cls) -> LRUCache:
+        if Lexicon._shared_cache is None:
+            Lexicon._shared_cache = LRUCache(maxsize=Lexicon.SHARED_CACHE_SIZE)
+
+        # Parsed senses are only valid for the memory they were parsed from
+        if Lexicon._shared_cache_memory is not MemoryManager.memory:
+            Lexicon._shared_cache.clear()
+            Lexicon._shared_cache_memory = MemoryManager.memory
+
+        return Lexicon._shared_cache
+
+    @classmethod
+    def clear_shared_cache(cls):
+        if Lexicon._shared_cache is not None:
+            Lexicon._shared_cache.clear()
+
+    def __init__(self, shared: bool = False):
+        self.shared = shared
         self.sense_cache = {}
 
     def sense(self, id: str) -> "Sense":
         # If the requested id is nulled, return the singleton null sense.
         # TODO: replace this detection with a check for the explicit null sense flag
-        if not re.findall("-[A-Z]+[0-9]+$", id):
+        if not SENSE_ID_PATTERN.search(id):
             return Lexicon.null_sense()
 
-        if id not in self.sense_cache:
-            lexword = Frame("LEX-WORD")
+        if id in self.sense_cache:
+            return self.sense_cache[id]
+
+        cache = Lexicon.shared_cache() if self.shared else None
+        s = cache.get(id) if cache is not None else None
+
+        if s is None:
+            record = PackedKnowledge.active.sense(id) if PackedKnowledge.active is not None else None
+            if record is not None:
+                s = Sense.from_record(record)
+            else:
+                frames = self._sense_frames(id)
+
+                # There should be exactly one (if it is defined)
+                if len(frames) == 0:
+                    raise Exception("Unknown lexical sense %s." % id)
+                if len(frames) > 1:
+                    raise Exception("More than one match found for lexical sense %s." % id)
+
+                # Parse the frame into a sense
+                s = Sense.from_frame(frames[0])
+
+            if cache is not None:
+                cache.put(id, s)
+
+        self.sense_cache[id] = s
+        return s
+
+    def _sense_frames(self, id: str) -> List[Frame]:
+        index = Lexicon.sense_index()
+        if id in index:
+            return [Frame(name) for name in index[id]]
+
+        # Senses written to memory after the index was built are not in it; fall back to scanning the slots
+        # and record the result so the next lookup is a direct hit.
+        lexword = Frame("LEX-WORD")
 
-            # Find all slots that are SENSE=id
-            slots = MemoryManager.memory.slots_by_filler[id]
-            slots = filter(lambda s: s[-1] == "SENSE", slots)
+        # Find all slots that are SENSE=id
+        slots = MemoryManager.memory.slots_by_filler[id]
+        slots = filter(lambda s: s[-1] == "SENSE", slots)
 
-            # Find all frames that own those slots that are isa=LEX-WORD
-            frames = map(lambda s: Frame(s[0]), slots)
-            frames = filter(lambda f: f.isa(lexword), frames)
-            frames = list(frames)
+        # Find all frames that own those slots that are isa=LEX-WORD
+        frames = map(lambda s: Frame(s[0]), slots)
+        frames = filter(lambda f: f.isa(lexword), frames)
+        frames = list(frames)
 
-            # Find all frames that fit the desired POS
-            pos = [re.findall(r"(\w+?)(\d+)", id.split("-")[-1])[0]][0][0]
-            frames = [f for f in frames if pos in str(f).split(".", 1)[-1]]
+        # Find all frames that fit the desired POS
+        pos = _sense_pos(id)
+        frames = [f for f in frames if pos in str(f).split(".", 1)[-1]]
 
-            # There should be exactly one (if it is defined)
-            if len(frames) == 0:
-                raise Exception("Unknown lexical sense %s." % id)
-            if len(frames) > 1:
-                raise Exception("More than one match found for lexical sense %s." % id)
+        if len(frames) > 0:
+            index[id] = [f.concept for f in frames]
 
-            frame = frames[0]
+        return frames
 
-            # Parse the frame into a sense, and cache it
-            s = Sense.from_frame(frame)
-            self.sense_cache[id] = s
+    def structural_synonyms(self, sense: "Sense") -> List["Sense"]:
+        # Senses of other words that have the exact same syn-struc / sem-struc combination as the input sense.
+        word = sense.id.split("-")[0]
+        ids = Lexicon.structure_index().get(sense.structure_key(), [])
+        return [self.sense(id) for id in ids if id.split("-")[0] != word]
 
-        return self.sense_cache[id]
+    def senses_with_diathesis(self, diatheses: Iterable["Diathesis"]) -> List[str]:
+        # The ids of the verb senses in memory with any of the given diatheses, sorted.
+        index = Lexicon.diathesis_index()
+        return sorted(id for d in diatheses for id in index[d])
 
     def add_sense(self, sense: "Sense"):
         self.sense_cache[sense.id] = sense
@@ -146,22 +326,27 @@ class Sense(object):
 
     @classmethod
     def from_frame(cls, frame: Frame) -> "Sense":
-        id = frame["SENSE"].singleton()
-        pos = frame["CAT"].singleton()
-        synstruc = SynStruc(frame["SYN-STRUC"].singleton())
-        semstruc = SemStruc(frame["SEM-STRUC"].singleton())
+        return Sense.from_record({slot: frame[slot].singleton() for slot in SENSE_SLOTS})
+
+    @classmethod
+    def from_record(cls, record: dict) -> "Sense":
+        # Builds a sense from the slot fillers of a LEX-WORD frame (see SENSE_SLOTS)
+        id = record["SENSE"]
+        pos = record["CAT"]
+        synstruc = SynStruc(record["SYN-STRUC"])
+        semstruc = SemStruc(record["SEM-STRUC"])
         meaning_procedures = list(
             map(
-                lambda mp: MeaningProcedure(mp), frame["MEANING-PROCEDURES"].singleton()
+                lambda mp: MeaningProcedure(mp), record["MEANING-PROCEDURES"]
             )
         )
-        synonyms = frame["SYNONYMS"].singleton()
+        synonyms = record["SYNONYMS"]
         if synonyms == "NIL":
             synonyms = None
         else:
             synonyms = [s for s in synonyms]
 
-        hyponyms = frame["HYPONYMS"].singleton()
+        hyponyms = record["HYPONYMS"]
         if hyponyms == "NIL":
             hyponyms = None
         else:
@@ -169,6 +354,10 @@ class Sense(object):
 
         return Sense(id, pos, synstruc, semstruc, meaning_procedures, synonyms, hyponyms)
 
+    @staticmethod
+    def structure_key_of(pos: str, synstruc: "SynStruc", semstruc: "SemStruc") -> tuple:
+        return pos, synstruc.canonical(), semstruc.canonical()
+
     def __init__(
         self,
         id: str,
@@ -188,6 +377,11 @@ class Sense(object):
         self.synonyms = synonyms
         self.hyponyms = hyponyms
 
+    def structure_key(self) -> tuple:
+        # A hashable, canonical key of the structural part of the sense; two senses have the same key exactly
+        # when their POS, syn-struc and sem-struc are equivalent.
+        return Sense.structure_key_of(self.pos, self.synstruc, self.semstruc)
+
     def add_synonyms(self, synonyms):
         self.synonyms = synonyms
 
@@ -207,7 +401,7 @@ class Sense(object):
         repl = repl.upper()
         orig = self.id.split("-")[0]
 
-        dup_synonyms = [s for s in self.hyponyms if s != repl]
+        dup_synonyms = [s for s in self.hyponyms or [] if s != repl]
 
         duplicate_sense = Sense(
             self.id.replace(orig, repl),
@@ -246,12 +440,59 @@ class Sense(object):
 # SynStruc is a simple object wrapper for now; an ordered dict matching the database representation is sufficient
 # as the semantic analyzer doesn't current use the synstruc.
 class SynStruc(object):
+
+    ARGUMENTS = ("SUBJECT", "DIRECTOBJECT", "INDIRECTOBJECT")
+    PARTICLE_CATS = {"PREP", "PRT", "PART"}
+
     def __init__(self, data: OrderedDict):
         self.data = data
 
+    def shape(self) -> Tuple[Tuple[str, str], ...]:
+        # The fingerprint of the syn-struc: the (constituent, CAT) pairs of its top level, in order, without the
+        # ROOT / CAT of the head itself.
+        if not isinstance(self.data, dict):
+            return ()
+        shape = []
+        for k, v in self.data.items():
+            if k in ("ROOT", "CAT"):
+                continue
+            cat = v.get("CAT") if isinstance(v, dict) else None
+            shape.append((k, cat))
+        return tuple(shape)
+
+    def diathesis(self) -> "Diathesis":
+        return SynStruc.classify(self.shape())
+
+    @staticmethod
+    def classify(shape: Tuple[Tuple[str, str], ...]) -> "Diathesis":
+        arguments = set()
+        particle = False
+        for k, cat in shape:
+            k = k.rstrip("0123456789")
+            if k in SynStruc.ARGUMENTS:
+                arguments.add(k)
+            elif cat in SynStruc.PARTICLE_CATS or k == "PP":
+                particle = True
+            else:
+                return Diathesis.OTHER
+
+        if "SUBJECT" not in arguments:
+            return Diathesis.OTHER
+        if particle:
+            return Diathesis.PHRASAL
+        if "INDIRECTOBJECT" in arguments:
+            return Diathesis.DITRANSITIVE
+        if "DIRECTOBJECT" in arguments:
+            return Diathesis.TRANSITIVE
+        return Diathesis.INTRANSITIVE
+
     def to_dict(self) -> dict:
         return self.data
 
+    def canonical(self) -> tuple:
+        # The order of syn-struc constituents is significant, so it is preserved.
+        return _canonical(self.data, ordered=True)
+
     def to_str(self, indent: int = 40) -> str:
         s = ""
         for k, v in self.data.items():
@@ -320,53 +561,93 @@ class SemStruc(object):
 
         self.data = data
 
-    def elements(
-        self,
-    ) -> List[
-        Union["SemStruc.Head", "SemStruc.Sub", "SemStruc.RefSem", "SemStruc.Variable"]
-    ]:
-        results = []
+    # The elements are parsed once, on first access, and kept (along with the typed views of them) until data is
+    # reassigned. The accessors return the cached lists directly; callers should treat them as read-only.
+    # If data is modified in place, call invalidate() to force the elements to be reparsed.
+    @property
+    def data(self) -> dict:
+        return self._data
+
+    @data.setter
+    def data(self, data: dict):
+        self._data = data
+        self.invalidate()
+
+    def invalidate(self):
+        self._elements = None
+        self._head = None
+        self._subs = None
+        self._refsems = None
+        self._variables = None
+
+    def _parse(self):
+        elements = []
+        head = None
+        subs = []
+        refsems = []
+        variables = []
 
         sub_index = 0
-        for k, v in self.data.items():
+        for k, v in self._data.items():
             if k.startswith("REFSEM"):
-                index = int(k.replace("REFSEM", ""))
-                results.append(SemStruc.RefSem(index, SemStruc(v)))
-                continue
-            if k.startswith("^$VAR"):
-                index = int(k.replace("^$VAR", ""))
-                results.append(SemStruc.Variable(index, v))
-                continue
-
+                element = SemStruc.RefSem(int(k[6:]), SemStruc(v))
+                refsems.append(element)
+            elif k.startswith("^$VAR"):
+                element = SemStruc.Variable(int(k[5:]), v)
+                variables.append(element)
             # TODO: Here, if k is not a concept, probably should error, skip, or output some sort of "other"
-            if sub_index == 0:
-                results.append(SemStruc.Head(k, v))
+            elif sub_index == 0:
+                element = SemStruc.Head(k, v)
+                head = element
                 sub_index += 1
             else:
-                results.append(SemStruc.Sub(sub_index, k, v))
+                element = SemStruc.Sub(sub_index, k, v)
+                subs.append(element)
                 sub_index += 1
 
-        return results
+            elements.append(element)
 
-    def head(self) -> Union["SemStruc.Head", None]:
-        for e in self.elements():
-            if isinstance(e, SemStruc.Head):
-                return e
+        self._elements = elements
+        self._head = head
+        self._subs = subs
+        self._refsems = refsems
+        self._variables = variables
 
-        return None
+    def elements(
+        self,
+    ) -> List[
+        Union["SemStruc.Head", "SemStruc.Sub", "SemStruc.RefSem", "SemStruc.Variable"]
+    ]:
+        if self._elements is None:
+            self._parse()
+        return self._elements
+
+    def head(self) -> Union["SemStruc.Head", None]:
+        if self._elements is None:
+            self._parse()
+        return self._head
 
     def subs(self) -> List["SemStruc.Sub"]:
-        return list(filter(lambda e: isinstance(e, SemStruc.Sub), self.elements()))
+        if self._elements is None:
+            self._parse()
+        return self._subs
 
     def refsems(self) -> List["SemStruc.RefSem"]:
-        return list(filter(lambda e: isinstance(e, SemStruc.RefSem), self.elements()))
+        if self._elements is None:
+            self._parse()
+        return self._refsems
 
     def variables(self) -> List["SemStruc.Variable"]:
-        return list(filter(lambda e: isinstance(e, SemStruc.Variable), self.elements()))
+        if self._elements is None:
+            self._parse()
+        return self._variables
 
     def to_dict(self) -> dict:
         return self.data
 
+    def canonical(self) -> tuple:
+        return _canonical(self.data, ordered=False)
+
     def to_str(self, indent: int = 40) -> str:
         s = ""
         for k, v in self.data.items():
@@ -382,6 +663,18 @@ class SemStruc(object):
         return super().__eq__(other)
 
 
+def _canonical(value, ordered: bool):
+    # Converts nested dicts / lists into hashable tuples; dict items are sorted by key unless ordered is set.
+    if isinstance(value, dict):
+        items = [(k, _canonical(v, ordered)) for k, v in value.items()]
+        if not ordered:
+            items.sort(key=lambda i: str(i[0]))
+        return ("{}",) + tuple(items)
+    if isinstance(value, (list, tuple)):
+        return ("[]",) + tuple(_canonical(v, ordered) for v in value)
+    return value
+
+
 class MeaningProcedure(object):
     def __init__(self, data: List[Union[str, List[str]]]):
         if len(data) == 0:
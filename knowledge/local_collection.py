@@ -0,0 +1,81 @@
+from typing import Iterable, Iterator, List
+
+import copy
+import json
+
+
+# A local, in-memory stand-in for the ontology / lexicon database collections.
+# It implements the small part of the collection and API interfaces that the knowledge loaders use (find with an
+# equality filter, cursor batch sizes, relations, all_senses), so the loaders can run against fixtures or exported
+# JSON files instead of a database.
+class LocalCollection(object):
+    @classmethod
+    def from_file(cls, filename: str) -> "LocalCollection":
+        with open(filename, "r") as fin:
+            return LocalCollection(json.load(fin))
+
+    def __init__(self, documents: Iterable[dict] = ()):
+        self.documents: List[dict] = list(documents)
+
+    def find(self, query: dict = None, projection: dict = None) -> "LocalCursor":
+        return LocalCursor(self, query or {}, projection)
+
+    def insert_one(self, document: dict):
+        self.documents.append(document)
+
+    def replace_one(self, query: dict, document: dict):
+        for i, d in enumerate(self.documents):
+            if LocalCursor.matches(d, query):
+                self.documents[i] = document
+                return
+
+    def delete_one(self, query: dict):
+        for i, d in enumerate(self.documents):
+            if LocalCursor.matches(d, query):
+                del self.documents[i]
+                return
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+
+class LocalCursor(object):
+    def __init__(self, collection: LocalCollection, query: dict, projection: dict = None):
+        self.collection = collection
+        self.query = query
+        self.projection = projection
+        self.size = 0
+
+    @staticmethod
+    def matches(document: dict, query: dict) -> bool:
+        return all(document.get(k) == v for k, v in query.items())
+
+    def batch_size(self, size: int) -> "LocalCursor":
+        self.size = size
+        return self
+
+    def __iter__(self) -> Iterator[dict]:
+        # Documents are copied, as a database would return new documents on every read
+        for document in self.collection.documents:
+            if not LocalCursor.matches(document, self.query):
+                continue
+            if self.projection is not None:
+                document = {k: v for k, v in document.items() if self.projection.get(k)}
+            yield copy.deepcopy(document)
+
+
+class LocalOntologyAPI(object):
+    def __init__(self, concepts: LocalCollection, relations: Iterable[str] = ()):
+        self.collection = concepts
+        self.relation_names = list(relations)
+
+    def relations(self, inverses: bool = False) -> List[str]:
+        return list(self.relation_names)
+
+
+class LocalLexiconAPI(object):
+    def __init__(self, senses: LocalCollection):
+        self.collection = senses
+
+    def all_senses(self) -> List[dict]:
+        return list(self.collection.find({}))
@@ -1,67 +1,268 @@
+from knowledge.cache import LRUCache
+from knowledge.packed import PackedConcept, PackedKnowledge
 from ontomem.exceptions import SingletonError
 from ontomem.frame import Frame
 from ontomem.memory import MemoryManager
-from typing import Dict, Set, Union
+from types import MappingProxyType
+from typing import Dict, FrozenSet, Iterable, List, Mapping, Set, Union
+
+import sys
 
 
 # The ontology is a lightweight wrapper around the OntoMem memory.
 # It provides direct access to OntoMem frames, and some convenience methods.
 # The analysis task doesn't currently write any data to the ontology, so this simple interface is fine.
 class Ontology(object):
-    def concept(self, name: str) -> Frame:
-        name = name.upper()
-        if name not in MemoryManager.memory.frames:
-            raise Exception("Unknown concept %s." % name)
+
+    # The ancestor closure is shared by every ontology instance; it is rebuilt automatically if
+    # MemoryManager.memory is replaced, and can be invalidated explicitly when the memory is reloaded in place.
+    _closure = None
+    _closure_memory = None
+
+    # Shortest (descendant, ancestor) distances are memoized in a bounded cache with the same lifecycle.
+    DISTANCE_CACHE_SIZE = 100000
+
+    _distance_cache = None
+    _distance_cache_memory = None
+
+    _MISSING = object()
+
+    # The relation tables never change after the knowledge is loaded, so they are computed once per memory.
+    _relation_tables = None
+    _relation_tables_memory = None
+
+    @classmethod
+    def closure(cls) -> "AncestorClosure":
+        if Ontology._closure is None or Ontology._closure_memory is not MemoryManager.memory:
+            Ontology._closure = AncestorClosure()
+            Ontology._closure_memory = MemoryManager.memory
+
+        return Ontology._closure
+
+    @classmethod
+    def distance_cache(cls) -> LRUCache:
+        if Ontology._distance_cache is None:
+            Ontology._distance_cache = LRUCache(maxsize=Ontology.DISTANCE_CACHE_SIZE)
+
+        if Ontology._distance_cache_memory is not MemoryManager.memory:
+            Ontology._distance_cache.clear()
+            Ontology._distance_cache_memory = MemoryManager.memory
+
+        return Ontology._distance_cache
+
+    @classmethod
+    def invalidate_caches(cls):
+        Ontology._closure = None
+        Ontology._closure_memory = None
+        if Ontology._distance_cache is not None:
+            Ontology._distance_cache.clear()
+        Ontology._relation_tables = None
+        Ontology._relation_tables_memory = None
+
+    def concept(self, name: str) -> Union[Frame, PackedConcept]:
+        name = self._name(name)
+        if PackedKnowledge.active is not None and PackedKnowledge.active.has_concept(name):
+            return PackedKnowledge.active.concept(name)
         return Frame(name)
 
     def common_ancestors(self, a: str, b: str) -> Set[str]:
-        a_ancestors = set(map(lambda f: f.concept, self.concept(a).ancestors()))
-        b_ancestors = set(map(lambda f: f.concept, self.concept(b).ancestors()))
+        closure = Ontology.closure()
+        return closure.names(closure.ancestors(self._name(a)) & closure.ancestors(self._name(b)))
+
+    def isa(self, descendant: str, ancestor: str) -> bool:
+        descendant = self._name(descendant)
+        ancestor = self._name(ancestor)
+        if descendant == ancestor:
+            return True
 
-        ancestors = a_ancestors.intersection(b_ancestors)
-        return ancestors
+        return Ontology.closure().is_ancestor(descendant, ancestor)
 
     def distance_to_ancestor(self, descendant: str, ancestor: str) -> Union[int, None]:
-        if descendant == ancestor:
-            return 0
-
-        ancestor = self.concept(ancestor)
-
-        def _find_ancestor(start: Frame, distance: int) -> Union[int, None]:
-            distances = []
-            for parent in start.parents():
-                if parent == ancestor:
-                    return distance + 1
-                d = _find_ancestor(parent, distance + 1)
-                if d is None:
-                    continue
-                distances.append(d)
-
-            if len(distances) == 0:
-                return None
-
-            return min(distances)
-
-        result = _find_ancestor(self.concept(descendant), 0)
-        return result
-
-    def relations(self) -> Set[str]:
-        descendants = set(
-            map(lambda f: f.concept, self.concept("RELATION").descendants())
-        )
-        descendants.add("RELATION")
-        return descendants
-
-    def inverses(self) -> Dict[str, str]:
-        relation = self.concept("RELATION")
-        relations = relation.descendants()
-        relations.add(relation)
-
-        inv = {}
-        for r in relations:
-            try:
-                inv[r["INVERSE"].singleton()] = r.concept
-            except SingletonError:
-                inv["%s-INVERSE" % r.concept] = r.concept
-
-        return inv
+        return self.distances_to_ancestors(descendant, [ancestor])[ancestor]
+
+    def distances_to_ancestors(self, descendant: str, ancestors: Iterable[str]) -> Dict[str, Union[int, None]]:
+        # Returns the length of the shortest parent path from the descendant to each of the ancestors (or None if
+        # a concept is not an ancestor); all uncached distances are found in a single breadth-first traversal.
+        descendant = self._name(descendant)
+        closure = Ontology.closure()
+        cache = Ontology.distance_cache()
+
+        results = {}
+        targets = {}
+        for a in ancestors:
+            name = self._name(a)
+            if name == descendant:
+                results[a] = 0
+                continue
+
+            distance = cache.get((descendant, name), Ontology._MISSING)
+            if distance is not Ontology._MISSING:
+                results[a] = distance
+                continue
+
+            # Concepts that are not ancestors at all never need a traversal
+            if not closure.is_ancestor(descendant, name):
+                results[a] = None
+                continue
+
+            targets.setdefault(name, []).append(a)
+
+        if len(targets) == 0:
+            return results
+
+        remaining = set(targets.keys())
+        found = {}
+        visited = {descendant}
+        frontier = [descendant]
+        distance = 0
+        while len(frontier) > 0 and len(remaining) > 0:
+            distance += 1
+            next_frontier = []
+            for concept in frontier:
+                for parent in closure.parents(concept):
+                    if parent in visited:
+                        continue
+                    visited.add(parent)
+                    if parent in remaining:
+                        found[parent] = distance
+                        remaining.discard(parent)
+                    next_frontier.append(parent)
+            frontier = next_frontier
+
+        for name, inputs in targets.items():
+            distance = found.get(name)
+            cache.put((descendant, name), distance)
+            for a in inputs:
+                results[a] = distance
+
+        return results
+
+    def relations(self) -> FrozenSet[str]:
+        return self._relation_table()[0]
+
+    def inverses(self) -> Mapping[str, str]:
+        # Maps each inverse relation to the relation it inverts.
+        return self._relation_table()[1]
+
+    def relation_inverses(self) -> Mapping[str, str]:
+        # Maps each relation to its inverse.
+        return self._relation_table()[2]
+
+    def _relation_table(self) -> tuple:
+        if Ontology._relation_tables is None or Ontology._relation_tables_memory is not MemoryManager.memory:
+            if PackedKnowledge.active is not None:
+                rel = dict(PackedKnowledge.active.index("relations"))
+            else:
+                relation = self.concept("RELATION")
+                relations = relation.descendants()
+                relations.add(relation)
+
+                rel = {}
+                for r in relations:
+                    try:
+                        inverse = r["INVERSE"].singleton()
+                    except SingletonError:
+                        inverse = "%s-INVERSE" % r.concept
+                    rel[r.concept] = inverse
+            inv = {inverse: relation for relation, inverse in rel.items()}
+
+            Ontology._relation_tables = (
+                frozenset(rel.keys()),
+                MappingProxyType(inv),
+                MappingProxyType(rel),
+            )
+            Ontology._relation_tables_memory = MemoryManager.memory
+
+        return Ontology._relation_tables
+
+    def _name(self, name: str) -> str:
+        name = name.upper()
+        if name not in MemoryManager.memory.frames:
+            if PackedKnowledge.active is None or not PackedKnowledge.active.has_concept(name):
+                raise Exception("Unknown concept %s." % name)
+        return name
+
+
+# The transitive closure of the ontology's parent relation.
+# Each concept is given an integer id the first time it is seen; the ancestors of a concept are stored as an
+# integer bitset of those ids, so intersections and subsumption tests are single integer operations.
+# Concepts are added to the closure lazily (along with their ancestors) on first use.
+class AncestorClosure(object):
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.concepts: List[str] = []
+        self.bits: Dict[str, int] = {}
+        self.parents_by_concept: Dict[str, List[str]] = {}
+
+    def id(self, name: str) -> int:
+        id = self.ids.get(name)
+        if id is None:
+            id = len(self.concepts)
+            self.ids[name] = id
+            self.concepts.append(name)
+        return id
+
+    def parents(self, name: str) -> List[str]:
+        parents = self.parents_by_concept.get(name)
+        if parents is None and PackedKnowledge.active is not None:
+            parents = PackedKnowledge.active.parents(name)
+        if parents is None:
+            parents = [p.concept for p in Frame(name).parents()]
+        self.parents_by_concept[name] = parents
+        return parents
+
+    def ancestors(self, name: str) -> int:
+        bits = self.bits.get(name)
+        if bits is not None:
+            return bits
+
+        # Iterative post-order walk over the parents, so deep chains do not hit the recursion limit
+        visiting = set()
+        stack = [name]
+        while len(stack) > 0:
+            current = stack[-1]
+            if current in self.bits:
+                stack.pop()
+                continue
+
+            visiting.add(current)
+            parents = self.parents(current)
+
+            # Parents that are still being visited form a cycle; they are treated as plain ancestors
+            pending = [p for p in parents if p not in self.bits and p not in visiting]
+            if len(pending) > 0:
+                stack.extend(pending)
+                continue
+
+            bits = 0
+            for p in parents:
+                bits |= (1 << self.id(p)) | self.bits.get(p, 0)
+
+            self.bits[current] = bits
+            visiting.discard(current)
+            stack.pop()
+
+        return self.bits[name]
+
+    def is_ancestor(self, descendant: str, ancestor: str) -> bool:
+        return (self.ancestors(descendant) >> self.id(ancestor)) & 1 == 1
+
+    def names(self, bits: int) -> Set[str]:
+        names = set()
+        while bits:
+            lowest = bits & -bits
+            names.add(self.concepts[lowest.bit_length() - 1])
+            bits ^= lowest
+        return names
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "concepts": len(self.concepts),
+            "closures": len(self.bits),
+            "bytes": sys.getsizeof(self.ids)
+            + sys.getsizeof(self.concepts)
+            + sys.getsizeof(self.bits)
+            + sys.getsizeof(self.parents_by_concept)
+            + sum(sys.getsizeof(b) for b in self.bits.values())
+            + sum(sys.getsizeof(p) for p in self.parents_by_concept.values()),
+        }
@@ -0,0 +1,331 @@
+from typing import Any, Dict, List, Union
+
+import mmap
+import os
+import pickle
+import struct
+import sys
+
+
+PACKED_MAGIC = b"ONTOPACK"
+PACKED_VERSION = 2
+PACKED_EXTENSION = ".okp"
+
+HEADER = struct.Struct("<8sIQQ")  # magic, version, offset of the record table and number of records
+OFFSET = struct.Struct("<Q")
+
+SENSE_SLOTS = ["CAT", "SENSE", "SYN-STRUC", "SEM-STRUC", "MEANING-PROCEDURES", "SYNONYMS", "HYPONYMS"]
+
+
+# A compact, read-only alternative to the OntoMem knowledge file.
+# The file is a header, a sequence of independently pickled records sorted by key and a record table: the offsets of
+# the records, the offsets of their keys and the UTF-8 keys themselves. Opening it only checks the header; keys are
+# found by binary search and records are unpickled from the memory map on access. Nothing of the table is copied
+# into Python objects, so processes forked after the file is loaded share all of its pages. The records are:
+#   S:<sense id>    - the slots of a LEX-WORD frame (see SENSE_SLOTS), plus its frame name under "FRAME"
+#   C:<concept>     - the parents of a non-lexicon frame
+#   I:relations     - the relation -> inverse table
+#   I:structures    - Lexicon.structure_index()
+#   I:diatheses     - Lexicon.diathesis_index()
+# While a packed knowledge file is active (see PackedKnowledge.load), Lexicon and Ontology read from it instead of
+# MemoryManager.memory; anything written to memory afterwards (e.g., temporary senses) is still found there.
+# The file format itself does not depend on OntoMem, which is only imported to pack, load and materialize frames, so
+# packed files can also be written and read where OntoMem is not installed (see benchmarks/shared_knowledge.py).
+# Only the parents of concepts are packed, not their other slots (case-role constraints, definitions, ...): a packed
+# file serves the lexicon, subsumption and distance queries, not semantic checks against concept slots. Concepts
+# read through Ontology.concept are PackedConcepts, which raise on any slot access instead of returning nothing.
+class PackedKnowledge(object):
+
+    active: "PackedKnowledge" = None
+
+    @classmethod
+    def load(cls, filename: str) -> "PackedKnowledge":
+        from ontomem.memory import MemoryManager
+
+        PackedKnowledge.unload()
+        packed = PackedKnowledge(filename)
+
+        # The packed file replaces whatever knowledge is in memory, like MemoryManager.load_memory would; the
+        # lexicon and ontology caches are keyed on the memory object, so they are rebuilt on next use.
+        MemoryManager.memory = type(MemoryManager.memory)()
+        PackedKnowledge.active = packed
+        return PackedKnowledge.active
+
+    @classmethod
+    def unload(cls):
+        if PackedKnowledge.active is not None:
+            PackedKnowledge.active.close()
+        PackedKnowledge.active = None
+
+    @staticmethod
+    def is_packed(filename: str) -> bool:
+        return filename.endswith(PACKED_EXTENSION)
+
+    @classmethod
+    def pack(cls, knowledge_file: str, out: str = None) -> str:
+        """Packs an OntoMem knowledge file, unless it was packed since it last changed; returns the packed file"""
+        from ontomem.memory import MemoryManager
+
+        if out is None:
+            out = knowledge_file.rsplit(".", 1)[0] + PACKED_EXTENSION
+        if os.path.exists(out) and os.path.getmtime(out) >= os.path.getmtime(knowledge_file):
+            return out
+
+        # The indexes are packed from memory, so no other packed file may be active while packing
+        PackedKnowledge.unload()
+        MemoryManager.load_memory(knowledge_file)
+        PackedKnowledge.write(out)
+        return out
+
+    @classmethod
+    def write(cls, filename: str) -> int:
+        # Packs the knowledge currently in MemoryManager.memory. Senses that do not have exactly one filler in each
+        # of SENSE_SLOTS cannot be packed; they are reported, and their number is returned.
+        from knowledge.lexicon import Lexicon
+        from knowledge.ontology import Ontology
+        from ontomem.exceptions import SingletonError
+        from ontomem.frame import Frame
+        from ontomem.memory import MemoryManager
+
+        lexicon_frames = set()
+        records = {}
+        skipped = []
+        for frame in Frame("LEX-WORD").descendants():
+            lexicon_frames.add(frame.concept)
+            try:
+                record = {slot: frame[slot].singleton() for slot in SENSE_SLOTS}
+            except SingletonError:
+                skipped.append(frame.concept)
+                continue
+            record["FRAME"] = frame.concept
+            records["S:%s" % record["SENSE"]] = record
+
+        for name in list(MemoryManager.memory.frames):
+            if name in lexicon_frames:
+                continue
+            records["C:%s" % name] = [p.concept for p in Frame(name).parents()]
+
+        relations = "RELATION" in MemoryManager.memory.frames
+        records["I:relations"] = dict(Ontology().relation_inverses()) if relations else {}
+        records["I:structures"] = Lexicon.structure_index()
+        records["I:diatheses"] = Lexicon.diathesis_index()
+        PackedKnowledge.write_records(filename, records)
+
+        if len(skipped) > 0:
+            skipped = sorted(skipped)
+            print("Skipped %d senses without exactly one filler per slot: %s" % (len(skipped), ", ".join(skipped)))
+
+        return len(skipped)
+
+    @staticmethod
+    def write_records(filename: str, records: Dict[str, Any]):
+        """Writes a packed file of the given records (see above for the keys that PackedKnowledge reads)"""
+        keys = sorted(records.keys())
+        record_offsets = []
+        with open(filename, "wb") as fout:
+            fout.write(b"\0" * HEADER.size)
+            for key in keys:
+                record_offsets.append(fout.tell())
+                fout.write(pickle.dumps(records[key], protocol=pickle.HIGHEST_PROTOCOL))
+            record_offsets.append(fout.tell())
+
+            # The table starts on an 8-byte boundary, so that its offsets can be read as an array
+            fout.write(b"\0" * (-fout.tell() % OFFSET.size))
+            table_offset = fout.tell()
+            encoded = [key.encode("utf-8") for key in keys]
+            key_offsets = [0]
+            for key in encoded:
+                key_offsets.append(key_offsets[-1] + len(key))
+            fout.write(struct.pack("<%dQ" % len(record_offsets), *record_offsets))
+            fout.write(struct.pack("<%dQ" % len(key_offsets), *key_offsets))
+            fout.write(b"".join(encoded))
+
+            fout.seek(0)
+            fout.write(HEADER.pack(PACKED_MAGIC, PACKED_VERSION, table_offset, len(keys)))
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.file = open(filename, "rb")
+        self.data = None
+        self.views: List[memoryview] = []
+        self.indexes: Dict[str, Any] = {}
+        self.materialized = set()
+        self.materialized_memory = None
+
+        # The file and the map are closed again if the file turns out not to be a valid packed knowledge file
+        try:
+            if os.fstat(self.file.fileno()).st_size < HEADER.size:
+                raise Exception("%s is not a packed knowledge file." % filename)
+            self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._read_table()
+        except BaseException:
+            self.close()
+            raise
+
+    def _read_table(self):
+        magic, version, table_offset, count = HEADER.unpack_from(self.data, 0)
+        if magic != PACKED_MAGIC:
+            raise Exception("%s is not a packed knowledge file." % self.filename)
+        if version != PACKED_VERSION:
+            raise Exception("Unsupported packed knowledge version %d in %s." % (version, self.filename))
+        keys_offset = table_offset + 2 * (count + 1) * OFFSET.size
+        if keys_offset > len(self.data):
+            raise Exception("Packed knowledge file %s is truncated." % self.filename)
+
+        self.count = count
+        data = memoryview(self.data)
+        self.record_offsets = data[table_offset:table_offset + (count + 1) * OFFSET.size].cast("Q")
+        self.key_offsets = data[table_offset + (count + 1) * OFFSET.size:keys_offset].cast("Q")
+        self.keys = data[keys_offset:]
+        self.views = [self.record_offsets, self.key_offsets, self.keys, data]
+        if len(self.keys) < self.key_offsets[count]:
+            raise Exception("Packed knowledge file %s is truncated." % self.filename)
+
+    def close(self):
+        # The views on the map must be released before the map can be closed
+        for view in self.views:
+            view.release()
+        self.views = []
+        if self.data is not None:
+            self.data.close()
+        self.file.close()
+
+    def _key(self, i: int) -> bytes:
+        return self.keys[self.key_offsets[i]:self.key_offsets[i + 1]].tobytes()
+
+    def _lower_bound(self, key: bytes) -> int:
+        # The first record whose key is not less than key; UTF-8 preserves the order in which the keys were sorted
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _find(self, key: str) -> int:
+        encoded = key.encode("utf-8")
+        i = self._lower_bound(encoded)
+        return i if i < self.count and self._key(i) == encoded else -1
+
+    def record(self, key: str) -> Any:
+        i = self._find(key)
+        if i < 0:
+            return None
+        return pickle.loads(self.data[self.record_offsets[i]:self.record_offsets[i + 1]])
+
+    def sense(self, id: str) -> Union[dict, None]:
+        return self.record("S:%s" % id)
+
+    def has_concept(self, name: str) -> bool:
+        return self._find("C:%s" % name) >= 0
+
+    def parents(self, name: str) -> Union[List[str], None]:
+        return self.record("C:%s" % name)
+
+    def index(self, name: str) -> Any:
+        # The precomputed indexes are read once and kept
+        if name not in self.indexes:
+            self.indexes[name] = self.record("I:%s" % name)
+        return self.indexes[name]
+
+    def concept(self, name: str) -> "PackedConcept":
+        # Materializes a concept in memory for callers that need the OntoMem frame itself: the parent links of the
+        # concept and of all of its ancestors are added, so parents(), isa() and the ancestor walks of the frame
+        # give the same answers as after MemoryManager.load_memory. Its other slots are not packed (see above).
+        from ontomem.frame import Frame
+        from ontomem.memory import MemoryManager
+
+        if self.materialized_memory is not MemoryManager.memory:
+            self.materialized = set()
+            self.materialized_memory = MemoryManager.memory
+
+        pending = [name]
+        while len(pending) > 0:
+            current = pending.pop()
+            if current in self.materialized:
+                continue
+            self.materialized.add(current)
+
+            frame = Frame(current)
+            parents = self.parents(current) or []
+            if len(frame.parents()) == 0:
+                for parent in parents:
+                    frame.add_parent(Frame(parent))
+            pending.extend(parents)
+
+        return PackedConcept(Frame(name), self.filename)
+
+    def count_prefix(self, prefix: str) -> int:
+        # The keys with a prefix are contiguous: they sort after the prefix and before the prefix with its last
+        # character incremented
+        first = prefix.encode("utf-8")
+        end = (prefix[:-1] + chr(ord(prefix[-1]) + 1)).encode("utf-8")
+        return self._lower_bound(end) - self._lower_bound(first)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "records": self.count,
+            "senses": self.count_prefix("S:"),
+            "concepts": self.count_prefix("C:"),
+            "bytes": len(self.data),
+        }
+
+
+# A concept frame materialized from a packed knowledge file.
+# Everything but slot access is answered by the frame itself (parents, ancestors, isa, ...); the frame has none of the
+# concept's slots, so reading one raises instead of silently returning an empty slot.
+class PackedConcept(object):
+    def __init__(self, frame: "Frame", filename: str):
+        self.frame = frame
+        self.filename = filename
+
+    def __getattr__(self, name: str) -> Any:
+        if name in ("frame", "filename"):
+            raise AttributeError(name)
+        return getattr(self.frame, name)
+
+    def __getitem__(self, slot: str):
+        raise Exception(
+            "Slot %s of %s is not available: only the parents of concepts are packed in %s."
+            % (slot, self.frame.concept, self.filename)
+        )
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, PackedConcept):
+            other = other.frame
+        return self.frame == other
+
+    def __hash__(self) -> int:
+        return hash(self.frame)
+
+    def __repr__(self) -> str:
+        return repr(self.frame)
+
+    def __str__(self) -> str:
+        return str(self.frame)
+
+
+if __name__ == "__main__":
+    arguments = sys.argv
+
+    knowledge = "knowledge/build/knowledge.om"
+    out = None
+
+    for arg in arguments:
+        if arg.startswith("in="):
+            knowledge = arg.replace("in=", "")
+        if arg.startswith("out="):
+            out = arg.replace("out=", "")
+
+    if out is None:
+        out = knowledge.rsplit(".", 1)[0] + PACKED_EXTENSION
+
+    from ontomem.memory import MemoryManager
+
+    print("Loading knowledge from %s" % knowledge)
+    MemoryManager.load_memory(knowledge)
+
+    PackedKnowledge.write(out)
+    print("Output to %s" % out)
@@ -0,0 +1,65 @@
+from knowledge.lexicon import Lexicon
+from knowledge.ontology import Ontology
+from knowledge.packed import PackedKnowledge
+from multiprocessing.pool import Pool
+from ontomem.frame import Frame
+from ontomem.memory import MemoryManager
+from typing import Callable, Iterable
+
+import gc
+import multiprocessing
+
+
+# Sharing loaded knowledge with worker processes.
+# The knowledge is loaded once in the parent; prepare_for_fork then builds every lazily computed index and cache
+# that the workers would otherwise build (and write to) on their own, and moves all objects into the permanent GC
+# generation. Workers created with fork_pool afterwards inherit the memory copy-on-write. Freezing only keeps the
+# cyclic collector from writing to the objects; reading an object in a worker still updates its reference count, so
+# the page of every object a worker touches is copied anyway, and a worker that reads all of the knowledge ends up
+# with a private copy of it, frozen or not. OntoALAConfig.load_shared_knowledge therefore loads a packed knowledge
+# file (see knowledge/packed.py): its records and record table are memory mapped rather than Python objects, so the
+# workers share them through the page cache however much they read, and only the objects built from it are private.
+# See benchmarks/shared_knowledge.py for the resident and private memory of the workers in each case.
+
+
+def warm_caches(senses: Iterable[str] = (), closure: bool = True):
+    """Builds the lexicon and ontology indexes in this process, and parses the given senses into the shared cache"""
+    Lexicon.sense_index()
+    Lexicon.structure_index()
+    Lexicon.diathesis_index()
+
+    ontology = Ontology()
+    if "RELATION" in MemoryManager.memory.frames or PackedKnowledge.active is not None:
+        ontology.relations()
+
+    # The ancestor closure of every concept in memory (lexicon senses are not concepts, and are left out); with
+    # packed knowledge only the concepts that have already been read are in memory, so the closure stays lazy.
+    if closure:
+        senses_in_memory = set(f.concept for f in Frame("LEX-WORD").descendants())
+        ancestor_closure = Ontology.closure()
+        for name in list(MemoryManager.memory.frames):
+            if name not in senses_in_memory:
+                ancestor_closure.ancestors(name)
+
+    lexicon = Lexicon(shared=True)
+    for id in senses:
+        lexicon.sense(id)
+
+
+def prepare_for_fork(senses: Iterable[str] = (), closure: bool = True):
+    """Warms the knowledge caches and freezes every object into the permanent generation before forking"""
+    warm_caches(senses, closure=closure)
+    gc.collect()
+    gc.freeze()
+
+
+def release_after_fork():
+    """Undoes prepare_for_fork in the parent, once the workers are no longer needed"""
+    gc.unfreeze()
+
+
+def fork_pool(processes: int, initializer: Callable = None, initargs: tuple = ()) -> Pool:
+    # Workers must be forked (not spawned) to inherit the parent's memory.
+    if "fork" not in multiprocessing.get_all_start_methods():
+        raise Exception("Shared knowledge requires the fork start method, which is not available on this platform.")
+    return multiprocessing.get_context("fork").Pool(processes, initializer=initializer, initargs=initargs)
@@ -1,57 +1,128 @@
-from lex.api import LexiconAPI
-from lex.management import LEXICON_ACTIVE
-from ontomem.frame import Space, Frame
+from ontomem.frame import Frame
 from ontomem.memory import MemoryManager
-from ont.api import OntologyAPI
-from ont.management import ONTOLOGY_ACTIVE
+from typing import Iterable
 
+import collections
+import gc
+import hashlib
+import itertools
 import json
 import sys
 import os
 import re
 
 
-def load_ontology_from_db(collection: str):
+MANIFEST_VERSION = 2
+
+
+def load_ontology_from_db(collection: str, api=None, batch_size: int = 1000):
+    # The database packages are only needed to load from the database, so the rest of this module works without them
+    from ont.api import OntologyAPI
+    from ont.management import ONTOLOGY_ACTIVE
 
     os.environ[ONTOLOGY_ACTIVE] = collection
     ontology = Frame("ONTOLOGY")
     ontology["VERSION"] = collection
 
-    api = OntologyAPI()
-
-    relations = list(map(lambda r: r.upper(), api.relations(inverses=True)))
-    relations.remove("INVERSE")
+    if api is None:
+        api = OntologyAPI()
+
+    relations = ontology_relations(api)
+
+    import_concepts(api.collection.find({}).batch_size(batch_size), relations)
+
+def ontology_relations(api) -> set:
+    relations = {sys.intern(r.upper()) for r in api.relations(inverses=True)}
+    relations.discard("INVERSE")
+    return relations
+
+def shape_concept_record(concept: dict, relations: set) -> tuple:
+    # A concept document as a (name, fillers, parents) record, ready for import_concept_records, or None if the
+    # concept cannot be imported. Names are uppercased and interned; each filler is a [slot, facet, filler, link]
+    # list, where link is True for fillers of relation slots, which name the concept they refer to.
+    name = concept["name"]
+    if "." in name:
+        print("Skipping %s" % name)
+        return None
+
+    name = sys.intern(name.upper())
+    fillers = []
+    for property in concept["localProperties"]:
+        slot = sys.intern(property["slot"].upper())
+        facet = sys.intern(property["facet"].upper())
+        filler = property["filler"]
+        link = slot in relations
+        if link:
+            if "." in filler:
+                print("Skipping %s[%s][%s] = %s" % (name, slot, facet, filler))
+                continue
+            filler = sys.intern(filler.upper())
+        if slot == "INVERSE":
+            filler = sys.intern(filler.upper())
+        fillers.append([slot, facet, filler, link])
+
+    return name, fillers, [sys.intern(parent.upper()) for parent in concept["parents"]]
+
+def import_concepts(concepts: Iterable[dict], relations: set) -> int:
+    records = (shape_concept_record(concept, relations) for concept in concepts)
+    return import_concept_records(record for record in records if record is not None)
+
+def import_concept_records(records: Iterable[tuple]) -> int:
+    # Imports concept records in two passes. The first pass streams the records, creating each concept's frame and
+    # writing its local (non-relation) fillers; relation fillers and parents are only recorded. The second pass
+    # links them, once every concept in the input has a frame, so references to concepts that are not in the input
+    # are skipped instead of creating empty frames. Returns the number of concepts imported.
+    names = set()
+    links = []
+    parents = []
+
+    for name, fillers, concept_parents in records:
+        names.add(name)
+        Frame(name)
+        local = []
+        for slot, facet, filler, link in fillers:
+            if link:
+                links.append((name, slot, facet, filler))
+            else:
+                local.append([slot, facet, filler, link])
+        add_concept_fillers(name, local)
+
+        for parent in concept_parents:
+            parents.append((name, parent))
+
+    skipped = 0
+    for name, slot, facet, filler in links:
+        if filler not in names:
+            skipped += 1
+            continue
+        Frame(name)[slot][facet] += Frame(filler)
 
-    for concept in api.collection.find({}):
-        name = concept["name"]
-        if "." in name:
-            print("Skipping %s" % name)
+    for name, parent in parents:
+        if parent not in names:
+            skipped += 1
             continue
+        Frame(name).add_parent(Frame(parent))
 
-        f = Frame(name.upper())
-        for property in concept["localProperties"]:
-            slot = property["slot"].upper()
-            facet = property["facet"].upper()
-            filler = property["filler"]
-            if slot in relations:
-                if "." in filler:
-                    print("Skipping %s[%s][%s] = %s" % (name, slot, facet, filler))
-                    continue
-                filler = Frame(filler.upper())
-            if slot == "INVERSE":
-                filler = filler.upper()
+    if skipped > 0:
+        print("Skipped %d references to concepts that are not in the ontology" % skipped)
 
-            f[slot][facet] += filler
+    return len(names)
 
-            if slot == "INVERSE":
-                f[slot].set_inherit_local()
+def add_concept_fillers(name: str, fillers: Iterable[list]):
+    f = Frame(name)
+    for slot, facet, filler, link in fillers:
+        f[slot][facet] += Frame(filler) if link else filler
+        if slot == "INVERSE":
+            f[slot].set_inherit_local()
 
-        for parent in concept["parents"]:
-            f.add_parent(Frame(parent.upper()))
+def remove_concept_fillers(name: str, fillers: Iterable[list]):
+    f = Frame(name)
+    for slot, facet, filler, link in fillers:
+        f[slot][facet] -= Frame(filler) if link else filler
 
 def load_lexicon_from_db(collection: str):
-
-    lexword = Frame("LEX-WORD")
+    from lex.api import LexiconAPI
+    from lex.management import LEXICON_ACTIVE
 
     os.environ[LEXICON_ACTIVE] = collection
     lexicon = Frame("LEXICON")
@@ -59,71 +130,85 @@ def load_lexicon_from_db(collection: str):
 
     api = LexiconAPI()
 
-    senses = api.all_senses()
-    for s in senses:
-        sense_id = s["SENSE"]
-        word = s["WORD"]
-        cat = s["CAT"]
-        index = int(re.findall("([^0-9]*)([0-9]+)", sense_id)[0][1])
-
-        sense = Frame(f"{word}.{cat}.{index}")
-        sense.add_parent(lexword)
-        sense.add_to_space("LEX")
-        sense["WORD"] = word
-        sense["CAT"] = cat
-        sense["SENSE"] = sense_id
-        sense["SYN-STRUC"] = s["SYN-STRUC"]
-        sense["SEM-STRUC"] = s["SEM-STRUC"]
-        sense["SYNONYMS"] = s["SYNONYMS"] if "SYNONYMS" in s else None
-        sense["HYPONYMS"] = s["HYPONYMS"] if "HYPONYMS" in s else None
-        sense["DEF"] = s["DEF"] if "DEF" in s else None
-        sense["EX"] = s["EX"] if "EX" in s else None
-
-
-        meaning_procedures = []
-        if "MEANING-PROCEDURES" in s and s["MEANING-PROCEDURES"] != "NIL":
-            meaning_procedures = s["MEANING-PROCEDURES"]
-
-        sense["MEANING-PROCEDURES"] = meaning_procedures
+    import_senses(shape_sense_record(s) for s in api.all_senses())
+
+def sense_frame_name(s: dict) -> str:
+    index = int(re.findall("([^0-9]*)([0-9]+)", s["SENSE"])[0][1])
+    return f"{s['WORD']}.{s['CAT']}.{index}"
+
+def shape_sense_record(s: dict) -> tuple:
+    # A sense document as a (frame name, slot fillers) record, ready for import_senses
+    meaning_procedures = []
+    if "MEANING-PROCEDURES" in s and s["MEANING-PROCEDURES"] != "NIL":
+        meaning_procedures = s["MEANING-PROCEDURES"]
+
+    return sense_frame_name(s), {
+        "WORD": s["WORD"],
+        "CAT": s["CAT"],
+        "SENSE": s["SENSE"],
+        "SYN-STRUC": s["SYN-STRUC"],
+        "SEM-STRUC": s["SEM-STRUC"],
+        "SYNONYMS": s.get("SYNONYMS"),
+        "HYPONYMS": s.get("HYPONYMS"),
+        "DEF": s.get("DEF"),
+        "EX": s.get("EX"),
+        "MEANING-PROCEDURES": meaning_procedures,
+    }
+
+def import_senses(records: Iterable[tuple], replace: bool = True, batch_size: int = 10000) -> int:
+    # Bulk import of (frame name, slot fillers) records as LEX-WORD frames; returns the number of frames written.
+    # The existing lexicon frames are collected once up front instead of testing Space membership per sense, and
+    # the garbage collector is paused while a batch is written, as the import only allocates long-lived objects.
+    # Existing frames are overwritten unless replace is False, in which case they are left untouched.
+    lexword = Frame("LEX-WORD")
+    existing = {f.concept for f in lexword.descendants()}
+
+    written = 0
+    records = iter(records)
+    gc_enabled = gc.isenabled()
+    try:
+        while True:
+            batch = list(itertools.islice(records, batch_size))
+            if len(batch) == 0:
+                break
+
+            gc.disable()
+            for name, slots in batch:
+                sense = Frame(name)
+                if name not in existing:
+                    sense.add_parent(lexword)
+                    sense.add_to_space("LEX")
+                    existing.add(name)
+                elif not replace:
+                    continue
+
+                for slot, filler in slots.items():
+                    sense[slot] = filler
+                written += 1
+
+            if gc_enabled:
+                gc.enable()
+    finally:
+        if gc_enabled:
+            gc.enable()
+
+    return written
 
 def load_local_lexicon(file: str):
     from ontogen.knowledge.local.lexicon import Lexicon as L 
 
-    lexword = Frame("LEX-WORD")
-    senses = []
-
+    records = []
     for k1, lemma in L.items():
         for k2, sense in L[k1].items():
-            print(k2)
-            sense["SENSE"] = k2
-            sense["WORD"] = k2.split('-')[0]
-            senses.append(sense)
-
-    for s in senses:
-        sense_id = s["SENSE"]
-        word = s["WORD"]
-        cat = s["CAT"]
-        index = int(re.findall("([^0-9]*)([0-9]+)", sense_id)[0][1])
-
-        sense = Frame(f"{word}.{cat}.{index}")
-        if sense not in Space("LEX"):
-            sense.add_parent(lexword)
-            sense.add_to_space("LEX")
-            sense["WORD"] = word
-            sense["CAT"] = cat
-            sense["SENSE"] = sense_id
-            sense["SYN-STRUC"] = s["SYN-STRUC"]
-            sense["SEM-STRUC"] = s["SEM-STRUC"]
-            sense["SYNONYMS"] = s["SYNONYMS"] if "SYNONYMS" in s else None
-            sense["HYPONYMS"] = s["HYPONYMS"] if "HYPONYMS" in s else None
-            sense["DEF"] = s["DEF"] if "DEF" in s else None
-            sense["EX"] = s["EX"] if "EX" in s else None
-
-            meaning_procedures = []
-            if "MEANING-PROCEDURES" in s and s["MEANING-PROCEDURES"] != "NIL":
-                meaning_procedures = s["MEANING-PROCEDURES"]
-
-            sense["MEANING-PROCEDURES"] = meaning_procedures
+            records.append(shape_sense_record(dict(sense, SENSE=k2, WORD=k2.split('-')[0])))
+
+    import_senses(records, replace=False)
+
+    # The lexicon's sense index may have been built before these senses were added; only invalidate it if the
+    # lexicon module is already in use (this module is also run as a standalone script).
+    lexicon_module = sys.modules.get("knowledge.lexicon")
+    if lexicon_module is not None:
+        lexicon_module.Lexicon.invalidate_sense_index()
 
 def load_knowledge_from_db(ont_collection: str, lex_collection: str, save_to: str=None):
     # Read in the ontology and lexicon into OntoMem
@@ -145,6 +230,170 @@ def load_knowledge_from_db_and_file(ont_collection: str, lex_collection: str, le
         MemoryManager.save_memory(save_to)
     
 
+def reset_memory():
+    # Replaces MemoryManager.memory with a new, empty memory of the same type; the lexicon and ontology caches are
+    # keyed on the memory object, so they are rebuilt on next use.
+    MemoryManager.memory = type(MemoryManager.memory)()
+
+def content_hash(document: dict) -> str:
+    document = {k: v for k, v in document.items() if k != "_id"}
+    return hashlib.sha1(json.dumps(document, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+def remove_sense_frame(name: str):
+    # Drops a lexicon frame: its link to LEX-WORD, so it is no longer one of its descendants, and the frame itself
+    Frame(name).remove_parent(Frame("LEX-WORD"))
+    del MemoryManager.memory.frames[name]
+
+def effective_fillers(fillers: Iterable[list], names: set) -> list:
+    # The fillers of a concept record that import_concept_records writes: links only to concepts that are imported
+    return [f for f in fillers if not f[3] or f[2] in names]
+
+def filler_difference(fillers: list, others: list) -> list:
+    # The fillers that are not in others, counting repeated fillers
+    remaining = collections.Counter(json.dumps(f, default=str) for f in others)
+    difference = []
+    for f in fillers:
+        key = json.dumps(f, default=str)
+        if remaining[key] > 0:
+            remaining[key] -= 1
+        else:
+            difference.append(f)
+    return difference
+
+def load_knowledge_incrementally(ont_collection: str, lex_collection: str, save_to: str, manifest: str=None, ontology_api=None, lexicon_api=None) -> dict:
+    # Rebuilds save_to from the ontology and lexicon collections, re-importing only what changed since the build
+    # recorded in the manifest (the fillers and parents of each concept, and a content hash per sense). Sense
+    # inserts, updates, renames and deletes, new concepts and changes to the local and relation fillers of concepts
+    # are applied to the previous build in place; deleted concepts and changes to the parents of existing concepts
+    # change the structure of the ontology, and fall back to a full import.
+    if manifest is None:
+        manifest = save_to + ".manifest.json"
+
+    if ontology_api is None:
+        from ont.api import OntologyAPI
+        from ont.management import ONTOLOGY_ACTIVE
+
+        os.environ[ONTOLOGY_ACTIVE] = ont_collection
+        ontology_api = OntologyAPI()
+    if lexicon_api is None:
+        from lex.api import LexiconAPI
+        from lex.management import LEXICON_ACTIVE
+
+        os.environ[LEXICON_ACTIVE] = lex_collection
+        lexicon_api = LexiconAPI()
+
+    relations = ontology_relations(ontology_api)
+    records = [shape_concept_record(c, relations) for c in ontology_api.collection.find({})]
+    records = [record for record in records if record is not None]
+    senses = lexicon_api.all_senses()
+
+    concepts = {name: {"fillers": fillers, "parents": parents} for name, fillers, parents in records}
+    sense_hashes = {s["SENSE"]: [content_hash(s), sense_frame_name(s)] for s in senses}
+
+    previous = None
+    if os.path.exists(manifest) and os.path.exists(save_to):
+        with open(manifest, "r") as fin:
+            previous = json.load(fin)
+
+    reason = None
+    if previous is None:
+        reason = "no previous build"
+    elif previous.get("version") != MANIFEST_VERSION:
+        reason = "manifest version changed"
+    elif previous["ontology"] != ont_collection or previous["lexicon"] != lex_collection:
+        reason = "collections changed"
+    elif any(name not in concepts for name in previous["concepts"]):
+        reason = "concepts deleted"
+    else:
+        names = set(concepts)
+        previous_names = set(previous["concepts"])
+        for name, concept in previous["concepts"].items():
+            before = [p for p in concept["parents"] if p in previous_names]
+            if before != [p for p in concepts[name]["parents"] if p in names]:
+                reason = "concept parents changed"
+                break
+
+    if reason is None:
+        MemoryManager.load_memory(save_to)
+
+        # New concepts get their frames before any fillers are linked to them
+        inserted_concepts = [name for name in concepts if name not in previous_names]
+        for name in inserted_concepts:
+            Frame(name)
+
+        updated_concepts = 0
+        for name, concept in concepts.items():
+            before = effective_fillers(previous["concepts"].get(name, {"fillers": []})["fillers"], previous_names)
+            after = effective_fillers(concept["fillers"], names)
+            removed = filler_difference(before, after)
+            added = filler_difference(after, before)
+            if name in previous_names and len(removed) + len(added) > 0:
+                updated_concepts += 1
+            remove_concept_fillers(name, removed)
+            add_concept_fillers(name, added)
+
+        for name in inserted_concepts:
+            for parent in concepts[name]["parents"]:
+                if parent in names:
+                    Frame(name).add_parent(Frame(parent))
+
+        # The frames of deleted and renamed senses are dropped, unless a current sense still has the same frame name
+        frame_names = {h[1] for h in sense_hashes.values()}
+        gone = [id for id, h in previous["senses"].items() if id not in sense_hashes or sense_hashes[id][1] != h[1]]
+        dropped = {previous["senses"][id][1] for id in gone}
+        for name in dropped - frame_names:
+            remove_sense_frame(name)
+
+        inserted = [s for s in senses if s["SENSE"] not in previous["senses"]]
+        updated = [
+            s for s in senses
+            if s["SENSE"] in previous["senses"]
+            and (previous["senses"][s["SENSE"]] != sense_hashes[s["SENSE"]] or sense_hashes[s["SENSE"]][1] in dropped)
+        ]
+        import_senses(shape_sense_record(s) for s in inserted + updated)
+
+        result = {
+            "mode": "incremental",
+            "concepts": {"inserted": len(inserted_concepts), "updated": updated_concepts},
+            "senses": {
+                "inserted": len(inserted),
+                "updated": len(updated),
+                "deleted": sum(1 for id in previous["senses"] if id not in sense_hashes),
+            },
+        }
+    else:
+        # A full import starts from an empty memory, so frames of deleted or renamed senses are not carried over
+        reset_memory()
+
+        ontology = Frame("ONTOLOGY")
+        ontology["VERSION"] = ont_collection
+        imported = import_concept_records(records)
+
+        lexicon = Frame("LEXICON")
+        lexicon["VERSION"] = lex_collection
+        import_senses(shape_sense_record(s) for s in senses)
+
+        result = {"mode": "full", "reason": reason, "concepts": imported, "senses": len(senses)}
+
+    MemoryManager.save_memory(save_to)
+    with open(manifest, "w") as fout:
+        json.dump(
+            {
+                "version": MANIFEST_VERSION,
+                "ontology": ont_collection,
+                "lexicon": lex_collection,
+                "concepts": concepts,
+                "senses": sense_hashes,
+            },
+            fout,
+            default=str,
+        )
+
+    lexicon_module = sys.modules.get("knowledge.lexicon")
+    if lexicon_module is not None:
+        lexicon_module.Lexicon.invalidate_sense_index()
+
+    return result
 
 if __name__ == "__main__":
     arguments = sys.argv
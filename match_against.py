@@ -1,16 +1,22 @@
-from knowledge.lexicon import Lexicon, Sense
+from knowledge.lexicon import BASIC_DIATHESES, Lexicon, Sense
+from pipeline import Stage, file_fingerprint
 
-from typing import Union
+from typing import Iterable, Iterator, List, Union
 
 
 class MatchAgainstList:
-    def __init__(self, head: Union[str, Sense]):
+    def __init__(self, head: Union[str, Sense], lexicon: Lexicon = None):
+        if lexicon is None:
+            lexicon = Lexicon(shared=True)
+        self.lexicon = lexicon
+
         if isinstance(head, str):
-            head = Lexicon().sense(head)
+            head = self.lexicon.sense(head)
         self.head = head
 
         self.synonyms = self._get_synonyms()
         self.hyponyms = self._get_hyponyms()
+        self.structural_synonyms = self._get_structural_synonyms()
 
     def _get_synonyms(self):
         if self.head.synonyms:
@@ -20,11 +26,87 @@ class MatchAgainstList:
         if self.head.hyponyms:
             return [self.head.duplicate(h) for h in self.head.hyponyms]
 
+    def _get_structural_synonyms(self):
+        return self.lexicon.structural_synonyms(self.head)
+
+    def to_dict(self) -> dict:
+        return {
+            "head": self.head.id,
+            "synonyms": [s.id for s in self.synonyms or []],
+            "hyponyms": [h.id for h in self.hyponyms or []],
+            "structural_synonyms": [s.id for s in self.structural_synonyms],
+        }
+
     def to_str(self):
         s =  f"    Head:\t{self.head.id}\n"
         s += f"Synonyms:\t{self.synonyms}\n"
-        s += f"Hyponyms:\t{self.hyponyms}"
-            
-        s += f"\n\nWARNING - SYN-STRUC/SEM-STRUC SYNONYM SEARCH NOT IMPLEMENTED"
+        s += f"Hyponyms:\t{self.hyponyms}\n"
+        s += f"Structural Synonyms:\t{self.structural_synonyms}"
 
         return s
+
+
+def basic_verb_senses(lexicon: Lexicon = None, skipped: List[str] = None) -> Iterator[Sense]:
+    """Every verb sense in memory with a basic (intransitive, transitive or ditransitive) diathesis, in id order"""
+    if lexicon is None:
+        lexicon = Lexicon(shared=True)
+
+    # Ids that are ambiguous or cannot be read are skipped (and added to skipped, if given) instead of ending the pass
+    for id in lexicon.senses_with_diathesis(BASIC_DIATHESES):
+        try:
+            sense = lexicon.sense(id)
+        except Exception as e:
+            print("Skipping %s: %s" % (id, e))
+            if skipped is not None:
+                skipped.append(id)
+            continue
+        yield sense
+
+
+def build_match_against_lists(lexicon: Lexicon = None) -> Iterator[MatchAgainstList]:
+    # A single shared lexicon is used for the whole pass, so every sense is parsed at most once and the
+    # structure index is built once.
+    if lexicon is None:
+        lexicon = Lexicon(shared=True)
+
+    for sense in basic_verb_senses(lexicon):
+        yield MatchAgainstList(sense, lexicon=lexicon)
+
+
+def basic_verb_records(lexicon: Lexicon = None) -> Iterator[dict]:
+    """The input records of the MatchAgainstList stage: one {"head": id} per basic verb sense, in id order"""
+    if lexicon is None:
+        lexicon = Lexicon(shared=True)
+
+    for id in lexicon.senses_with_diathesis(BASIC_DIATHESES):
+        yield {"head": id}
+
+
+def match_against_stage(lexicon: Lexicon = None, knowledge_file: str = None) -> Stage:
+    # The first pipeline step: the MatchAgainstList of each {"head": id} input record. The lists depend on the
+    # knowledge they are built from, so the stage is restarted when the knowledge file changes.
+    if lexicon is None:
+        lexicon = Lexicon(shared=True)
+
+    def build(record: dict) -> Iterable[dict]:
+        # A head that is ambiguous or cannot be read has no MatchAgainstList; it is reported and the run goes on
+        try:
+            head = lexicon.sense(record["head"])
+        except Exception as e:
+            print("Skipping %s: %s" % (record["head"], e))
+            return
+        yield MatchAgainstList(head, lexicon=lexicon).to_dict()
+
+    config = {"knowledge": file_fingerprint(knowledge_file)} if knowledge_file is not None else None
+    return Stage("match-against", build, config=config)
+
+
+def match_against_stages(wordnet_dir: str = None, knowledge_file: str = None) -> List[Stage]:
+    # The stage factory for pipeline.Scheduler workers; with a WordNet index, the CandidatesForLearningList step
+    # (see wordnet.py) follows the MatchAgainstList step.
+    stages = [match_against_stage(knowledge_file=knowledge_file)]
+    if wordnet_dir is not None:
+        from wordnet import candidates_stage
+
+        stages.append(candidates_stage(wordnet_dir))
+    return stages
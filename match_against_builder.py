@@ -0,0 +1,62 @@
+from config import OntoALAConfig
+from match_against import basic_verb_records, match_against_stages
+from pipeline import Pipeline, Scheduler
+
+import functools
+import multiprocessing
+import sys
+import time
+
+
+if __name__ == "__main__":
+    arguments = sys.argv
+
+    knowledge = None
+    directory = "build/pipeline"
+    workers = 1
+    wordnet = None
+
+    for arg in arguments:
+        if arg.startswith("knowledge="):
+            knowledge = arg.replace("knowledge=", "")
+        if arg.startswith("dir="):
+            directory = arg.replace("dir=", "")
+        if arg.startswith("workers="):
+            workers = int(arg.replace("workers=", ""))
+        if arg.startswith("wordnet="):
+            wordnet = arg.replace("wordnet=", "")
+
+    config = OntoALAConfig(knowledge_file=knowledge)
+    knowledge_file = config.knowledge_file
+
+    # With forked workers, the knowledge is loaded once here and shared with the workers (see knowledge/shared.py);
+    # otherwise every worker loads it again
+    fork = workers > 1 and "fork" in multiprocessing.get_all_start_methods()
+
+    print("Loading knowledge from %s" % config.knowledge_file)
+    if fork:
+        config.load_shared_knowledge()
+    else:
+        config.load_knowledge()
+
+    # Interrupted runs resume from their last checkpoint in the same directory, unless the knowledge file or the
+    # WordNet index changed since
+    start = time.time()
+    stages = functools.partial(match_against_stages, wordnet, knowledge_file)
+    if fork:
+        with Scheduler(workers, stages, context="fork") as scheduler:
+            outputs = Pipeline(directory, stages(), scheduler=scheduler).run(basic_verb_records())
+    elif workers > 1:
+        with Scheduler(
+            workers,
+            stages,
+            initializer=OntoALAConfig.initialize_worker,
+            initargs=(config.knowledge_file,),
+        ) as scheduler:
+            outputs = Pipeline(directory, stages(), scheduler=scheduler).run(basic_verb_records())
+    else:
+        outputs = Pipeline(directory, stages()).run(basic_verb_records())
+
+    for output in outputs.values():
+        print("Wrote %s" % output)
+    print("Done in %.1fs" % (time.time() - start))
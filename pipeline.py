@@ -0,0 +1,246 @@
+"""
+A resumable, step-by-step runner for the acquisition algorithm.
+
+Every step of the algorithm (MatchAgainstList, CandidatesForLearningList, InterestingCandidates, ...) is a Stage:
+a function from one input record to any number of output records. A Pipeline runs its stages in order; each stage
+streams the JSON Lines output of the previous one and writes its own output to <directory>/<stage>.jsonl as it goes,
+so every interim result stays on disk for inspection.
+
+Progress is checkpointed in <directory>/<stage>.checkpoint.json as the number of input records completed and the
+size of the output at that point. After a crash, the output is truncated back to the checkpoint and the stage
+resumes from the next input record; stages that completed are not run again.
+
+Every checkpoint also holds a fingerprint of the stage's input (the path, size and modification time of the input
+file) and of the stage's config. A stage whose input or config changed since its checkpoint is run again from the
+start, and so are the stages after it, as their inputs change with it. Source records that are not read from a file
+are first written to <directory>/<first stage>.input.jsonl, and fingerprinted by a hash of their content.
+
+With a Scheduler, the records of each stage are sharded across a process pool instead; every worker builds the
+stages once (and loads the knowledge, unless it is forked from a parent that has already loaded it), and the
+outputs are streamed back in input order, so the files and the checkpoints are the same as in a serial run.
+"""
+
+from typing import Callable, Dict, Iterable, Iterator, List, Tuple, Union
+
+import hashlib
+import itertools
+import json
+import multiprocessing
+import os
+
+
+class Stage(object):
+    # config is anything (JSON serializable) that the outputs of fn depend on besides the input records, e.g. the
+    # fingerprint of a knowledge file; changing it restarts the stage.
+    def __init__(self, name: str, fn: Callable[[dict], Iterable[dict]], config=None):
+        self.name = name
+        self.fn = fn
+        self.config = config
+
+    def process(self, records: Iterable[dict]) -> Iterator[Tuple[int, List[dict]]]:
+        """The outputs of every input record, with the index of the input"""
+        for i, record in enumerate(records):
+            yield i, list(self.fn(record))
+
+
+# The stages of the current worker process, built by _init_worker
+_worker_stages: Dict[str, Stage] = {}
+
+
+def _init_worker(factory: Callable[[], List[Stage]], initializer: Callable, initargs: tuple):
+    global _worker_stages
+    if initializer is not None:
+        initializer(*initargs)
+    _worker_stages = {s.name: s for s in factory()}
+
+
+def _run_in_worker(task: Tuple[str, dict]) -> List[dict]:
+    name, record = task
+    return list(_worker_stages[name].fn(record))
+
+
+# Runs stages in a pool of worker processes.
+# Stage functions are usually closures over process state (a lexicon, an open corpus), so they are not sent to the
+# workers; instead every worker calls factory (a module-level function returning the stages) once, after the
+# optional initializer (e.g., OntoALAConfig.initialize_worker, to load the knowledge file). Records are sent in
+# chunks of chunksize and the outputs come back in input order. Records are read from the input in windows of window
+# records (by default, four chunks per worker): the next window is read while the outputs of the current one are
+# consumed, so at most two windows of records and outputs are held at a time, however long the input.
+class Scheduler(object):
+    def __init__(
+        self,
+        workers: int,
+        factory: Callable[[], List[Stage]],
+        initializer: Callable = None,
+        initargs: tuple = (),
+        chunksize: int = 16,
+        context: str = None,
+        window: int = None,
+    ):
+        self.workers = workers
+        self.factory = factory
+        self.initializer = initializer
+        self.initargs = initargs
+        self.chunksize = chunksize
+        self.context = context
+        self.window = window if window is not None else chunksize * workers * 4
+        self.pool = None
+
+    def __enter__(self) -> "Scheduler":
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def process(self, stage: Stage, records: Iterable[dict]) -> Iterator[Tuple[int, List[dict]]]:
+        if self.pool is None:
+            self.pool = multiprocessing.get_context(self.context).Pool(
+                self.workers, initializer=_init_worker, initargs=(self.factory, self.initializer, self.initargs)
+            )
+
+        # Pool.imap reads its whole input ahead of the workers, so it is only ever given one window; the next window
+        # is submitted before the outputs of the current one are yielded, to keep the workers busy meanwhile
+        records = iter(records)
+        i = 0
+        pending = self._submit(stage, records)
+        while pending is not None:
+            current, pending = pending, self._submit(stage, records)
+            for outputs in current:
+                yield i, outputs
+                i += 1
+
+    def _submit(self, stage: Stage, records: Iterator[dict]) -> Union[Iterator[List[dict]], None]:
+        tasks = [(stage.name, record) for record in itertools.islice(records, self.window)]
+        if len(tasks) == 0:
+            return None
+        return self.pool.imap(_run_in_worker, tasks, chunksize=self.chunksize)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+
+class Pipeline(object):
+    def __init__(
+        self, directory: str, stages: List[Stage], checkpoint_every: int = 100, scheduler: "Scheduler" = None
+    ):
+        names = [s.name for s in stages]
+        if len(set(names)) != len(names):
+            raise Exception("Duplicate stage names in %s." % names)
+
+        self.directory = directory
+        self.stages = stages
+        self.checkpoint_every = checkpoint_every
+        self.scheduler = scheduler
+
+    def output(self, stage: Union[Stage, str]) -> str:
+        name = stage if isinstance(stage, str) else stage.name
+        return os.path.join(self.directory, "%s.jsonl" % name)
+
+    def checkpoint_file(self, stage: Stage) -> str:
+        return os.path.join(self.directory, "%s.checkpoint.json" % stage.name)
+
+    def checkpoint(self, stage: Stage) -> dict:
+        filename = self.checkpoint_file(stage)
+        if not os.path.isfile(filename) or not os.path.isfile(self.output(stage)):
+            return {"input": 0, "offset": 0, "complete": False, "fingerprint": None}
+        with open(filename, "r") as fin:
+            return json.load(fin)
+
+    def fingerprint(self, stage: Stage, inputs: Union[str, Iterable[dict]], input_fingerprint=None) -> str:
+        """The fingerprint of a stage's config and input; input files are fingerprinted unless one is given"""
+        if input_fingerprint is None and isinstance(inputs, str):
+            input_fingerprint = file_fingerprint(inputs)
+        document = {"stage": stage.name, "config": stage.config, "input": input_fingerprint}
+        return hashlib.sha1(json.dumps(document, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def run(self, source: Union[str, Iterable[dict]]) -> Dict[str, str]:
+        """Runs (or resumes) every stage; source is the input of the first stage, as records or a JSON Lines file"""
+        os.makedirs(self.directory, exist_ok=True)
+
+        inputs, input_fingerprint = source, None
+        if not isinstance(source, str):
+            inputs, input_fingerprint = self._spool(source)
+
+        for stage in self.stages:
+            self.run_stage(stage, inputs, input_fingerprint)
+            inputs, input_fingerprint = self.output(stage), None
+
+        return {stage.name: self.output(stage) for stage in self.stages}
+
+    def run_stage(self, stage: Stage, inputs: Union[str, Iterable[dict]], input_fingerprint=None):
+        # Records that are not read from a file are only fingerprinted by input_fingerprint (see run)
+        fingerprint = self.fingerprint(stage, inputs, input_fingerprint)
+        checkpoint = self.checkpoint(stage)
+        if checkpoint.get("fingerprint") != fingerprint:
+            checkpoint = {"input": 0, "offset": 0, "complete": False}
+        if checkpoint["complete"]:
+            return
+
+        # Anything written after the last checkpoint belongs to inputs that will be processed again
+        output = self.output(stage)
+        with open(output, "ab") as fout:
+            fout.truncate(checkpoint["offset"])
+
+        records = read_jsonl(inputs) if isinstance(inputs, str) else iter(inputs)
+        completed = checkpoint["input"]
+        with open(output, "ab") as fout:
+            for i, outputs in self.process(stage, records, completed):
+                for record in outputs:
+                    fout.write(json.dumps(record).encode("utf-8"))
+                    fout.write(b"\n")
+
+                completed = i + 1
+                if completed % self.checkpoint_every == 0:
+                    self._save_checkpoint(stage, fout, completed, False, fingerprint)
+
+            self._save_checkpoint(stage, fout, completed, True, fingerprint)
+
+    def process(self, stage: Stage, records: Iterator[dict], skip: int) -> Iterator[Tuple[int, List[dict]]]:
+        # Inputs completed before the checkpoint are skipped; the indexes stay those of the full input
+        records = _skip(records, skip)
+        processed = stage.process(records) if self.scheduler is None else self.scheduler.process(stage, records)
+        for i, outputs in processed:
+            yield i + skip, outputs
+
+    def _save_checkpoint(self, stage: Stage, fout, completed: int, complete: bool, fingerprint: str):
+        fout.flush()
+        os.fsync(fout.fileno())
+
+        filename = self.checkpoint_file(stage)
+        with open(filename + ".tmp", "w") as f:
+            json.dump({"input": completed, "offset": fout.tell(), "complete": complete, "fingerprint": fingerprint}, f)
+        os.replace(filename + ".tmp", filename)
+
+    def _spool(self, records: Iterable[dict]) -> Tuple[str, dict]:
+        # Writes source records to the input file of the first stage; returns it and the hash of its content
+        filename = os.path.join(self.directory, "%s.input.jsonl" % self.stages[0].name)
+        digest = hashlib.sha1()
+        with open(filename + ".tmp", "wb") as fout:
+            for record in records:
+                line = json.dumps(record).encode("utf-8") + b"\n"
+                digest.update(line)
+                fout.write(line)
+        os.replace(filename + ".tmp", filename)
+        return filename, {"sha1": digest.hexdigest()}
+
+
+def file_fingerprint(filename: str) -> dict:
+    """Identifies a version of a file by its path, size and modification time"""
+    stat = os.stat(filename)
+    return {"path": os.path.abspath(filename), "size": stat.st_size, "mtime": stat.st_mtime_ns}
+
+
+def read_jsonl(filename: str) -> Iterator[dict]:
+    with open(filename, "r") as fin:
+        for line in fin:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _skip(records: Iterator[dict], count: int) -> Iterator[dict]:
+    for i, record in enumerate(records):
+        if i >= count:
+            yield record
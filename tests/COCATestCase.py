@@ -0,0 +1,275 @@
+from coca import CMODE, COCA, read_lexicon, read_sources
+from coca_patterns import PatternSpec, match_pattern
+from unittest import TestCase
+from unittest.mock import patch
+
+import os
+import tempfile
+
+
+# A tiny corpus in the COCA distribution layout:
+#   text 10: "people stone the woman ."
+#   text 11: "they kill with stones ."
+LEXICON = [
+    (1, "people", "people", "nn"),
+    (2, "stone", "stone", "vvi"),
+    (3, "the", "the", "at"),
+    (4, "woman", "woman", "nn1"),
+    (5, ".", ".", "y"),
+    (6, "they", "they", "pphs2"),
+    (7, "kill", "kill", "vv0"),
+    (8, "with", "with", "iw"),
+    (9, "stones", "stone", "nn2"),
+]
+
+TOKENS = [
+    (10, [1, 2, 3, 4, 5]),
+    (11, [6, 7, 8, 9, 5]),
+]
+
+
+def write_corpus(data_dir: str):
+    os.makedirs(f"{data_dir}/db/csv/")
+    os.makedirs(f"{data_dir}/text/")
+    os.makedirs(f"{data_dir}/wlp/")
+
+    words = {row[0]: row for row in LEXICON}
+    with open(f"{data_dir}/text/text_fic.txt", "w") as fout:
+        for text_id, word_ids in TOKENS:
+            fout.write(f"##{text_id} " + " ".join(words[w][1] for w in word_ids) + "\n\n")
+
+    # One file with textID columns, one with "##textID" document markers
+    with open(f"{data_dir}/wlp/wlp_1.txt", "w") as fout:
+        text_id, word_ids = TOKENS[0]
+        for id, w in enumerate(word_ids):
+            fout.write(f"{text_id}\t{id}\t" + "\t".join(words[w][1:]) + "\n")
+    with open(f"{data_dir}/wlp/wlp_2.txt", "w") as fout:
+        text_id, word_ids = TOKENS[1]
+        fout.write(f"##{text_id}\t##{text_id}\tfo\n")
+        for w in word_ids:
+            fout.write("\t".join(words[w][1:]) + "\n")
+
+    with open(f"{data_dir}/lexicon.txt", "w") as fout:
+        fout.write("wID\tword\tlemma\tPoS\n")
+        for row in LEXICON:
+            fout.write("\t".join(map(str, row)) + "\n")
+
+    with open(f"{data_dir}/coca-sources.txt", "w") as fout:
+        fout.write("10\t2001\tFIC\t108\tSource A\tTitle A\n")
+        fout.write("11\t2002\tNEWS\t135\tSource B\tTitle B\n")
+
+    id = 0
+    for file_no, (text_id, word_ids) in enumerate(TOKENS):
+        with open(f"{data_dir}/db/csv/db_{file_no + 1}.csv", "w") as fout:
+            fout.write("textID,ID,wordID\n")
+            for word_id in word_ids:
+                fout.write(f"{text_id},{id},{word_id}\n")
+                id += 1
+
+    for marker in ["lexicon.csv", "coca-sources.csv"]:
+        open(f"{data_dir}/db/csv/{marker}", "w").close()
+
+    with open(f"{data_dir}/db/csv/subgenreCodes.csv", "w") as fout:
+        fout.write("code,name\n108,General Fiction\n135,News\n")
+
+
+class COCATestCase(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_dir = self.tmp.name
+        write_corpus(self.data_dir)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_db_mode(self):
+        coca = COCA(data_dir=self.data_dir)
+        self.assertEqual(10, len(coca.data))
+        self.assertEqual(2, len(coca.sources))
+
+    def test_read_lexicon(self):
+        lexicon = read_lexicon(f"{self.data_dir}/lexicon.txt")
+
+        self.assertEqual(len(LEXICON), len(lexicon))
+        self.assertEqual("int64", str(lexicon["wordID"].dtype))
+        self.assertEqual("category", str(lexicon["PoS"].dtype))
+        self.assertEqual([1, "people", "people", "nn"], lexicon.iloc[0].tolist())
+        self.assertEqual(0, lexicon.attrs["bad_lines"])
+
+        # Malformed lines are dropped and counted
+        with open(f"{self.data_dir}/lexicon.txt", "a", encoding="ISO-8859-1") as fout:
+            fout.write("98\tone\ttoo\tmany\tfields\n99\ttwo\ttoo\tmany\tfields\n97\ttoo-few\n")
+        with patch("builtins.print") as printed:
+            lexicon = read_lexicon(f"{self.data_dir}/lexicon.txt")
+        self.assertEqual(len(LEXICON), len(lexicon))
+        self.assertEqual(3, lexicon.attrs["bad_lines"])
+        self.assertNotIn("too-few", lexicon["word"].tolist())
+        printed.assert_called_once()
+
+    def test_read_sources(self):
+        sources = read_sources(f"{self.data_dir}/coca-sources.txt")
+
+        self.assertEqual([10, 11], sources["textID"].tolist())
+        self.assertEqual([2001, 2002], sources["year"].tolist())
+        self.assertEqual("category", str(sources["genre"].dtype))
+        self.assertEqual(["Title A", "Title B"], sources["title"].tolist())
+
+    def test_snapshot(self):
+        pkl_dir = f"{self.data_dir}/pkl/"
+
+        coca = COCA(data_dir=self.data_dir, pkl=True, pkl_dir=pkl_dir)
+        self.assertTrue(os.path.isfile(f"{pkl_dir}/coca.json"))
+        self.assertTrue(os.path.isfile(f"{pkl_dir}/data.pkl"))
+
+        # A matching snapshot is loaded without touching the raw files
+        with patch.object(COCA, "_db_reader", side_effect=Exception("raw parse")):
+            snapshot = COCA(data_dir=self.data_dir, pkl=True, pkl_dir=pkl_dir)
+            stream = COCA(data_dir=self.data_dir, pkl=True, pkl_dir=pkl_dir, mode=CMODE.STREAM)
+        self.assertTrue(coca.data.equals(snapshot.data))
+        self.assertTrue(coca.lexicon.equals(snapshot.lexicon))
+        self.assertTrue(coca.sources.equals(stream.sources))
+        self.assertIsNone(stream.data)
+
+        # Changing a source file invalidates the snapshot
+        with open(f"{self.data_dir}/coca-sources.txt", "a") as fout:
+            fout.write("12\t2003\tMAG\t120\tSource C\tTitle C\n")
+
+        with patch.object(COCA, "_db_reader", side_effect=Exception("raw parse")):
+            with self.assertRaises(Exception):
+                COCA(data_dir=self.data_dir, pkl=True, pkl_dir=pkl_dir)
+
+        self.assertEqual(3, len(COCA(data_dir=self.data_dir, pkl=True, pkl_dir=pkl_dir).sources))
+
+    def test_stream_mode(self):
+        coca = COCA(data_dir=self.data_dir, mode=CMODE.STREAM, chunksize=3)
+        self.assertIsNone(coca.data)
+        self.assertEqual(2, len(coca.sources))
+
+        chunks = list(coca.chunks())
+        self.assertEqual([3, 2, 3, 2], [len(c) for c in chunks])
+        self.assertEqual(
+            [1, 2, 3, 4, 5, 6, 7, 8, 9, 5],
+            [w for c in chunks for w in c["wordID"].tolist()],
+        )
+
+    def test_store_mode(self):
+        with self.assertRaises(Exception):
+            COCA(data_dir=self.data_dir, mode=CMODE.STORE)
+
+        COCA.build_store(self.data_dir)
+        coca = COCA(data_dir=self.data_dir, mode=CMODE.STORE)
+
+        store = coca.store
+        self.assertIsNone(coca.data)
+        self.assertEqual(10, len(store))
+        self.assertEqual([10] * 5 + [11] * 5, store.text_ids.tolist())
+        self.assertEqual([1, 2, 3, 4, 5, 6, 7, 8, 9, 5], store.word_ids.tolist())
+
+        self.assertEqual("stones", store.word(9))
+        self.assertEqual(
+            ["people", "stone", "the", "woman", ".", "they", "kill", "with", "stone", "."],
+            [store.lemma(l) for l in store.token_lemmas()],
+        )
+        self.assertEqual("vvi", store.pos(store.token_pos()[1]))
+        self.assertEqual(store.lemma_id("stone"), store.token_lemmas()[8])
+        self.assertEqual(-1, store.lemma_id("unknown"))
+        self.assertEqual(["vv0", "vvi"], [store.pos(p) for p in store.pos_ids("v")])
+
+    def test_parallel_store(self):
+        serial = COCA.build_store(self.data_dir, store_dir=f"{self.data_dir}/serial")
+
+        # A shard left behind by an interrupted build
+        os.makedirs(f"{self.data_dir}/parallel/shards/00000")
+        with open(f"{self.data_dir}/parallel/shards/00000/word_ids.bin", "wb") as fout:
+            fout.write(b"\x01\x00\x00\x00")
+
+        parallel = COCA.build_store(self.data_dir, store_dir=f"{self.data_dir}/parallel", workers=2)
+
+        self.assertEqual(len(serial), len(parallel))
+        self.assertEqual(serial.text_ids.tolist(), parallel.text_ids.tolist())
+        self.assertEqual(serial.word_ids.tolist(), parallel.word_ids.tolist())
+        self.assertEqual(serial.lex_lemma.tolist(), parallel.lex_lemma.tolist())
+        self.assertFalse(os.path.exists(f"{self.data_dir}/parallel/shards"))
+
+    def test_lemma_index(self):
+        COCA.build_store(self.data_dir)
+        coca = COCA(data_dir=self.data_dir, mode=CMODE.STORE)
+
+        with self.assertRaises(Exception):
+            coca.lemma_index()
+
+        index = coca.lemma_index(build=True)
+
+        self.assertEqual([1, 8], index.occurrences("stone").tolist())
+        self.assertEqual([1], index.occurrences("stone", "v").tolist())
+        self.assertEqual([8], index.occurrences("stone", "nn").tolist())
+        self.assertEqual([4, 9], index.occurrences(".").tolist())
+        self.assertEqual([], index.occurrences("unknown").tolist())
+
+        results = index.lookup([("stone", "v"), ("kill", "v"), ("woman", None)])
+        self.assertEqual(([1], [10]), tuple(a.tolist() for a in results[("stone", "v")]))
+        self.assertEqual(([6], [11]), tuple(a.tolist() for a in results[("kill", "v")]))
+        self.assertEqual(([3], [10]), tuple(a.tolist() for a in results[("woman", None)]))
+
+        # The index is persisted next to the store
+        reopened = COCA(data_dir=self.data_dir, mode=CMODE.STORE).lemma_index()
+        self.assertEqual([1, 8], reopened.occurrences("stone").tolist())
+
+        # A store rebuilt with a different lexicon (and the same number of tokens) invalidates the index
+        with open(f"{self.data_dir}/lexicon.txt", "a") as fout:
+            fout.write("10\tstoned\tstone\tjj\n")
+        COCA.build_store(self.data_dir)
+        with self.assertRaises(Exception):
+            COCA(data_dir=self.data_dir, mode=CMODE.STORE).lemma_index()
+
+    def test_match_pattern(self):
+        COCA.build_store(self.data_dir)
+        coca = COCA(data_dir=self.data_dir, mode=CMODE.STORE)
+
+        matches = match_pattern(coca.store, ["kill", "stone"])
+        self.assertEqual(1, len(matches))
+        self.assertEqual((11, 6, 9), matches.span(0))
+        self.assertEqual("kill with stones", matches.text(0))
+        self.assertEqual("they kill with stones .", matches.sentence(0))
+
+        # The lemma index finds the same matches as the full scan
+        index = coca.lemma_index(build=True)
+        indexed = match_pattern(coca.store, ["kill", "stone"], index=index)
+        self.assertEqual(list(matches.spans()), list(indexed.spans()))
+        self.assertEqual(matches.prep_positions.tolist(), indexed.prep_positions.tolist())
+        self.assertEqual(list(matches.spans()), list(coca.match_pattern(["kill", "stone"]).spans()))
+
+        # Windows do not cross texts or punctuation
+        self.assertEqual(0, len(match_pattern(coca.store, ["woman"], PatternSpec(verb_pos="nn", max_gap=4))))
+
+        # A preposition too far from the verb is not matched
+        self.assertEqual(0, len(match_pattern(coca.store, ["kill"], PatternSpec(max_gap=0))))
+        self.assertEqual(0, len(match_pattern(coca.store, ["stone"])))
+
+    def test_linear_mode(self):
+        coca = COCA(data_dir=self.data_dir, mode=CMODE.LINEAR)
+        self.assertIsNone(coca.data)
+
+        self.assertEqual(
+            [(10, "people stone the woman ."), (11, "they kill with stones .")],
+            list(coca.documents()),
+        )
+
+        store = COCA.build_store(self.data_dir, mode=CMODE.LINEAR)
+        self.assertEqual([10] * 5 + [11] * 5, store.text_ids.tolist())
+        self.assertEqual("stones", store.word(store.word_ids[8]))
+        self.assertEqual(store.word_ids[4], store.word_ids[9])
+
+    def test_wlpos_mode(self):
+        coca = COCA(data_dir=self.data_dir, mode=CMODE.WLPOS)
+
+        documents = list(coca.documents())
+        self.assertEqual([10, 11], [d[0] for d in documents])
+        self.assertEqual(["they", "kill", "with", "stones", "."], documents[1][1])
+        self.assertEqual(["they", "kill", "with", "stone", "."], documents[1][2])
+        self.assertEqual(["pphs2", "vv0", "iw", "nn2", "y"], documents[1][3])
+
+        store = COCA.build_store(self.data_dir, mode=CMODE.WLPOS)
+        coca = COCA(data_dir=self.data_dir, mode=CMODE.STORE)
+        self.assertEqual(10, len(store))
+        self.assertEqual("they kill with stones .", coca.match_pattern(["kill"]).sentence(0))
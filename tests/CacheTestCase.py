@@ -0,0 +1,44 @@
+from knowledge.cache import LRUCache
+from unittest import TestCase
+
+
+class LRUCacheTestCase(TestCase):
+    def test_get_and_put(self):
+        cache = LRUCache(maxsize=2)
+        self.assertIsNone(cache.get("A"))
+
+        cache.put("A", 1)
+        self.assertEqual(1, cache.get("A"))
+        self.assertIn("A", cache)
+
+        self.assertEqual({"size": 1, "maxsize": 2, "hits": 1, "misses": 1, "evictions": 0}, cache.stats())
+
+    def test_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.put("A", 1)
+        cache.put("B", 2)
+
+        # Touching A makes B the least recently used entry
+        cache.get("A")
+        cache.put("C", 3)
+
+        self.assertIn("A", cache)
+        self.assertNotIn("B", cache)
+        self.assertIn("C", cache)
+        self.assertEqual(1, cache.evictions)
+
+    def test_resize(self):
+        cache = LRUCache(maxsize=3)
+        cache.put("A", 1)
+        cache.put("B", 2)
+        cache.put("C", 3)
+
+        cache.resize(1)
+        self.assertEqual(1, len(cache))
+        self.assertIn("C", cache)
+        self.assertEqual(2, cache.evictions)
+
+    def test_zero_size(self):
+        cache = LRUCache(maxsize=0)
+        cache.put("A", 1)
+        self.assertNotIn("A", cache)
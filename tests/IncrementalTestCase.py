@@ -0,0 +1,135 @@
+from knowledge.local_collection import LocalCollection, LocalLexiconAPI, LocalOntologyAPI
+from knowledge.utils import content_hash, import_senses, load_knowledge_incrementally, shape_sense_record
+from ontomem.frame import Frame
+from ontomem.memory import MemoryManager
+from unittest import TestCase
+
+import json
+import os
+import tempfile
+
+
+class IncrementalBuildTestCase(TestCase):
+    def setUp(self):
+        self.concepts = LocalCollection(
+            [
+                {"name": "inc-all", "parents": [], "localProperties": []},
+                {"name": "inc-event", "parents": ["inc-all"], "localProperties": []},
+            ]
+        )
+        self.senses = LocalCollection([self.sense("CHOP", "CUT"), self.sense("SAW", "CUT")])
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "knowledge.om")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def sense(self, word: str, head: str) -> dict:
+        return {
+            "SENSE": "%s-V1" % word,
+            "WORD": word,
+            "CAT": "V",
+            "SYN-STRUC": {"SUBJECT": {"ROOT": "$VAR1", "CAT": "NP"}, "ROOT": "$VAR0", "CAT": "V"},
+            "SEM-STRUC": {head: {"AGENT": {"VALUE": "^$VAR1"}}},
+            "SYNONYMS": "NIL",
+            "HYPONYMS": "NIL",
+        }
+
+    def build(self) -> dict:
+        return load_knowledge_incrementally(
+            "ont-test",
+            "lex-test",
+            self.filename,
+            ontology_api=LocalOntologyAPI(self.concepts, ["inverse"]),
+            lexicon_api=LocalLexiconAPI(self.senses),
+        )
+
+    def test_content_hash(self):
+        self.assertEqual(content_hash({"a": 1, "b": [2]}), content_hash({"b": [2], "a": 1, "_id": "x"}))
+        self.assertNotEqual(content_hash({"a": 1}), content_hash({"a": 2}))
+
+    def test_import_senses(self):
+        name, slots = shape_sense_record(dict(self.sense("CLEAVE", "CUT"), **{"MEANING-PROCEDURES": "NIL"}))
+        self.assertEqual("CLEAVE.V.1", name)
+        self.assertEqual([], slots["MEANING-PROCEDURES"])
+        self.assertIsNone(slots["DEF"])
+
+        records = [shape_sense_record(self.sense("SPLIT%d" % i, "CUT")) for i in range(5)]
+        self.assertEqual(5, import_senses(records, batch_size=2))
+        self.assertIn(Frame("LEX-WORD"), Frame("SPLIT3.V.1").parents())
+
+        changed = shape_sense_record(self.sense("SPLIT0", "SEPARATE"))
+        self.assertEqual(0, import_senses([changed], replace=False))
+        self.assertEqual("CUT", list(Frame("SPLIT0.V.1")["SEM-STRUC"].singleton().keys())[0])
+        self.assertEqual(1, import_senses([changed]))
+        self.assertEqual("SEPARATE", list(Frame("SPLIT0.V.1")["SEM-STRUC"].singleton().keys())[0])
+
+    def incremental(self, concepts: tuple = (0, 0), senses: tuple = (0, 0, 0)) -> dict:
+        return {
+            "mode": "incremental",
+            "concepts": {"inserted": concepts[0], "updated": concepts[1]},
+            "senses": {"inserted": senses[0], "updated": senses[1], "deleted": senses[2]},
+        }
+
+    def test_incremental_build(self):
+        result = self.build()
+        self.assertEqual("full", result["mode"])
+        self.assertEqual("no previous build", result["reason"])
+        self.assertTrue(os.path.exists(self.filename + ".manifest.json"))
+
+        # Nothing changed
+        self.assertEqual(self.incremental(), self.build())
+
+        # One update and one insert
+        self.senses.replace_one({"SENSE": "SAW-V1"}, self.sense("SAW", "SEPARATE"))
+        self.senses.insert_one(self.sense("HEW", "CUT"))
+        self.assertEqual(self.incremental(senses=(1, 1, 0)), self.build())
+        self.assertEqual({"SEPARATE": {"AGENT": {"VALUE": "^$VAR1"}}}, Frame("SAW.V.1")["SEM-STRUC"].singleton())
+        self.assertEqual("HEW-V1", Frame("HEW.V.1")["SENSE"].singleton())
+
+        with open(self.filename + ".manifest.json", "r") as fin:
+            self.assertIn("HEW-V1", json.load(fin)["senses"])
+
+        # Deletes drop the frame and its link to LEX-WORD; renames move the sense to its new frame
+        self.senses.delete_one({"SENSE": "CHOP-V1"})
+        self.senses.replace_one({"SENSE": "SAW-V1"}, dict(self.sense("SAW", "SEPARATE"), WORD="SAWS"))
+        self.assertEqual(self.incremental(senses=(0, 1, 1)), self.build())
+        self.assertNotIn("CHOP.V.1", MemoryManager.memory.frames)
+        self.assertNotIn("SAW.V.1", MemoryManager.memory.frames)
+        self.assertNotIn("CHOP.V.1", [f.concept for f in Frame("LEX-WORD").descendants()])
+        self.assertEqual("SAW-V1", Frame("SAWS.V.1")["SENSE"].singleton())
+
+    def test_incremental_concepts(self):
+        self.build()
+
+        # New concepts and changed local fillers are applied in place
+        self.concepts.insert_one({"name": "inc-object", "parents": ["inc-all"], "localProperties": []})
+        self.concepts.replace_one(
+            {"name": "inc-event"},
+            {"name": "inc-event", "parents": ["inc-all"], "localProperties": [self.filler("an event")]},
+        )
+        self.assertEqual(self.incremental(concepts=(1, 1)), self.build())
+        self.assertIn(Frame("INC-ALL"), Frame("INC-OBJECT").parents())
+        self.assertEqual("an event", Frame("INC-EVENT")["DEFINITION"].singleton())
+
+        self.concepts.replace_one(
+            {"name": "inc-event"},
+            {"name": "inc-event", "parents": ["inc-all"], "localProperties": [self.filler("a happening")]},
+        )
+        self.assertEqual(self.incremental(concepts=(0, 1)), self.build())
+        self.assertEqual("a happening", Frame("INC-EVENT")["DEFINITION"].singleton())
+
+        # Changes to the parents of existing concepts and deleted concepts fall back to a full import
+        self.concepts.replace_one(
+            {"name": "inc-object"}, {"name": "inc-object", "parents": ["inc-event"], "localProperties": []}
+        )
+        self.assertEqual("concept parents changed", self.build()["reason"])
+        self.assertEqual([Frame("INC-EVENT")], Frame("INC-OBJECT").parents())
+
+        self.concepts.delete_one({"name": "inc-object"})
+        self.assertEqual("concepts deleted", self.build()["reason"])
+        self.assertNotIn("INC-OBJECT", MemoryManager.memory.frames)
+
+    def filler(self, definition: str) -> dict:
+        return {"slot": "definition", "facet": "value", "filler": definition}
@@ -1,5 +1,5 @@
 from collections import OrderedDict
-from knowledge.lexicon import Lexicon, MeaningProcedure, SemStruc, Sense, SynStruc
+from knowledge.lexicon import BASIC_DIATHESES, Diathesis, Lexicon, MeaningProcedure, SemStruc, Sense, SynStruc
 from ontomem.frame import Frame
 from unittest import TestCase
 
@@ -42,6 +42,150 @@ class LexiconTestCase(TestCase):
         lexicon = Lexicon()
         self.assertNotIn("TEST-V1", lexicon.sense_cache)
 
+    def test_sense_index(self):
+        lexword = Frame("LEX-WORD")
+
+        sense = Frame("INDEXED.V.1")
+        sense.add_parent(lexword)
+        sense.add_to_space("LEX")
+        sense["WORD"] = "INDEXED"
+        sense["CAT"] = "V"
+        sense["SENSE"] = "INDEXED-V1"
+        sense["SYN-STRUC"] = OrderedDict([("test", "a")])
+        sense["SEM-STRUC"] = {"test": "b"}
+        sense["MEANING-PROCEDURES"] = []
+
+        Lexicon.invalidate_sense_index()
+        self.assertEqual(["INDEXED.V.1"], Lexicon.sense_index()["INDEXED-V1"])
+
+        # Senses added after the index is built are still found, and are added to the index
+        sense = Frame("INDEXED.V.2")
+        sense.add_parent(lexword)
+        sense.add_to_space("LEX")
+        sense["WORD"] = "INDEXED"
+        sense["CAT"] = "V"
+        sense["SENSE"] = "INDEXED-V2"
+        sense["SYN-STRUC"] = OrderedDict([("test", "a")])
+        sense["SEM-STRUC"] = {"test": "b"}
+        sense["MEANING-PROCEDURES"] = []
+
+        self.assertNotIn("INDEXED-V2", Lexicon.sense_index())
+        self.assertEqual("INDEXED-V2", Lexicon().sense("INDEXED-V2").id)
+        self.assertEqual(["INDEXED.V.2"], Lexicon.sense_index()["INDEXED-V2"])
+
+        Lexicon.invalidate_sense_index()
+        self.assertIn("INDEXED-V2", Lexicon.sense_index())
+
+        with self.assertRaises(Exception):
+            Lexicon().sense("INDEXED-V3")
+
+    def test_shared_cache(self):
+        lexword = Frame("LEX-WORD")
+
+        sense = Frame("SHARED.V.1")
+        sense.add_parent(lexword)
+        sense.add_to_space("LEX")
+        sense["WORD"] = "SHARED"
+        sense["CAT"] = "V"
+        sense["SENSE"] = "SHARED-V1"
+        sense["SYN-STRUC"] = OrderedDict([("test", "a")])
+        sense["SEM-STRUC"] = {"test": "b"}
+        sense["MEANING-PROCEDURES"] = []
+
+        Lexicon.clear_shared_cache()
+
+        # Parsed senses are shared across instances
+        sense = Lexicon(shared=True).sense("SHARED-V1")
+        self.assertIn("SHARED-V1", Lexicon.shared_cache())
+        self.assertIs(sense, Lexicon(shared=True).sense("SHARED-V1"))
+
+        # Unshared instances do not read from or write to the shared cache
+        self.assertIsNot(sense, Lexicon().sense("SHARED-V1"))
+
+        # Temporary senses stay in the instance overlay
+        lexicon = Lexicon(shared=True)
+        temporary = Sense("TEMP-V1", "V", SynStruc(OrderedDict()), SemStruc({}), [], None, None)
+        lexicon.add_sense(temporary)
+        self.assertEqual(temporary, lexicon.sense("TEMP-V1"))
+        self.assertNotIn("TEMP-V1", Lexicon.shared_cache())
+        self.assertNotIn("TEMP-V1", Lexicon(shared=True).sense_cache)
+
+    def test_structural_synonyms(self):
+        lexword = Frame("LEX-WORD")
+
+        for word in ["SLAY", "MURDER", "HUG"]:
+            sense = Frame("%s.V.1" % word)
+            sense.add_parent(lexword)
+            sense.add_to_space("LEX")
+            sense["WORD"] = word
+            sense["CAT"] = "V"
+            sense["SENSE"] = "%s-V1" % word
+            sense["SYN-STRUC"] = OrderedDict([("SUBJECT", OrderedDict([("ROOT", "$VAR1"), ("CAT", "NP")])), ("ROOT", "$VAR0"), ("CAT", "V")])
+            sense["SEM-STRUC"] = {"KILL" if word != "HUG" else "EMBRACE": {"AGENT": {"VALUE": "^$VAR1"}}}
+            sense["MEANING-PROCEDURES"] = []
+            sense["SYNONYMS"] = "NIL"
+            sense["HYPONYMS"] = "NIL"
+
+        Lexicon.invalidate_sense_index()
+        lexicon = Lexicon()
+
+        self.assertEqual(["MURDER-V1"], [s.id for s in lexicon.structural_synonyms(lexicon.sense("SLAY-V1"))])
+        self.assertEqual(["SLAY-V1"], [s.id for s in lexicon.structural_synonyms(lexicon.sense("MURDER-V1"))])
+        self.assertEqual([], lexicon.structural_synonyms(lexicon.sense("HUG-V1")))
+
+    def test_diathesis_index(self):
+        lexword = Frame("LEX-WORD")
+        np = lambda var: OrderedDict([("ROOT", var), ("CAT", "NP")])
+
+        synstrucs = {
+            "SLEEP": OrderedDict([("SUBJECT", np("$VAR1")), ("ROOT", "$VAR0"), ("CAT", "V")]),
+            "EAT": OrderedDict([("SUBJECT", np("$VAR1")), ("ROOT", "$VAR0"), ("CAT", "V"), ("DIRECTOBJECT", np("$VAR2"))]),
+            "GIVE": OrderedDict(
+                [
+                    ("SUBJECT", np("$VAR1")),
+                    ("ROOT", "$VAR0"),
+                    ("CAT", "V"),
+                    ("INDIRECTOBJECT", np("$VAR3")),
+                    ("DIRECTOBJECT", np("$VAR2")),
+                ]
+            ),
+            "GIVEUP": OrderedDict(
+                [
+                    ("SUBJECT", np("$VAR1")),
+                    ("ROOT", "$VAR0"),
+                    ("CAT", "V"),
+                    ("PP", OrderedDict([("ROOT", "UP"), ("CAT", "PREP")])),
+                ]
+            ),
+            "RAIN": OrderedDict([("ROOT", "$VAR0"), ("CAT", "V")]),
+        }
+        for word, synstruc in synstrucs.items():
+            sense = Frame("%s.V.1" % word)
+            sense.add_parent(lexword)
+            sense.add_to_space("LEX")
+            sense["WORD"] = word
+            sense["CAT"] = "V"
+            sense["SENSE"] = "%s-V1" % word
+            sense["SYN-STRUC"] = synstruc
+            sense["SEM-STRUC"] = {}
+            sense["MEANING-PROCEDURES"] = []
+
+        Lexicon.invalidate_sense_index()
+        index = Lexicon.diathesis_index()
+        self.assertIn("SLEEP-V1", index[Diathesis.INTRANSITIVE])
+        self.assertIn("EAT-V1", index[Diathesis.TRANSITIVE])
+        self.assertIn("GIVE-V1", index[Diathesis.DITRANSITIVE])
+        self.assertIn("GIVEUP-V1", index[Diathesis.PHRASAL])
+        self.assertIn("RAIN-V1", index[Diathesis.OTHER])
+        self.assertIs(index, Lexicon.diathesis_index())
+
+        basic = Lexicon().senses_with_diathesis(BASIC_DIATHESES)
+        self.assertIn("EAT-V1", basic)
+        self.assertNotIn("GIVEUP-V1", basic)
+        self.assertEqual(sorted(basic), basic)
+
+        self.assertEqual((("SUBJECT", "NP"), ("DIRECTOBJECT", "NP")), SynStruc(synstrucs["EAT"]).shape())
+
     def test_null_sense(self):
         lexicon = Lexicon()
         self.assertEqual(Lexicon.null_sense(), lexicon.sense("ERROR"))
@@ -264,6 +408,26 @@ class SenseTestCase(TestCase):
 
 
 
+    def test_structure_key(self):
+        synstruc = OrderedDict([("SUBJECT", OrderedDict([("ROOT", "$VAR1"), ("CAT", "NP")])), ("ROOT", "$VAR0")])
+
+        a = Sense("A-V1", "V", SynStruc(synstruc), SemStruc({"KILL": {"AGENT": "^$VAR1", "THEME": "^$VAR2"}}), [], None, None)
+        b = Sense("B-V1", "V", SynStruc(synstruc), SemStruc({"KILL": {"THEME": "^$VAR2", "AGENT": "^$VAR1"}}), [], None, None)
+        self.assertEqual(a.structure_key(), b.structure_key())
+
+        # The POS is part of the key
+        c = Sense("C-N1", "N", SynStruc(synstruc), SemStruc({"KILL": {"AGENT": "^$VAR1", "THEME": "^$VAR2"}}), [], None, None)
+        self.assertNotEqual(a.structure_key(), c.structure_key())
+
+        # Syn-struc constituent order is significant
+        reordered = OrderedDict(reversed(list(synstruc.items())))
+        d = Sense("D-V1", "V", SynStruc(reordered), SemStruc({"KILL": {"AGENT": "^$VAR1", "THEME": "^$VAR2"}}), [], None, None)
+        self.assertNotEqual(a.structure_key(), d.structure_key())
+
+        # Keys are hashable
+        self.assertEqual(1, len({a.structure_key(), b.structure_key()}))
+
+
 class SemStrucTestCase(TestCase):
     def test_init_with_empty_string(self):
         # We test for this as there are entries in the lexicon like this
@@ -315,6 +479,26 @@ class SemStrucTestCase(TestCase):
             semstruc.elements(),
         )
 
+    def test_elements_are_memoized(self):
+        semstruc = SemStruc({"HUMAN": {}, "DOG": {}, "REFSEM1": {}, "^$VAR1": {}})
+
+        # Repeated calls return the same parsed objects
+        self.assertIs(semstruc.elements(), semstruc.elements())
+        self.assertIs(semstruc.head(), semstruc.elements()[0])
+        self.assertIs(semstruc.subs()[0], semstruc.elements()[1])
+        self.assertIs(semstruc.refsems(), semstruc.refsems())
+        self.assertIs(semstruc.variables(), semstruc.variables())
+
+        # Reassigning data reparses the elements
+        semstruc.data = {"CAT": {}}
+        self.assertEqual(SemStruc.Head("CAT", {}), semstruc.head())
+        self.assertEqual([], semstruc.subs())
+
+        # In place modifications require an explicit invalidation
+        semstruc.data["BIRD"] = {}
+        semstruc.invalidate()
+        self.assertEqual([SemStruc.Sub(1, "BIRD", {})], semstruc.subs())
+
     def test_head(self):
         # Trivial example
         semstruc = SemStruc({"HUMAN": {}})
@@ -0,0 +1,105 @@
+from collections import OrderedDict
+from knowledge.lexicon import Lexicon
+from match_against import (
+    MatchAgainstList,
+    basic_verb_records,
+    basic_verb_senses,
+    match_against_stage,
+)
+from ontomem.frame import Frame
+from ontomem.memory import MemoryManager
+from pipeline import Pipeline, read_jsonl
+from unittest import TestCase
+
+import tempfile
+
+
+class MatchAgainstTestCase(TestCase):
+    def add_sense(self, word: str, cat: str, synstruc: OrderedDict, semstruc: dict, synonyms="NIL", frame: int = 1):
+        sense = Frame("%s.%s.%d" % (word, cat, frame))
+        sense.add_parent(Frame("LEX-WORD"))
+        sense.add_to_space("LEX")
+        sense["WORD"] = word
+        sense["CAT"] = cat
+        sense["SENSE"] = "%s-%s1" % (word, cat)
+        sense["SYN-STRUC"] = synstruc
+        sense["SEM-STRUC"] = semstruc
+        sense["MEANING-PROCEDURES"] = []
+        sense["SYNONYMS"] = synonyms
+        sense["HYPONYMS"] = "NIL"
+
+    def setUp(self):
+        MemoryManager.memory = type(MemoryManager.memory)()
+
+        transitive = OrderedDict(
+            [
+                ("SUBJECT", OrderedDict([("ROOT", "$VAR1"), ("CAT", "NP")])),
+                ("ROOT", "$VAR0"),
+                ("CAT", "V"),
+                ("DIRECTOBJECT", OrderedDict([("ROOT", "$VAR2"), ("CAT", "NP")])),
+            ]
+        )
+        phrasal = OrderedDict(
+            [
+                ("SUBJECT", OrderedDict([("ROOT", "$VAR1"), ("CAT", "NP")])),
+                ("ROOT", "$VAR0"),
+                ("CAT", "V"),
+                ("PP", OrderedDict([("ROOT", "OFF"), ("CAT", "PREP")])),
+            ]
+        )
+        kill = {"KILL": {"AGENT": {"VALUE": "^$VAR1"}, "THEME": {"VALUE": "^$VAR2"}}}
+
+        self.transitive = transitive
+        self.add_sense("SLAY", "V", transitive, kill, synonyms=["MURDER"])
+        self.add_sense("ASSASSINATE", "V", transitive, kill)
+        self.add_sense("BUMP", "V", phrasal, kill)
+        self.add_sense("STONE", "N", OrderedDict([("ROOT", "$VAR0"), ("CAT", "N")]), {"STONE": {}})
+
+        Lexicon.invalidate_sense_index()
+        Lexicon.clear_shared_cache()
+
+    def test_basic_verb_senses(self):
+        ids = [s.id for s in basic_verb_senses()]
+        self.assertIn("SLAY-V1", ids)
+        self.assertIn("ASSASSINATE-V1", ids)
+        self.assertNotIn("BUMP-V1", ids)
+        self.assertNotIn("STONE-N1", ids)
+        self.assertEqual(sorted(ids), ids)
+
+    def test_to_dict(self):
+        mal = MatchAgainstList("SLAY-V1")
+        self.assertEqual(
+            {
+                "head": "SLAY-V1",
+                "synonyms": ["MURDER-V1"],
+                "hyponyms": [],
+                "structural_synonyms": ["ASSASSINATE-V1"],
+            },
+            mal.to_dict(),
+        )
+
+    def test_skipped_senses(self):
+        # A second frame with the same sense id makes SLAY-V1 ambiguous
+        self.add_sense("SLAY", "V", self.transitive, {"KILL": {}}, frame=2)
+        Lexicon.invalidate_sense_index()
+        Lexicon.clear_shared_cache()
+
+        skipped = []
+        ids = [s.id for s in basic_verb_senses(Lexicon(), skipped=skipped)]
+        self.assertIn("SLAY-V1", skipped)
+        self.assertNotIn("SLAY-V1", ids)
+        self.assertIn("ASSASSINATE-V1", ids)
+
+        with tempfile.TemporaryDirectory() as directory:
+            outputs = Pipeline(directory, [match_against_stage(Lexicon())]).run(basic_verb_records())
+            heads = [r["head"] for r in read_jsonl(outputs["match-against"])]
+        self.assertNotIn("SLAY-V1", heads)
+        self.assertIn("ASSASSINATE-V1", heads)
+
+    def test_match_against_stage(self):
+        with tempfile.TemporaryDirectory() as directory:
+            outputs = Pipeline(directory, [match_against_stage()]).run(basic_verb_records())
+            records = list(read_jsonl(outputs["match-against"]))
+
+        self.assertEqual([r["head"] for r in basic_verb_records()], [r["head"] for r in records])
+        self.assertIn("SLAY-V1", [r["head"] for r in records])
@@ -0,0 +1,112 @@
+from knowledge.ontology import Ontology
+from ontomem.frame import Frame
+from unittest import TestCase
+
+
+class OntologyTestCase(TestCase):
+    def setUp(self):
+        # ONT-ALL
+        #   ONT-OBJECT
+        #     ONT-ANIMAL
+        #       ONT-HUMAN
+        #       ONT-DOG (also ONT-PET)
+        #     ONT-PET
+        Frame("ONT-OBJECT").add_parent(Frame("ONT-ALL"))
+        Frame("ONT-ANIMAL").add_parent(Frame("ONT-OBJECT"))
+        Frame("ONT-PET").add_parent(Frame("ONT-OBJECT"))
+        Frame("ONT-HUMAN").add_parent(Frame("ONT-ANIMAL"))
+        Frame("ONT-DOG").add_parent(Frame("ONT-ANIMAL"))
+        Frame("ONT-DOG").add_parent(Frame("ONT-PET"))
+
+        Ontology.invalidate_caches()
+
+    def test_common_ancestors(self):
+        ontology = Ontology()
+
+        self.assertEqual(
+            {"ONT-ALL", "ONT-OBJECT", "ONT-ANIMAL"},
+            ontology.common_ancestors("ONT-HUMAN", "ONT-DOG"),
+        )
+        self.assertEqual(
+            {"ONT-ALL", "ONT-OBJECT"}, ontology.common_ancestors("ont-pet", "ont-dog")
+        )
+
+        with self.assertRaises(Exception):
+            ontology.common_ancestors("ONT-HUMAN", "ONT-UNKNOWN")
+
+    def test_isa(self):
+        ontology = Ontology()
+
+        self.assertTrue(ontology.isa("ONT-DOG", "ONT-DOG"))
+        self.assertTrue(ontology.isa("ONT-DOG", "ONT-PET"))
+        self.assertTrue(ontology.isa("ONT-DOG", "ONT-ALL"))
+        self.assertFalse(ontology.isa("ONT-HUMAN", "ONT-PET"))
+        self.assertFalse(ontology.isa("ONT-ANIMAL", "ONT-DOG"))
+
+    def test_distance_to_ancestor(self):
+        ontology = Ontology()
+
+        self.assertEqual(0, ontology.distance_to_ancestor("ONT-DOG", "ONT-DOG"))
+        self.assertEqual(1, ontology.distance_to_ancestor("ONT-DOG", "ONT-PET"))
+        self.assertEqual(2, ontology.distance_to_ancestor("ONT-DOG", "ONT-OBJECT"))
+        self.assertEqual(3, ontology.distance_to_ancestor("ONT-DOG", "ONT-ALL"))
+        self.assertIsNone(ontology.distance_to_ancestor("ONT-HUMAN", "ONT-PET"))
+
+        # Distances are memoized
+        self.assertIn(("ONT-DOG", "ONT-PET"), Ontology.distance_cache())
+
+    def test_distances_to_ancestors(self):
+        ontology = Ontology()
+
+        self.assertEqual(
+            {"ONT-ANIMAL": 1, "ONT-PET": None, "ONT-ALL": 3, "ONT-HUMAN": 0},
+            ontology.distances_to_ancestors(
+                "ONT-HUMAN", ["ONT-ANIMAL", "ONT-PET", "ONT-ALL", "ONT-HUMAN"]
+            ),
+        )
+
+    def test_distance_to_ancestor_deep_chain(self):
+        # Deeper than the default recursion limit
+        for i in range(1, 2000):
+            Frame("ONT-CHAIN-%d" % i).add_parent(Frame("ONT-CHAIN-%d" % (i - 1)))
+
+        self.assertEqual(1999, Ontology().distance_to_ancestor("ONT-CHAIN-1999", "ONT-CHAIN-0"))
+
+    def test_relations(self):
+        Frame("ONT-AGENT").add_parent(Frame("RELATION"))
+        Frame("ONT-AGENT")["INVERSE"] = "ONT-AGENT-OF"
+        Frame("ONT-AGENT-OF").add_parent(Frame("RELATION"))
+        Frame("ONT-AGENT-OF")["INVERSE"] = "ONT-AGENT"
+        Frame("ONT-LOCATION").add_parent(Frame("RELATION"))
+
+        Ontology.invalidate_caches()
+        ontology = Ontology()
+
+        relations = ontology.relations()
+        self.assertIn("RELATION", relations)
+        self.assertIn("ONT-AGENT", relations)
+        self.assertIn("ONT-LOCATION", relations)
+
+        inverses = ontology.inverses()
+        self.assertEqual("ONT-AGENT", inverses["ONT-AGENT-OF"])
+        self.assertEqual("ONT-LOCATION", inverses["ONT-LOCATION-INVERSE"])
+
+        relation_inverses = ontology.relation_inverses()
+        self.assertEqual("ONT-AGENT-OF", relation_inverses["ONT-AGENT"])
+        self.assertEqual("ONT-LOCATION-INVERSE", relation_inverses["ONT-LOCATION"])
+
+        # The tables are computed once and cannot be modified
+        self.assertIs(inverses, Ontology().inverses())
+        with self.assertRaises(TypeError):
+            inverses["X"] = "Y"
+
+    def test_closure_stats(self):
+        ontology = Ontology()
+        ontology.common_ancestors("ONT-HUMAN", "ONT-DOG")
+
+        stats = Ontology.closure().stats()
+        self.assertEqual(6, stats["closures"])
+        self.assertGreater(stats["bytes"], 0)
+
+        Ontology.invalidate_caches()
+        self.assertEqual(0, Ontology.closure().stats()["closures"])
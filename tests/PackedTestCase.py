@@ -0,0 +1,108 @@
+from collections import OrderedDict
+from knowledge.lexicon import Diathesis, Lexicon
+from knowledge.ontology import Ontology
+from knowledge.packed import PackedKnowledge
+from ontomem.frame import Frame
+from ontomem.memory import MemoryManager
+from unittest import TestCase
+
+import os
+import tempfile
+
+
+class PackedKnowledgeTestCase(TestCase):
+    def setUp(self):
+        MemoryManager.memory = type(MemoryManager.memory)()
+
+        Frame("PACK-OBJECT").add_parent(Frame("PACK-ALL"))
+        Frame("PACK-ANIMAL").add_parent(Frame("PACK-OBJECT"))
+        Frame("PACK-DOG").add_parent(Frame("PACK-ANIMAL"))
+
+        sense = Frame("PACKED.V.1")
+        sense.add_parent(Frame("LEX-WORD"))
+        sense.add_to_space("LEX")
+        sense["WORD"] = "PACKED"
+        sense["CAT"] = "V"
+        sense["SENSE"] = "PACKED-V1"
+        sense["SYN-STRUC"] = OrderedDict(
+            [("SUBJECT", OrderedDict([("ROOT", "$VAR1"), ("CAT", "NP")])), ("ROOT", "$VAR0"), ("CAT", "V")]
+        )
+        sense["SEM-STRUC"] = {"PACK-ANIMAL": {"AGENT": {"VALUE": "^$VAR1"}}}
+        sense["MEANING-PROCEDURES"] = []
+        sense["SYNONYMS"] = ["BUNDLED"]
+        sense["HYPONYMS"] = "NIL"
+
+        Lexicon.invalidate_sense_index()
+        Lexicon.clear_shared_cache()
+        Ontology.invalidate_caches()
+
+        self.directory = tempfile.TemporaryDirectory()
+        self.filename = os.path.join(self.directory.name, "knowledge.okp")
+
+    def tearDown(self):
+        PackedKnowledge.unload()
+        Lexicon.invalidate_sense_index()
+        Ontology.invalidate_caches()
+        self.directory.cleanup()
+
+    def test_write_and_load(self):
+        expected = Lexicon().sense("PACKED-V1")
+        self.assertEqual(0, PackedKnowledge.write(self.filename))
+
+        # Loading replaces the memory, so everything below is read from the packed file
+        self.assertTrue(PackedKnowledge.is_packed(self.filename))
+        packed = PackedKnowledge.load(self.filename)
+        self.assertIs(packed, PackedKnowledge.active)
+        self.assertNotIn("PACK-DOG", MemoryManager.memory.frames)
+        self.assertNotIn("PACKED.V.1", MemoryManager.memory.frames)
+        self.assertEqual(["PACK-ANIMAL"], packed.parents("PACK-DOG"))
+        self.assertIsNone(packed.sense("UNKNOWN-V1"))
+        self.assertIn("PACKED.V.1", packed.sense("PACKED-V1")["FRAME"])
+
+        sense = Lexicon().sense("PACKED-V1")
+        self.assertEqual(expected.id, sense.id)
+        self.assertEqual(expected.synstruc, sense.synstruc)
+        self.assertEqual(expected.semstruc, sense.semstruc)
+        self.assertEqual(["BUNDLED"], sense.synonyms)
+
+        self.assertIn("PACKED-V1", Lexicon.diathesis_index()[Diathesis.INTRANSITIVE])
+        self.assertIn(["PACKED-V1"], Lexicon.structure_index().values())
+
+        Ontology.invalidate_caches()
+        self.assertTrue(Ontology().isa("PACK-DOG", "PACK-ALL"))
+        self.assertEqual(2, Ontology().distance_to_ancestor("PACK-DOG", "PACK-OBJECT"))
+
+        # A materialized concept has its whole ancestor chain, but none of its other slots
+        dog = Ontology().concept("PACK-DOG")
+        self.assertEqual([Frame("PACK-ANIMAL")], dog.parents())
+        self.assertEqual([Frame("PACK-ALL")], Frame("PACK-OBJECT").parents())
+        self.assertEqual(Frame("PACK-DOG"), dog)
+        with self.assertRaises(Exception):
+            dog["DEFINITION"]
+
+    def test_write_reports_skipped_senses(self):
+        Frame("UNPACKED.V.1").add_parent(Frame("LEX-WORD"))
+        Frame("UNPACKED.V.1")["SENSE"] = "UNPACKED-V1"
+
+        self.assertEqual(1, PackedKnowledge.write(self.filename))
+        self.assertIsNone(PackedKnowledge.load(self.filename).sense("UNPACKED-V1"))
+
+    def test_invalid_file(self):
+        with open(self.filename, "wb") as fout:
+            fout.write(b"\0" * 64)
+
+        with self.assertRaises(Exception):
+            PackedKnowledge.load(self.filename)
+
+        # Empty and truncated files
+        with open(self.filename, "wb") as fout:
+            pass
+        with self.assertRaises(Exception):
+            PackedKnowledge.load(self.filename)
+
+        PackedKnowledge.write(self.filename)
+        with open(self.filename, "r+b") as fout:
+            fout.truncate(os.path.getsize(self.filename) - 1)
+        with self.assertRaises(Exception):
+            PackedKnowledge.load(self.filename)
+        self.assertIsNone(PackedKnowledge.active)
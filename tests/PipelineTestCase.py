@@ -0,0 +1,144 @@
+from pipeline import Pipeline, Scheduler, Stage, read_jsonl
+from unittest import TestCase
+
+import os
+import tempfile
+
+
+class PipelineTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.source = [{"n": n} for n in range(10)]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def stages(self, fail_at: int = None) -> list:
+        def square(record: dict):
+            if record["n"] == fail_at:
+                raise Exception("Crash at %d." % fail_at)
+            yield {"n": record["n"], "square": record["n"] ** 2}
+
+        def even(record: dict):
+            if record["square"] % 2 == 0:
+                yield record
+
+        return [Stage("square", square), Stage("even", even)]
+
+    def test_run(self):
+        pipeline = Pipeline(self.directory.name, self.stages(), checkpoint_every=3)
+        outputs = pipeline.run(self.source)
+
+        self.assertEqual(list(range(10)), [r["n"] for r in read_jsonl(outputs["square"])])
+        self.assertEqual([0, 2, 4, 6, 8], [r["n"] for r in read_jsonl(outputs["even"])])
+        checkpoint = pipeline.checkpoint(pipeline.stages[0])
+        self.assertEqual(10, checkpoint["input"])
+        self.assertEqual(os.path.getsize(outputs["square"]), checkpoint["offset"])
+        self.assertTrue(checkpoint["complete"])
+
+    def test_resume(self):
+        with self.assertRaises(Exception):
+            Pipeline(self.directory.name, self.stages(fail_at=7), checkpoint_every=3).run(self.source)
+
+        pipeline = Pipeline(self.directory.name, self.stages(), checkpoint_every=3)
+        self.assertEqual(6, pipeline.checkpoint(pipeline.stages[0])["input"])
+
+        # Inputs before the checkpoint are not processed again
+        processed = []
+        square = pipeline.stages[0].fn
+        pipeline.stages[0].fn = lambda record: processed.append(record["n"]) or square(record)
+
+        outputs = pipeline.run(self.source)
+        self.assertEqual([6, 7, 8, 9], processed)
+        self.assertEqual(list(range(10)), [r["n"] for r in read_jsonl(outputs["square"])])
+        self.assertEqual([0, 2, 4, 6, 8], [r["n"] for r in read_jsonl(outputs["even"])])
+
+        # Completed stages are skipped
+        processed.clear()
+        pipeline.run(self.source)
+        self.assertEqual([], processed)
+
+    def test_changed_input(self):
+        pipeline = Pipeline(self.directory.name, self.stages(), checkpoint_every=3)
+        pipeline.run(self.source)
+
+        # New source records restart every stage
+        processed = []
+        square = pipeline.stages[0].fn
+        pipeline.stages[0].fn = lambda record: processed.append(record["n"]) or square(record)
+
+        outputs = pipeline.run([{"n": n} for n in range(10, 14)])
+        self.assertEqual([10, 11, 12, 13], processed)
+        self.assertEqual([10, 12], [r["n"] for r in read_jsonl(outputs["even"])])
+
+        # So does a changed input file, or a changed stage config
+        processed.clear()
+        with open(os.path.join(self.directory.name, "source.jsonl"), "w") as fout:
+            fout.write('{"n": 20}\n')
+        pipeline.run(os.path.join(self.directory.name, "source.jsonl"))
+        self.assertEqual([20], processed)
+
+        processed.clear()
+        pipeline.stages[0].config = {"version": 2}
+        pipeline.run(os.path.join(self.directory.name, "source.jsonl"))
+        self.assertEqual([20], processed)
+
+        # A crashed run with different input is not resumed from its checkpoint
+        processed.clear()
+        with self.assertRaises(Exception):
+            Pipeline(self.directory.name, self.stages(fail_at=7), checkpoint_every=3).run(self.source)
+        pipeline.stages[0].config = None
+        outputs = pipeline.run(self.source[:5])
+        self.assertEqual([0, 1, 2, 3, 4], processed)
+        self.assertEqual(list(range(5)), [r["n"] for r in read_jsonl(outputs["square"])])
+
+    def test_duplicate_stages(self):
+        with self.assertRaises(Exception):
+            Pipeline(self.directory.name, [Stage("a", list), Stage("a", list)])
+
+
+_initialized = False
+
+
+def initialize():
+    global _initialized
+    _initialized = True
+
+
+def worker_stages() -> list:
+    def tag(record: dict):
+        yield {"n": record["n"], "initialized": _initialized, "pid": os.getpid()}
+
+    return [Stage("tag", tag)]
+
+
+class SchedulerTestCase(TestCase):
+    def test_scheduler(self):
+        source = [{"n": n} for n in range(50)]
+        with tempfile.TemporaryDirectory() as directory:
+            with Scheduler(3, worker_stages, initializer=initialize, chunksize=4) as scheduler:
+                outputs = Pipeline(directory, worker_stages(), scheduler=scheduler).run(source)
+            records = list(read_jsonl(outputs["tag"]))
+
+        self.assertEqual(list(range(50)), [r["n"] for r in records])
+        self.assertTrue(all(r["initialized"] for r in records))
+        self.assertNotIn(os.getpid(), {r["pid"] for r in records})
+        self.assertLessEqual(len({r["pid"] for r in records}), 3)
+
+    def test_scheduler_window(self):
+        read = []
+
+        def source():
+            for n in range(100):
+                read.append(n)
+                yield {"n": n}
+
+        with Scheduler(2, worker_stages, chunksize=2, window=8) as scheduler:
+            outputs = scheduler.process(worker_stages()[0], source())
+            i, first = next(outputs)
+
+            # Only the first two windows have been read from the source
+            self.assertEqual((0, 0), (i, first[0]["n"]))
+            self.assertLessEqual(len(read), 16)
+
+            self.assertEqual(list(range(1, 100)), [o[0]["n"] for _, o in outputs])
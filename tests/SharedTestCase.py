@@ -0,0 +1,58 @@
+from collections import OrderedDict
+from knowledge.lexicon import Lexicon
+from knowledge.ontology import Ontology
+from knowledge.shared import fork_pool, prepare_for_fork, release_after_fork
+from ontomem.frame import Frame
+from unittest import TestCase
+
+import gc
+import multiprocessing
+import unittest
+
+
+def describe(id: str) -> tuple:
+    sense = Lexicon(shared=True).sense(id)
+    return sense.id, Ontology().isa("SHARED-DOG", "SHARED-ALL")
+
+
+@unittest.skipUnless("fork" in multiprocessing.get_all_start_methods(), "requires the fork start method")
+class SharedKnowledgeTestCase(TestCase):
+    def setUp(self):
+        Frame("SHARED-ANIMAL").add_parent(Frame("SHARED-ALL"))
+        Frame("SHARED-DOG").add_parent(Frame("SHARED-ANIMAL"))
+
+        for word in ["BARK", "HOWL"]:
+            sense = Frame("%s.V.1" % word)
+            sense.add_parent(Frame("LEX-WORD"))
+            sense.add_to_space("LEX")
+            sense["WORD"] = word
+            sense["CAT"] = "V"
+            sense["SENSE"] = "%s-V1" % word
+            sense["SYN-STRUC"] = OrderedDict([("SUBJECT", OrderedDict([("ROOT", "$VAR1"), ("CAT", "NP")])), ("ROOT", "$VAR0"), ("CAT", "V")])
+            sense["SEM-STRUC"] = {"EMIT-SOUND": {"AGENT": {"VALUE": "^$VAR1"}}}
+            sense["MEANING-PROCEDURES"] = []
+            sense["SYNONYMS"] = "NIL"
+            sense["HYPONYMS"] = "NIL"
+
+        Lexicon.invalidate_sense_index()
+        Lexicon.clear_shared_cache()
+        Ontology.invalidate_caches()
+
+    def tearDown(self):
+        release_after_fork()
+
+    def test_prepare_for_fork(self):
+        prepare_for_fork(senses=["BARK-V1"])
+
+        self.assertGreater(gc.get_freeze_count(), 0)
+        self.assertIn("BARK-V1", Lexicon.shared_cache())
+        self.assertIn("SHARED-DOG", Ontology.closure().bits)
+        self.assertNotIn("BARK.V.1", Ontology.closure().bits)
+
+    def test_fork_pool(self):
+        prepare_for_fork(senses=["BARK-V1"])
+
+        with fork_pool(2) as pool:
+            results = pool.map(describe, ["BARK-V1", "HOWL-V1"])
+
+        self.assertEqual([("BARK-V1", True), ("HOWL-V1", True)], results)
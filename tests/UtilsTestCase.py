@@ -0,0 +1,52 @@
+from knowledge.local_collection import LocalCollection, LocalOntologyAPI
+from knowledge.utils import load_ontology_from_db, ontology_relations
+from ontomem.frame import Frame
+from ontomem.memory import MemoryManager
+from unittest import TestCase
+
+
+class LoadOntologyTestCase(TestCase):
+    def setUp(self):
+        # Children are listed before their parents, and one concept refers to a parent that is not in the ontology.
+        # With a batch size of 2, STREAM-DOG and STREAM-TAIL are read in the first cursor batch and STREAM-ANIMAL in
+        # the second.
+        self.api = LocalOntologyAPI(
+            LocalCollection(
+                [
+                    {
+                        "name": "stream-dog",
+                        "parents": ["stream-animal"],
+                        "localProperties": [{"slot": "has-part", "facet": "sem", "filler": "stream-tail"}],
+                    },
+                    {"name": "stream-tail", "parents": ["stream-object"], "localProperties": []},
+                    {
+                        "name": "stream-animal",
+                        "parents": ["stream-object"],
+                        "localProperties": [{"slot": "has-part", "facet": "sem", "filler": "stream-tail"}],
+                    },
+                    {"name": "stream-object", "parents": ["stream-missing"], "localProperties": []},
+                    {"name": "stream.ignored", "parents": ["stream-object"], "localProperties": []},
+                ]
+            ),
+            ["has-part", "part-of-object", "inverse"],
+        )
+
+    def test_ontology_relations(self):
+        self.assertEqual({"HAS-PART", "PART-OF-OBJECT"}, ontology_relations(self.api))
+
+    def test_load_ontology_from_db(self):
+        load_ontology_from_db("ont-stream", api=self.api, batch_size=2)
+
+        self.assertEqual(["STREAM-ANIMAL"], [p.concept for p in Frame("STREAM-DOG").parents()])
+        self.assertEqual(["STREAM-OBJECT"], [p.concept for p in Frame("STREAM-ANIMAL").parents()])
+        self.assertEqual([], Frame("STREAM-OBJECT").parents())
+
+        # Links across cursor batches point at the frames of the concepts: a parent read in a later batch, and a
+        # relation filler read in an earlier one
+        self.assertTrue(Frame("STREAM-DOG").isa(Frame("STREAM-OBJECT")))
+        self.assertEqual(Frame("STREAM-TAIL"), Frame("STREAM-ANIMAL")["HAS-PART"].singleton())
+        self.assertEqual(Frame("STREAM-TAIL"), Frame("STREAM-DOG")["HAS-PART"].singleton())
+        self.assertEqual(["STREAM-OBJECT"], [p.concept for p in Frame("STREAM-TAIL").parents()])
+
+        self.assertNotIn("STREAM-MISSING", MemoryManager.memory.frames)
+        self.assertNotIn("STREAM.IGNORED", MemoryManager.memory.frames)
@@ -0,0 +1,100 @@
+from pipeline import Pipeline, read_jsonl
+from unittest import TestCase
+from wordnet import CandidatesForLearningList, WordNetIndex, candidates_stage, match_against_words
+
+import os
+import tempfile
+
+
+DATA_VERB = """\
+  1 This software and database is being provided to you, the LICENSEE, by Princeton University under the following
+  2 license.
+01323958 35 v 01 kill 0 05 ~ 01324305 v 0000 ~ 01325536 v 0000 @ 00000001 v 0000 + 00000002 n 0101 ~ 01326000 v 0000 01 + 08 00 | cause to die; put to death; "This man killed several people when he tried to rob a bank"; "The farmer killed a pig"
+01324305 35 v 02 murder 0 slay 0 01 ~ 01325000 v 0000 01 + 08 00 | kill intentionally and with premeditation; "The mafia boss ordered his enemies murdered"
+01325000 35 v 01 assassinate 0 01 @ 01324305 v 0000 01 + 08 00 | murder; especially socially prominent persons
+01325536 35 v 01 stone 0 00 01 + 08 00 | kill by throwing stones at; "People wanted to stone the woman who had a child out of wedlock"
+01326000 35 v 02 wipe_out 0 eliminate 0 00 | kill in large numbers
+"""
+
+INDEX_VERB = """\
+  1 This software and database is being provided to you, the LICENSEE, by Princeton University under the following
+dispatch v 2 1 ~ 2 0 01323958 01324305
+kill v 1 3 ~ @ + 1 1 01323958
+murder v 1 1 ~ 1 1 01324305
+slay v 1 1 ~ 1 0 01324305
+stone v 1 0 1 0 01325536
+wipe_out v 1 0 1 0 01326000
+"""
+
+
+class WordNetTestCase(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        wordnet_dir = os.path.join(self.directory.name, "dict")
+        os.makedirs(wordnet_dir)
+        with open(os.path.join(wordnet_dir, "data.verb"), "w") as fout:
+            fout.write(DATA_VERB)
+        with open(os.path.join(wordnet_dir, "index.verb"), "w") as fout:
+            fout.write(INDEX_VERB)
+
+        self.index_dir = os.path.join(self.directory.name, "index")
+        self.index = WordNetIndex.build(wordnet_dir, self.index_dir)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_synset(self):
+        kill = self.index.synset(int(self.index.synsets("kill")[0]))
+        self.assertEqual(1323958, kill["synset"])
+        self.assertEqual(["kill"], kill["words"])
+        self.assertEqual("cause to die; put to death", kill["gloss"])
+        self.assertEqual(
+            ["This man killed several people when he tried to rob a bank", "The farmer killed a pig"], kill["examples"]
+        )
+
+        self.assertEqual(["wipe out", "eliminate"], self.index.synset(int(self.index.synsets("Wipe Out")[0]))["words"])
+        self.assertEqual(0, len(self.index.synsets("unknown")))
+
+    def test_lookup(self):
+        results = self.index.lookup(["kill", "stone", "unknown"])
+
+        self.assertEqual(
+            [(1324305, 1), (1325536, 1), (1326000, 1), (1325000, 2)],
+            [(e["synset"], e["depth"]) for e in results["kill"]],
+        )
+        self.assertEqual("kill by throwing stones at", results["kill"][1]["gloss"])
+        self.assertEqual([], results["stone"])
+        self.assertEqual([], results["unknown"])
+
+        # Assassinate is two steps from the first synset of dispatch (kill) and one from the second (murder)
+        dispatch = self.index.lookup(["dispatch"])["dispatch"]
+        self.assertEqual(
+            [(1324305, 1, 1323958), (1325536, 1, 1323958), (1326000, 1, 1323958), (1325000, 1, 1324305)],
+            [(e["synset"], e["depth"], e["source"]) for e in dispatch],
+        )
+
+        # Reopening the index reads the same arrays
+        self.assertEqual(results, WordNetIndex(self.index_dir).lookup(["kill", "stone", "unknown"]))
+
+    def test_candidates_for_learning(self):
+        match_against = {
+            "head": "KILL-V1",
+            "synonyms": ["SLAY-V1"],
+            "hyponyms": [],
+            "structural_synonyms": ["MURDER-V1", "KILL-V2"],
+        }
+        self.assertEqual(["kill", "slay", "murder"], match_against_words(match_against))
+
+        candidates = CandidatesForLearningList.from_match_against(match_against, self.index).to_dict()
+        self.assertEqual("KILL-V1", candidates["head"])
+        self.assertEqual([1324305, 1325536, 1326000, 1325000], [c["synset"] for c in candidates["candidates"]])
+        self.assertEqual({"kill"}, {c["word"] for c in candidates["candidates"]})
+
+    def test_candidates_stage(self):
+        with tempfile.TemporaryDirectory() as directory:
+            outputs = Pipeline(directory, [candidates_stage(self.index_dir)]).run(
+                [{"head": "STONE-V1"}, {"head": "MURDER-V1", "synonyms": ["SLAY-V1"]}]
+            )
+            records = list(read_jsonl(outputs["candidates-for-learning"]))
+
+        self.assertEqual([[], [1325000]], [[c["synset"] for c in r["candidates"]] for r in records])
@@ -0,0 +1,310 @@
+"""
+A local, precomputed WordNet verb troponym index.
+
+The index is built once from the WordNet database files (index.verb and data.verb, e.g. from the WordNet 3.0 dict/
+directory) and maps every verb lemma to its synsets, and every synset to all of its transitive troponyms (the "~"
+pointers of data.verb), along with their words, glosses and examples. It is stored as flat arrays and string tables
+that are opened with numpy.memmap, so opening is nearly free and no network or WordNet API is needed at run time.
+
+The CandidatesForLearningList step of the algorithm queries the index in bulk for all the words of a
+MatchAgainstList (see CandidatesForLearningList and candidates_stage).
+"""
+
+import numpy as np
+from typing import Dict, Iterable, List, Tuple
+
+from coca_store import OFFSET_DTYPE, StringTable
+from pipeline import Stage, file_fingerprint
+
+import json
+import os
+import re
+
+
+WORDNET_VERSION = 1
+
+SYNSET_DTYPE = np.int32  # synset numbers
+DEPTH_DTYPE = np.int16  # troponym depths
+
+TROPONYM_POINTER = "~"
+EXAMPLE_PATTERN = re.compile(r'"([^"]*)"')
+
+
+# The on-disk layout of an index directory is:
+#   wordnet.json                - index version, number of lemmas and synsets
+#   lemmas.bin/.off             - verb lemmas, sorted (WordNet form: lower case, "_" between words)
+#   lemma_synset_offsets.bin    - synsets of lemma i are lemma_synsets[offsets[i]:offsets[i + 1]] (int64)
+#   lemma_synsets.bin           - synset numbers, in WordNet sense order (int32)
+#   synset_offsets.bin          - data.verb byte offset (the WordNet synset id) of every synset number (int64)
+#   synset_words.bin/.off       - words of every synset, tab separated
+#   glosses.bin/.off            - definition of every synset
+#   examples.bin/.off           - examples of every synset, tab separated
+#   troponym_offsets.bin        - troponyms of synset i are troponyms[offsets[i]:offsets[i + 1]] (int64)
+#   troponyms.bin               - transitive troponyms of every synset, breadth first (int32)
+#   troponym_depths.bin         - distance of each of those troponyms from the synset (int16)
+class WordNetIndex(object):
+    @classmethod
+    def build(cls, wordnet_dir: str, index_dir: str) -> "WordNetIndex":
+        synsets = read_data_verb(os.path.join(wordnet_dir, "data.verb"))
+        lemmas = read_index_verb(os.path.join(wordnet_dir, "index.verb"))
+
+        offsets = sorted(synsets.keys())
+        number = {offset: i for i, offset in enumerate(offsets)}
+
+        os.makedirs(index_dir, exist_ok=True)
+
+        names = sorted(lemmas.keys())
+        StringTable.write(names, f"{index_dir}/lemmas")
+        _write_csr(
+            [[number[o] for o in lemmas[name] if o in number] for name in names],
+            f"{index_dir}/lemma_synset_offsets.bin",
+            f"{index_dir}/lemma_synsets.bin",
+        )
+
+        np.asarray(offsets, dtype=np.int64).tofile(f"{index_dir}/synset_offsets.bin")
+        StringTable.write(("\t".join(synsets[o][0]) for o in offsets), f"{index_dir}/synset_words")
+        StringTable.write((synsets[o][2] for o in offsets), f"{index_dir}/glosses")
+        StringTable.write(("\t".join(synsets[o][3]) for o in offsets), f"{index_dir}/examples")
+
+        # The transitive troponyms of every synset, found breadth first so each is listed at its shortest depth
+        direct = [[number[t] for t in synsets[o][1] if t in number] for o in offsets]
+        troponyms = []
+        depths = []
+        for i in range(len(offsets)):
+            seen = {i}
+            found = []
+            found_depths = []
+            frontier = [i]
+            depth = 0
+            while len(frontier) > 0:
+                depth += 1
+                next_frontier = []
+                for s in frontier:
+                    for t in direct[s]:
+                        if t in seen:
+                            continue
+                        seen.add(t)
+                        found.append(t)
+                        found_depths.append(depth)
+                        next_frontier.append(t)
+                frontier = next_frontier
+            troponyms.append(found)
+            depths.append(found_depths)
+
+        _write_csr(troponyms, f"{index_dir}/troponym_offsets.bin", f"{index_dir}/troponyms.bin")
+        np.asarray([d for ds in depths for d in ds], dtype=DEPTH_DTYPE).tofile(f"{index_dir}/troponym_depths.bin")
+
+        with open(f"{index_dir}/wordnet.json", "w") as fout:
+            json.dump({"version": WORDNET_VERSION, "lemmas": len(names), "synsets": len(offsets)}, fout)
+
+        return WordNetIndex(index_dir)
+
+    @staticmethod
+    def exists(index_dir: str) -> bool:
+        filename = f"{index_dir}/wordnet.json"
+        if not os.path.isfile(filename):
+            return False
+        with open(filename, "r") as fin:
+            return json.load(fin)["version"] == WORDNET_VERSION
+
+    def __init__(self, index_dir: str):
+        if not WordNetIndex.exists(index_dir):
+            raise Exception("No up to date WordNet index in %s; run WordNetIndex.build first." % index_dir)
+
+        self.index_dir = index_dir
+        self.lemmas = StringTable(f"{index_dir}/lemmas")
+        self.lemma_synset_offsets = self._column("lemma_synset_offsets", np.int64)
+        self.lemma_synsets = self._column("lemma_synsets", SYNSET_DTYPE)
+        self.synset_offsets = self._column("synset_offsets", np.int64)
+        self.synset_words = StringTable(f"{index_dir}/synset_words")
+        self.glosses = StringTable(f"{index_dir}/glosses")
+        self.examples = StringTable(f"{index_dir}/examples")
+        self.troponym_offsets = self._column("troponym_offsets", np.int64)
+        self.troponyms = self._column("troponyms", SYNSET_DTYPE)
+        self.troponym_depths = self._column("troponym_depths", DEPTH_DTYPE)
+
+    def _column(self, name: str, dtype) -> np.ndarray:
+        filename = f"{self.index_dir}/{name}.bin"
+        if os.path.getsize(filename) == 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(filename, dtype=dtype, mode="r")
+
+    def synsets(self, lemma: str) -> np.ndarray:
+        """The synset numbers of a verb lemma, in WordNet sense order"""
+        i = self.lemmas.index(normalize_lemma(lemma))
+        if i < 0:
+            return np.zeros(0, dtype=SYNSET_DTYPE)
+        return np.asarray(self.lemma_synsets[self.lemma_synset_offsets[i]:self.lemma_synset_offsets[i + 1]])
+
+    def synset(self, i: int) -> dict:
+        words = self.synset_words[i]
+        examples = self.examples[i]
+        return {
+            "synset": int(self.synset_offsets[i]),
+            "words": [w.replace("_", " ") for w in words.split("\t")] if words else [],
+            "gloss": self.glosses[i],
+            "examples": examples.split("\t") if examples else [],
+        }
+
+    def troponyms_of(self, i: int) -> Tuple[np.ndarray, np.ndarray]:
+        """The transitive troponyms of a synset number and their depths"""
+        start, end = self.troponym_offsets[i], self.troponym_offsets[i + 1]
+        return np.asarray(self.troponyms[start:end]), np.asarray(self.troponym_depths[start:end])
+
+    def lookup(self, lemmas: Iterable[str]) -> Dict[str, List[dict]]:
+        """Bulk query: maps each lemma to the transitive troponyms of all of its synsets, each described once"""
+        # A troponym reached from several synsets of a lemma is listed where it is first reached, with its shortest
+        # depth from any of them and the synset of that depth as its source.
+        described = {}
+        results = {}
+        for lemma in lemmas:
+            if lemma in results:
+                continue
+
+            entries = []
+            positions = {}
+            for s in self.synsets(lemma):
+                source = int(self.synset_offsets[s])
+                troponyms, depths = self.troponyms_of(int(s))
+                for t, depth in zip(troponyms.tolist(), depths.tolist()):
+                    i = positions.get(t)
+                    if i is not None:
+                        if depth < entries[i]["depth"]:
+                            entries[i] = dict(entries[i], source=source, depth=depth)
+                        continue
+                    positions[t] = len(entries)
+                    if t not in described:
+                        described[t] = self.synset(t)
+                    entries.append(dict(described[t], source=source, depth=depth))
+            results[lemma] = entries
+
+        return results
+
+
+# The troponyms (with glosses and examples) of every word in a MatchAgainstList, each troponym synset listed once.
+class CandidatesForLearningList(object):
+    @classmethod
+    def from_match_against(cls, match_against: dict, index: WordNetIndex) -> "CandidatesForLearningList":
+        words = match_against_words(match_against)
+        found = index.lookup(words)
+
+        candidates = []
+        seen = set()
+        for word in words:
+            for entry in found[word]:
+                if entry["synset"] in seen:
+                    continue
+                seen.add(entry["synset"])
+                candidates.append(dict(entry, word=word))
+
+        return CandidatesForLearningList(match_against["head"], words, candidates)
+
+    def __init__(self, head: str, words: List[str], candidates: List[dict]):
+        self.head = head
+        self.words = words
+        self.candidates = candidates
+
+    def to_dict(self) -> dict:
+        return {"head": self.head, "words": self.words, "candidates": self.candidates}
+
+
+def candidates_stage(index_dir: str) -> Stage:
+    # The pipeline step after match-against: the CandidatesForLearningList of each MatchAgainstList record
+    index = WordNetIndex(index_dir)
+
+    def build(record: dict) -> Iterable[dict]:
+        yield CandidatesForLearningList.from_match_against(record, index).to_dict()
+
+    return Stage("candidates-for-learning", build, config={"wordnet": file_fingerprint(f"{index_dir}/wordnet.json")})
+
+
+def match_against_words(match_against: dict) -> List[str]:
+    """The distinct words (in WordNet lemma form) of a MatchAgainstList record, head word first"""
+    ids = [match_against["head"]]
+    for key in ["synonyms", "hyponyms", "structural_synonyms"]:
+        ids.extend(match_against.get(key) or [])
+
+    words = []
+    for id in ids:
+        word = normalize_lemma(id.split("-")[0])
+        if word not in words:
+            words.append(word)
+    return words
+
+
+def normalize_lemma(lemma: str) -> str:
+    return lemma.strip().lower().replace(" ", "_")
+
+
+def read_data_verb(filename: str) -> Dict[int, Tuple[List[str], List[int], str, List[str]]]:
+    """Maps the offset of every synset in data.verb to its (words, direct troponym offsets, gloss, examples)"""
+    synsets = {}
+    with open(filename, "r", encoding="utf-8") as fin:
+        for line in fin:
+            # The license header lines start with spaces
+            if line.startswith(" ") or not line.strip():
+                continue
+
+            head, _, gloss = line.partition(" | ")
+            fields = head.split()
+
+            offset = int(fields[0])
+            word_count = int(fields[3], 16)
+            words = [w.lower() for w in fields[4:4 + 2 * word_count:2]]
+
+            p = 4 + 2 * word_count
+            pointer_count = int(fields[p])
+            troponyms = []
+            for k in range(pointer_count):
+                symbol, target, pos = fields[p + 1 + 4 * k:p + 4 + 4 * k]
+                if symbol == TROPONYM_POINTER and pos == "v":
+                    troponyms.append(int(target))
+
+            gloss = gloss.strip()
+            examples = EXAMPLE_PATTERN.findall(gloss)
+            definition = gloss.split('"', 1)[0].strip().rstrip(";").strip()
+
+            synsets[offset] = (words, troponyms, definition, examples)
+    return synsets
+
+
+def read_index_verb(filename: str) -> Dict[str, List[int]]:
+    """Maps every lemma in index.verb to its synset offsets"""
+    lemmas = {}
+    with open(filename, "r", encoding="utf-8") as fin:
+        for line in fin:
+            if line.startswith(" ") or not line.strip():
+                continue
+
+            fields = line.split()
+            pointer_count = int(fields[3])
+            lemmas[fields[0].lower()] = [int(o) for o in fields[4 + pointer_count + 2:]]
+    return lemmas
+
+
+def _write_csr(rows: List[List[int]], offsets_path: str, values_path: str):
+    offsets = np.zeros(len(rows) + 1, dtype=OFFSET_DTYPE)
+    np.cumsum([len(r) for r in rows], out=offsets[1:])
+    offsets.tofile(offsets_path)
+    np.asarray([v for r in rows for v in r], dtype=SYNSET_DTYPE).tofile(values_path)
+
+
+if __name__ == "__main__":
+    import sys
+
+    wordnet_dir = None
+    out = "build/wordnet"
+
+    for arg in sys.argv:
+        if arg.startswith("wordnet="):
+            wordnet_dir = arg.replace("wordnet=", "")
+        if arg.startswith("out="):
+            out = arg.replace("out=", "")
+
+    if wordnet_dir is None:
+        print("Correct usage: wordnet.py wordnet=path/to/wordnet/dict out=build/wordnet")
+        print("out parameter is optional, defaults to build/wordnet")
+        exit()
+
+    index = WordNetIndex.build(wordnet_dir, out)
+    print("Indexed %d verb lemmas and %d synsets to %s" % (len(index.lemmas), len(index.synset_offsets), out))